@@ -0,0 +1,6 @@
+from background_task.apps import BackgroundTasksAppConfig
+
+
+class BackgroundTasksConfig(BackgroundTasksAppConfig):
+    # background_task ships migrations with AutoField ids; keep them instead of DEFAULT_AUTO_FIELD
+    default_auto_field = 'django.db.models.AutoField'
@@ -45,6 +45,7 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'audiobooks.apps.BackgroundTasksConfig',
     'authapp',
     'store',
 ]
@@ -139,6 +140,71 @@ LOCALE_PATHS = [
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Extra drives are store.Volume rows mounted at MEDIA_ROOT/volumes/<name>; new files go to the one with the most
+# free space ('most_free') or the first with room in priority order ('priority'), keeping MEDIA_VOLUME_RESERVE free
+STORAGES = {
+    'default': {'BACKEND': 'store.storage.VolumeStorage'},
+    'staticfiles': {'BACKEND': 'django.contrib.staticfiles.storage.StaticFilesStorage'},
+}
+MEDIA_PLACEMENT_POLICY = os.getenv('MEDIA_PLACEMENT_POLICY', 'most_free')
+MEDIA_VOLUME_RESERVE = int(os.getenv('MEDIA_VOLUME_RESERVE', 1024 ** 3))
+# Where `manage.py check_media_volumes` looks for a volume that was remounted under another name
+MEDIA_VOLUME_SEARCH_PATHS = [path for path in os.getenv('MEDIA_VOLUME_SEARCH_PATHS', '').split(',') if path]
+
+# Where audio files live: 'slug' keeps audio/<authors>/<series>/<book slug>/, so renaming a book moves its files;
+# 'id' keeps audio/books/<book id>/, so renames only touch the database. Convert with `manage.py convert_media_layout`
+AUDIO_STORAGE_LAYOUT = os.getenv('AUDIO_STORAGE_LAYOUT', 'slug')
+# Journals of book directory moves in progress, finished by `manage.py recover_media_moves` after a crash
+MEDIA_MOVE_JOURNAL_DIR = os.path.join(MEDIA_ROOT, 'tmp', 'moves')
+# `manage.py reconcile_media`: directories compared with the database, its incremental index and where orphans go
+MEDIA_RECONCILE_DIRS = ['audio', 'media']  # on every volume
+MEDIA_RECONCILE_INDEX = os.path.join(MEDIA_ROOT, 'tmp', 'reconcile_index.json')
+MEDIA_QUARANTINE_DIR = os.path.join(MEDIA_ROOT, 'tmp', 'quarantine')
+
+ARCHIVE_CACHE_DIR = os.path.join(MEDIA_ROOT, 'cache', 'archives')
+# CSV exports from the admin, downloadable by staff only
+EXPORT_DIR = os.path.join(MEDIA_ROOT, 'exports')
+ARCHIVE_CACHE_MAX_BYTES = int(os.getenv('ARCHIVE_CACHE_MAX_BYTES', 50 * 1024 ** 3))
+ARCHIVE_CACHE_BUILD_DELAY = int(os.getenv('ARCHIVE_CACHE_BUILD_DELAY', 60))
+
+# Copies of recently opened books on fast local storage, served instead of the (spun down) media drive
+MEDIA_HOT_CACHE_DIR = os.getenv('MEDIA_HOT_CACHE_DIR', os.path.join(BASE_DIR, 'hotcache'))
+MEDIA_HOT_CACHE_MAX_BYTES = int(os.getenv('MEDIA_HOT_CACHE_MAX_BYTES', 4 * 1024 ** 3))
+MEDIA_HOT_CACHE_X_ACCEL_PREFIX = '/protected-hot-cache/'
+
+# Rendered list and detail pages, keyed by a catalog version that every change bumps. File based so the
+# gunicorn workers and the task worker share it; the worker's changes must invalidate the web's pages too.
+# Kept with the other derived data under MEDIA_ROOT unless PAGE_CACHE_DIR points at faster local storage
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': os.getenv('PAGE_CACHE_DIR', os.path.join(MEDIA_ROOT, 'cache', 'pages')),
+        'TIMEOUT': 24 * 60 * 60,
+        'OPTIONS': {'MAX_ENTRIES': 5000},
+    },
+    # Catalog API responses, kept in memory so that a GET never writes to disk
+    'api': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'catalog-api',
+        'OPTIONS': {'MAX_ENTRIES': 2000},
+    },
+}
+FRAGMENT_CACHE_TIMEOUT = 24 * 60 * 60
+API_CACHE_TIMEOUT = 60 * 60
+
+# Cover images are also stored downscaled to these widths, as WebP and JPEG, for srcset
+IMAGE_VARIANT_WIDTHS = [240, 480, 960]
+
+# Background jobs (django-background-tasks): retried with backoff, run by `manage.py process_tasks`
+MAX_ATTEMPTS = 5
+MAX_RUN_TIME = 3600
+BACKGROUND_TASK_RUN_ASYNC = True
+BACKGROUND_TASK_ASYNC_THREADS = int(os.getenv('BACKGROUND_TASK_ASYNC_THREADS', 2))
+
+# Let nginx send files from MEDIA_ROOT (X-Accel-Redirect) instead of streaming them through Django
+MEDIA_X_ACCEL_REDIRECT = os.getenv('MEDIA_X_ACCEL_REDIRECT', 'False') == 'True'
+MEDIA_X_ACCEL_PREFIX = '/protected-media/'
+
 STATIC_URL = 'static/'
 STATICFILES_DIRS = [os.path.join(BASE_DIR, "static")]
 STATIC_ROOT = os.path.join(BASE_DIR, 'prodstaticfiles')
@@ -211,7 +277,22 @@ if sys.stdout.encoding != 'utf-8':
         pass
 
 
-FILE_UPLOAD_MAX_MEMORY_SIZE = 8000 * 1024 * 1024
+# Uploads are streamed to disk next to MEDIA_ROOT and renamed into place, never held in memory
+FILE_UPLOAD_HANDLERS = ['store.uploadhandlers.HashingTemporaryFileUploadHandler']
+UPLOAD_TEMP_DIR = os.path.join(MEDIA_ROOT, 'tmp', 'uploads')
+FILE_UPLOAD_MAX_MEMORY_SIZE = 2 * 1024 * 1024
+
+# Chunked, resumable uploads (store.uploads)
+UPLOAD_SESSION_DIR = os.path.join(MEDIA_ROOT, 'tmp', 'chunked')
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+UPLOAD_SESSION_TTL = 2 * 24 * 60 * 60
+
+# Audio files with identical content are stored once and shared through hardlinks (store.dedup)
+AUDIO_DEDUPLICATION = os.getenv('AUDIO_DEDUPLICATION', 'True') == 'True'
+
+# `manage.py scrub_media` re-hashes stored audio at most this fast, and each file again after this many days
+SCRUB_MAX_BYTES_PER_SECOND = int(os.getenv('SCRUB_MAX_BYTES_PER_SECOND', 4 * 1024 * 1024))
+SCRUB_INTERVAL_DAYS = int(os.getenv('SCRUB_INTERVAL_DAYS', 30))
 DATA_UPLOAD_MAX_MEMORY_SIZE = 8000 * 1024 * 1024
 
 DATA_UPLOAD_MAX_NUMBER_FILES = 5000
@@ -19,8 +19,10 @@ from django.conf.urls.static import static
 from django.conf.urls.i18n import i18n_patterns
 from django.contrib import admin
 from django.urls import path, include
+from store.views import ProtectedMediaView
 
 urlpatterns = [
+    path(f"{settings.MEDIA_URL.strip('/')}/<path:path>", ProtectedMediaView.as_view(), name='protected_media'),
     path('admin/', admin.site.urls),
     path('auth/', include('authapp.urls')),
     path('store/', include('store.urls')),
@@ -28,5 +30,4 @@ urlpatterns = [
 ]
 
 if settings.DEBUG:
-    urlpatterns += static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
     urlpatterns += static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
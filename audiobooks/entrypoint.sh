@@ -2,6 +2,10 @@
 
 python manage.py migrate
 
+python manage.py recover_media_moves
+
+python manage.py check_media_volumes
+
 python manage.py collectstatic --noinput
 
 python manage.py compilemessages
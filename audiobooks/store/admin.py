@@ -1,9 +1,15 @@
 from django.contrib import admin
 from django.utils.html import format_html
 from django.utils.translation import gettext_lazy as _
+from django.core.exceptions import PermissionDenied
 from django.http import HttpResponseRedirect
-from .models import Genre, Author, Series, Book, AudioFile
-from .utils import get_image_preview, export_authors_to_csv, export_books_to_csv
+from django.template.response import TemplateResponse
+from django.urls import path, reverse
+from .jobs import create_job
+from .models import Genre, Author, Series, Book, AudioFile, Job, Volume, HotCacheEntry, HotCacheStat
+from .space import space_report
+from .tasks import export_csv_task
+from .utils import get_image_preview
 
 
 @admin.register(Genre)
@@ -18,7 +24,7 @@ class GenreAdmin(admin.ModelAdmin):
 
 @admin.register(Author)
 class AuthorAdmin(admin.ModelAdmin):
-    list_display = ('last_name', 'first_name', 'slug', 'image_preview')
+    list_display = ('last_name', 'first_name', 'slug', 'total_size', 'image_preview')
     search_fields = ('last_name', 'first_name')
     actions = ['export_authors_to_file']
 
@@ -27,15 +33,16 @@ class AuthorAdmin(admin.ModelAdmin):
     image_preview.short_description = 'Image'
 
     def export_authors_to_file(self, request, queryset):
-        filepath, filename, count, authors_data = export_authors_to_csv()
-        
+        job = create_job('export_authors', request.user)
+        export_csv_task('authors', job_id=job.pk)
+
         self.message_user(
             request,
             format_html(
-                _('Successfully exported {} authors to file: <a href="/{}" target="_blank">{}</a>'),
-                count,
-                filepath,
-                filename
+                _('Export of all authors started, the download link appears here when it is done: '
+                  '<a href="{}">{}</a>'),
+                reverse('admin:store_job_change', args=[job.pk]),
+                job
             )
         )
     
@@ -64,7 +71,7 @@ class SeriesAdmin(admin.ModelAdmin):
 
 @admin.register(Book)
 class BookAdmin(admin.ModelAdmin):
-    list_display = ('title', 'slug', 'series', 'is_read', 'image_preview', 'audio_file_count')
+    list_display = ('title', 'slug', 'series', 'is_read', 'total_size', 'image_preview', 'audio_file_count')
     search_fields = ('title',)
     filter_horizontal = ('authors', 'genres')
     list_filter = ('is_read',)
@@ -80,15 +87,16 @@ class BookAdmin(admin.ModelAdmin):
     audio_file_count.short_description = 'Audio Files'
 
     def export_books_to_file(self, request, queryset):
-        filepath, filename, count, books_data = export_books_to_csv()
-        
+        job = create_job('export_books', request.user)
+        export_csv_task('books', job_id=job.pk)
+
         self.message_user(
             request,
             format_html(
-                _('Successfully exported {} books to file: <a href="/{}" target="_blank">{}</a>'),
-                count,
-                filepath,
-                filename
+                _('Export of all books started, the download link appears here when it is done: '
+                  '<a href="{}">{}</a>'),
+                reverse('admin:store_job_change', args=[job.pk]),
+                job
             )
         )
     
@@ -110,6 +118,60 @@ class BookAdmin(admin.ModelAdmin):
 
 @admin.register(AudioFile)
 class AudioFileAdmin(admin.ModelAdmin):
-    list_display = ('book', 'file', 'created_at')
+    list_display = ('book', 'file', 'track_number', 'duration', 'bitrate', 'size', 'integrity', 'created_at')
     search_fields = ('book__title',)
-    list_filter = ('book', 'created_at')
+    list_filter = ('integrity', 'book', 'created_at')
+    readonly_fields = ('size', 'duration', 'bitrate', 'title', 'track_number', 'disc_number', 'scanned_at',
+                       'sha256', 'verified_at', 'integrity')
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ('kind', 'status', 'percent', 'attempts', 'user', 'created_at', 'updated_at', 'download')
+    list_filter = ('kind', 'status')
+    readonly_fields = ('kind', 'status', 'user', 'progress_current', 'progress_total', 'attempts', 'message', 'result',
+                       'download')
+
+    def download(self, obj):
+        result = obj.result if isinstance(obj.result, dict) else {}
+        if not result.get('url'):
+            return '-'
+        return format_html('<a href="{}">{}</a>', result['url'], result.get('filename') or result['url'])
+    download.short_description = _('Download')
+
+
+@admin.register(Volume)
+class VolumeAdmin(admin.ModelAdmin):
+    list_display = ('name', 'path', 'status', 'is_active', 'priority', 'used', 'quota', 'free', 'capacity',
+                    'checked_at')
+    list_filter = ('status', 'is_active')
+    readonly_fields = ('uuid', 'capacity', 'free', 'used', 'status', 'found_at', 'checked_at')
+    change_list_template = 'admin/store/volume/change_list.html'
+
+    def get_urls(self):
+        return [
+            path('space/', self.admin_site.admin_view(self.space_usage_view), name='store_volume_space'),
+        ] + super().get_urls()
+
+    def space_usage_view(self, request):
+        if not self.has_view_permission(request):
+            raise PermissionDenied
+        context = dict(
+            self.admin_site.each_context(request),
+            title=_('Disk space'),
+            opts=self.model._meta,
+            report=space_report(),
+        )
+        return TemplateResponse(request, 'admin/store/volume/space_usage.html', context)
+
+
+@admin.register(HotCacheEntry)
+class HotCacheEntryAdmin(admin.ModelAdmin):
+    list_display = ('audio_file', 'filename', 'size', 'hits', 'cached_at', 'last_used_at')
+    readonly_fields = ('audio_file', 'filename', 'size', 'hits', 'cached_at', 'last_used_at')
+
+
+@admin.register(HotCacheStat)
+class HotCacheStatAdmin(admin.ModelAdmin):
+    list_display = ('day', 'hits', 'misses', 'hit_ratio')
+    readonly_fields = ('day', 'hits', 'misses')
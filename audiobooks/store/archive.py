@@ -0,0 +1,241 @@
+import hashlib
+import os
+import struct
+import zlib
+
+
+CHUNK_SIZE = 1024 * 1024
+ZIP64_LIMIT = 0xFFFFFFFF
+ZIP_FILECOUNT_LIMIT = 0xFFFF
+ZIP64_MARKER = 0xFFFFFFFF
+ZIP64_COUNT_MARKER = 0xFFFF
+
+FLAG_DATA_DESCRIPTOR = 0x08
+FLAG_UTF8 = 0x800
+VERSION_DEFAULT = 20
+VERSION_ZIP64 = 45
+
+LOCAL_HEADER = struct.Struct('<IHHHHHIIIHH')
+CENTRAL_HEADER = struct.Struct('<IHHHHHHIIIHHHHHII')
+DATA_DESCRIPTOR = struct.Struct('<IIII')
+DATA_DESCRIPTOR64 = struct.Struct('<IIQQ')
+END_OF_CENTRAL_DIR = struct.Struct('<IHHHHIIH')
+END_OF_CENTRAL_DIR64 = struct.Struct('<IQHHIIQQQQ')
+END_OF_CENTRAL_DIR64_LOCATOR = struct.Struct('<IIQI')
+ZIP64_LOCAL_EXTRA = struct.Struct('<HHQQ')
+ZIP64_CENTRAL_EXTRA = struct.Struct('<HHQQQ')
+
+
+# Every entry is stamped 1980-01-01 00:00 so the same files always produce the same bytes
+FIXED_DOS_DATE = (1 << 5) | 1
+FIXED_DOS_TIME = 0
+
+
+def compute_crc(path, chunk_size=CHUNK_SIZE):
+    crc = 0
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+class ArchiveEntry:
+    def __init__(self, path, arcname, size=None, mtime=None, crc=None, key=None):
+        self.path = path
+        self.arcname = arcname.encode('utf-8')
+        stat = os.stat(path) if size is None or mtime is None else None
+        self.size = size if size is not None else stat.st_size
+        self.mtime = mtime if mtime is not None else stat.st_mtime
+        self.crc = crc
+        self.key = key
+        self.offset = 0
+
+    @property
+    def zip64(self):
+        return self.size >= ZIP64_LIMIT or self.offset >= ZIP64_LIMIT
+
+    @property
+    def local_header_size(self):
+        return LOCAL_HEADER.size + len(self.arcname) + (ZIP64_LOCAL_EXTRA.size if self.zip64 else 0)
+
+    @property
+    def data_descriptor_size(self):
+        return DATA_DESCRIPTOR64.size if self.zip64 else DATA_DESCRIPTOR.size
+
+    @property
+    def central_header_size(self):
+        return CENTRAL_HEADER.size + len(self.arcname) + (ZIP64_CENTRAL_EXTRA.size if self.zip64 else 0)
+
+    @property
+    def total_size(self):
+        return self.local_header_size + self.size + self.data_descriptor_size
+
+    @property
+    def data_offset(self):
+        return self.offset + self.local_header_size
+
+    def local_header(self):
+        extra = ZIP64_LOCAL_EXTRA.pack(0x0001, 16, 0, 0) if self.zip64 else b''
+        size = ZIP64_MARKER if self.zip64 else 0
+        return LOCAL_HEADER.pack(
+            0x04034b50, VERSION_ZIP64 if self.zip64 else VERSION_DEFAULT, FLAG_DATA_DESCRIPTOR | FLAG_UTF8, 0,
+            FIXED_DOS_TIME, FIXED_DOS_DATE, 0, size, size, len(self.arcname), len(extra)
+        ) + self.arcname + extra
+
+    def data_descriptor(self):
+        if self.zip64:
+            return DATA_DESCRIPTOR64.pack(0x08074b50, self.crc, self.size, self.size)
+        return DATA_DESCRIPTOR.pack(0x08074b50, self.crc, self.size, self.size)
+
+    def central_header(self):
+        if self.zip64:
+            extra = ZIP64_CENTRAL_EXTRA.pack(0x0001, 24, self.size, self.size, self.offset)
+            size = offset = ZIP64_MARKER
+            version = VERSION_ZIP64
+        else:
+            extra = b''
+            size, offset = self.size, self.offset
+            version = VERSION_DEFAULT
+        return CENTRAL_HEADER.pack(
+            0x02014b50, version, version, FLAG_DATA_DESCRIPTOR | FLAG_UTF8, 0, FIXED_DOS_TIME, FIXED_DOS_DATE,
+            self.crc, size, size, len(self.arcname), len(extra), 0, 0, 0, 0o100644 << 16, offset
+        ) + self.arcname + extra
+
+
+class StreamingZipArchive:
+    """
+    Writes an uncompressed (stored) ZIP archive chunk by chunk. Since nothing is
+    compressed and timestamps are fixed, the byte layout is fully determined by the
+    entry names and sizes: any byte range can be produced without building the rest.
+    CRCs are only needed for data descriptors and the central directory; unknown ones
+    are computed while streaming a whole entry, or by reading the file on demand.
+    """
+
+    def __init__(self, entries, chunk_size=CHUNK_SIZE, on_crc=None):
+        self.entries = list(entries)
+        self.chunk_size = chunk_size
+        self.on_crc = on_crc
+
+        offset = 0
+        for entry in self.entries:
+            entry.offset = offset
+            offset += entry.total_size
+        self.central_dir_offset = offset
+        self.central_dir_size = sum(entry.central_header_size for entry in self.entries)
+
+        self.segments = []
+        for entry in self.entries:
+            self.segments.append((entry.offset, entry.local_header_size, 'header', entry))
+            self.segments.append((entry.data_offset, entry.size, 'data', entry))
+            self.segments.append((entry.data_offset + entry.size, entry.data_descriptor_size, 'descriptor', entry))
+        self.segments.append((self.central_dir_offset, self.central_dir_size, 'central', None))
+        self.segments.append((self.central_dir_offset + self.central_dir_size, self.end_record_size, 'end', None))
+
+    @property
+    def zip64(self):
+        return (
+            len(self.entries) >= ZIP_FILECOUNT_LIMIT
+            or self.central_dir_offset >= ZIP64_LIMIT
+            or self.central_dir_size >= ZIP64_LIMIT
+            or any(entry.zip64 for entry in self.entries)
+        )
+
+    @property
+    def end_record_size(self):
+        size = END_OF_CENTRAL_DIR.size
+        if self.zip64:
+            size += END_OF_CENTRAL_DIR64.size + END_OF_CENTRAL_DIR64_LOCATOR.size
+        return size
+
+    @property
+    def size(self):
+        return self.central_dir_offset + self.central_dir_size + self.end_record_size
+
+    def __len__(self):
+        return self.size
+
+    @property
+    def etag(self):
+        digest = hashlib.sha1()
+        for entry in self.entries:
+            digest.update(b'%s\0%d\0%d\0' % (entry.arcname, entry.size, int(entry.mtime)))
+        return f'"{digest.hexdigest()}"'
+
+    def __iter__(self):
+        return self.iter_range(0, self.size - 1)
+
+    def iter_range(self, start, end):
+        """Yields the bytes of the archive from start to end inclusive."""
+        for offset, length, kind, entry in self.segments:
+            if length == 0 or offset + length <= start:
+                continue
+            if offset > end:
+                break
+            first = max(start - offset, 0)
+            last = min(end - offset, length - 1)
+
+            if kind == 'data':
+                yield from self.read_entry(entry, first, last + 1)
+            else:
+                yield self.segment_bytes(kind, entry)[first:last + 1]
+
+    def segment_bytes(self, kind, entry):
+        if kind == 'header':
+            return entry.local_header()
+        if kind == 'descriptor':
+            self.ensure_crc(entry)
+            return entry.data_descriptor()
+        if kind == 'central':
+            for item in self.entries:
+                self.ensure_crc(item)
+            return self.central_directory()
+        return self.end_record()
+
+    def ensure_crc(self, entry):
+        if entry.crc is None:
+            self.set_crc(entry, compute_crc(entry.path, self.chunk_size))
+
+    def set_crc(self, entry, crc):
+        entry.crc = crc
+        if self.on_crc:
+            self.on_crc(entry)
+
+    def read_entry(self, entry, start=0, stop=None):
+        stop = entry.size if stop is None else stop
+        whole = start == 0 and stop == entry.size and entry.crc is None
+        crc = 0
+        remaining = stop - start
+        with open(entry.path, 'rb') as f:
+            f.seek(start)
+            while remaining > 0:
+                chunk = f.read(min(self.chunk_size, remaining))
+                if not chunk:
+                    raise IOError(f"File {entry.path} is shorter than expected")
+                if whole:
+                    crc = zlib.crc32(chunk, crc)
+                remaining -= len(chunk)
+                yield chunk
+        if whole:
+            self.set_crc(entry, crc)
+
+    def central_directory(self):
+        return b''.join(entry.central_header() for entry in self.entries)
+
+    def end_record(self):
+        count = len(self.entries)
+        record = b''
+        if self.zip64:
+            zip64_end_offset = self.central_dir_offset + self.central_dir_size
+            record += END_OF_CENTRAL_DIR64.pack(
+                0x06064b50, END_OF_CENTRAL_DIR64.size - 12, VERSION_ZIP64, VERSION_ZIP64, 0, 0,
+                count, count, self.central_dir_size, self.central_dir_offset
+            )
+            record += END_OF_CENTRAL_DIR64_LOCATOR.pack(0x07064b50, 0, zip64_end_offset, 1)
+            count = ZIP64_COUNT_MARKER if count >= ZIP_FILECOUNT_LIMIT else count
+            central_dir_size = central_dir_offset = ZIP64_MARKER
+        else:
+            central_dir_size, central_dir_offset = self.central_dir_size, self.central_dir_offset
+        record += END_OF_CENTRAL_DIR.pack(
+            0x06054b50, 0, 0, count, count, central_dir_size, central_dir_offset, 0
+        )
+        return record
@@ -0,0 +1,122 @@
+import logging
+import os
+
+from django.conf import settings
+from django.db.models import F
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .archive import ArchiveEntry, StreamingZipArchive
+
+
+logger = logging.getLogger(__name__)
+
+
+def get_archive_entries(book):
+    entries = []
+    for audio in book.audio_files.all().order_by('file', 'pk'):
+        file_path = audio.file.path
+        if not os.path.isfile(file_path):
+            logger.warning(f"Audio file not found, skipped in archive: {file_path}")
+            continue
+        entries.append(ArchiveEntry(file_path, arcname=audio.download_name, crc=audio.crc32, key=audio.pk))
+    return entries
+
+
+def save_entry_crc(entry):
+    from .models import AudioFile
+
+    AudioFile.objects.filter(pk=entry.key).update(crc32=entry.crc)
+
+
+def get_book_archive(book):
+    return StreamingZipArchive(get_archive_entries(book), on_crc=save_entry_crc)
+
+
+def archive_filename(book):
+    # Keyed by the immutable id, so renaming a book keeps its cached archive
+    return f"book_{book.pk}.zip"
+
+
+def get_cached_archive(book):
+    from .models import BookArchive
+
+    cached = BookArchive.objects.filter(book=book).first()
+    if cached and cached.filename == archive_filename(book) and os.path.isfile(cached.path):
+        return cached
+    return None
+
+
+def touch_cached_archive(cached):
+    type(cached).objects.filter(pk=cached.pk).update(last_downloaded_at=timezone.now())
+
+
+def invalidate_book_archive(book_id):
+    from .models import BookArchive
+
+    for cached in BookArchive.objects.filter(book_id=book_id):
+        cached.delete()
+
+
+def build_book_archive(book_id):
+    from .models import Book, BookArchive
+
+    book = Book.objects.filter(pk=book_id).first()
+    if book is None:
+        return None
+
+    archive = get_book_archive(book)
+    if not archive.entries:
+        invalidate_book_archive(book_id)
+        return None
+    if archive.size > settings.ARCHIVE_CACHE_MAX_BYTES:
+        logger.info(f"Archive for '{book.slug}' ({archive.size} bytes) exceeds the cache budget, not cached")
+        return None
+
+    cached = BookArchive.objects.filter(book=book).first()
+    if cached and cached.etag == archive.etag and cached.filename == archive_filename(book) \
+            and os.path.isfile(cached.path):
+        return cached
+
+    evict_archives(reserve=archive.size)
+
+    filename = archive_filename(book)
+    path = os.path.join(settings.ARCHIVE_CACHE_DIR, filename)
+    tmp_path = f"{path}.tmp"
+    os.makedirs(settings.ARCHIVE_CACHE_DIR, exist_ok=True)
+    try:
+        with open(tmp_path, 'wb') as f:
+            for chunk in archive:
+                f.write(chunk)
+    except Exception:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+    if get_book_archive(book).etag != archive.etag:
+        logger.info(f"Audio files of '{book.slug}' changed while building its archive, discarded")
+        os.remove(tmp_path)
+        return None
+
+    if cached:
+        cached.delete()
+    os.replace(tmp_path, path)
+    cached = BookArchive.objects.create(book=book, filename=filename, size=archive.size, etag=archive.etag)
+    logger.info(f"Cached archive {filename} ({archive.size} bytes)")
+    return cached
+
+
+def evict_archives(reserve=0):
+    from .models import BookArchive
+
+    budget = settings.ARCHIVE_CACHE_MAX_BYTES - reserve
+    archives = BookArchive.objects.annotate(
+        last_used=Coalesce(F('last_downloaded_at'), F('built_at'))
+    ).order_by('-last_used')
+
+    total = 0
+    for cached in archives:
+        total += cached.size
+        if total > budget:
+            logger.info(f"Evicting cached archive {cached.filename}")
+            cached.delete()
@@ -0,0 +1,390 @@
+import os
+import struct
+
+
+ID3V1_SIZE = 128
+MP3_SCAN_SIZE = 256 * 1024
+OGG_TAIL_SIZE = 64 * 1024
+OGG_HEADER_LIMIT = 4 * 1024 * 1024
+
+MPEG_V1 = 3
+MPEG_V2 = 2
+MPEG_V25 = 0
+
+MPEG_BITRATES = {
+    (True, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (True, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (True, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (False, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (False, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (False, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+MPEG_SAMPLE_RATES = {
+    MPEG_V1: (44100, 48000, 32000),
+    MPEG_V2: (22050, 24000, 16000),
+    MPEG_V25: (11025, 12000, 8000),
+}
+
+ID3_FRAMES = {
+    'TIT2': 'title', 'TT2': 'title',
+    'TRCK': 'track_number', 'TRK': 'track_number',
+    'TPOS': 'disc_number', 'TPA': 'disc_number',
+    'TALB': 'album', 'TAL': 'album',
+    'TPE1': 'artist', 'TP1': 'artist',
+}
+MP4_CONTAINERS = {b'moov', b'udta', b'meta', b'ilst'}
+MP4_TAGS = {
+    b'\xa9nam': 'title', b'trkn': 'track_number', b'disk': 'disc_number', b'\xa9alb': 'album', b'\xa9ART': 'artist',
+}
+VORBIS_COMMENTS = {
+    'TITLE': 'title', 'TRACKNUMBER': 'track_number', 'DISCNUMBER': 'disc_number', 'ALBUM': 'album', 'ARTIST': 'artist',
+}
+
+
+class AudioMetadataError(Exception):
+    pass
+
+
+def read_audio_metadata(path):
+    """
+    Reads duration, bitrate and tags of an MP3, MP4/M4A/M4B or Ogg Vorbis/Opus file
+    from its headers only: the audio itself is never decoded, and at most a few
+    hundred kilobytes are read whatever the size of the file. A truncated or
+    malformed file raises AudioMetadataError.
+    """
+    size = os.path.getsize(path)
+    metadata = {
+        'size': size, 'duration': None, 'bitrate': None,
+        'title': '', 'track_number': None, 'disc_number': None, 'album': '', 'artist': '',
+    }
+    with open(path, 'rb') as f:
+        head = f.read(12)
+        f.seek(0)
+        if head[4:8] == b'ftyp':
+            reader = _read_mp4
+        elif head[:4] == b'OggS':
+            reader = _read_ogg
+        elif head[:3] == b'ID3' or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+            reader = _read_mp3
+        else:
+            raise AudioMetadataError(f"Unsupported audio format: {os.path.basename(path)}")
+        try:
+            reader(f, size, metadata)
+        except (struct.error, IndexError, KeyError, ValueError, ZeroDivisionError) as e:
+            # Truncated or malformed headers run out of bytes in the middle of a structure
+            raise AudioMetadataError(f"Malformed audio headers in {os.path.basename(path)}: {e}") from e
+
+    if metadata['duration'] and not metadata['bitrate']:
+        metadata['bitrate'] = round(metadata.pop('audio_size', size) * 8 / metadata['duration'] / 1000)
+    metadata.pop('audio_size', None)
+    return metadata
+
+
+def _parse_number(value):
+    """Turns "3", "3/12" or "03" into 3."""
+    digits = str(value).split('/')[0].strip()
+    return int(digits) if digits.isdigit() and int(digits) > 0 else None
+
+
+def _set_tag(metadata, field, value):
+    if field in ('track_number', 'disc_number'):
+        value = _parse_number(value)
+    elif value:
+        value = str(value).strip()[:255]
+    if value and not metadata[field]:
+        metadata[field] = value
+
+
+# MP3
+
+def _syncsafe(data):
+    return (data[0] << 21) | (data[1] << 14) | (data[2] << 7) | data[3]
+
+
+def _decode_id3_text(data):
+    if not data:
+        return ''
+    encoding, text = data[0], data[1:]
+    if encoding == 1:
+        value = text.decode('utf-16', errors='replace')
+    elif encoding == 2:
+        value = text.decode('utf-16-be', errors='replace')
+    elif encoding == 3:
+        value = text.decode('utf-8', errors='replace')
+    else:
+        value = text.decode('latin-1')
+    return value.split('\x00')[0]
+
+
+def _read_id3v2(f, metadata):
+    """Parses the ID3v2 tags at the current position and returns where the audio starts."""
+    offset = f.tell()
+    while True:
+        f.seek(offset)
+        header = f.read(10)
+        if len(header) < 10 or header[:3] != b'ID3':
+            return offset
+        major, flags, tag_size = header[3], header[5], _syncsafe(header[6:10])
+        body = f.read(tag_size)
+        offset += 10 + tag_size + (10 if flags & 0x10 else 0)
+
+        if major < 4 and flags & 0x80:
+            body = body.replace(b'\xff\x00', b'\xff')
+        position = 0
+        if flags & 0x40 and major >= 3:
+            extended = body[:4]
+            position = _syncsafe(extended) if major == 4 else struct.unpack('>I', extended)[0] + 4
+
+        id_size, header_size = (3, 6) if major == 2 else (4, 10)
+        while position + header_size <= len(body):
+            frame_id = body[position:position + id_size]
+            if not frame_id.strip(b'\x00'):
+                break
+            if major == 2:
+                frame_size = int.from_bytes(body[position + 3:position + 6], 'big')
+                frame_flags = 0
+            else:
+                raw_size = body[position + 4:position + 8]
+                frame_size = _syncsafe(raw_size) if major == 4 else struct.unpack('>I', raw_size)[0]
+                frame_flags = struct.unpack('>H', body[position + 8:position + 10])[0]
+            data = body[position + header_size:position + header_size + frame_size]
+            position += header_size + frame_size
+
+            field = ID3_FRAMES.get(frame_id.decode('latin-1'))
+            if not field:
+                continue
+            if major == 3 and frame_flags & 0x00C0 or major == 4 and frame_flags & 0x000C:
+                continue
+            if major == 4 and frame_flags & 0x0001:
+                data = data[4:]
+            _set_tag(metadata, field, _decode_id3_text(data))
+
+
+def _read_id3v1(f, size, metadata):
+    if size < ID3V1_SIZE:
+        return False
+    f.seek(size - ID3V1_SIZE)
+    tag = f.read(ID3V1_SIZE)
+    if tag[:3] != b'TAG':
+        return False
+    for field, start in (('title', 3), ('artist', 33), ('album', 63)):
+        _set_tag(metadata, field, tag[start:start + 30].split(b'\x00')[0].decode('latin-1'))
+    if tag[125] == 0 and tag[126]:
+        _set_tag(metadata, 'track_number', tag[126])
+    return True
+
+
+def _parse_mpeg_header(data, position):
+    if position + 4 > len(data):
+        return None
+    header = struct.unpack('>I', data[position:position + 4])[0]
+    if header >> 21 != 0x7FF:
+        return None
+    version = (header >> 19) & 3
+    layer = 4 - ((header >> 17) & 3)
+    bitrate_index = (header >> 12) & 0xF
+    rate_index = (header >> 10) & 3
+    if version == 1 or layer == 4 or bitrate_index in (0, 15) or rate_index == 3:
+        return None
+
+    bitrate = MPEG_BITRATES[(version == MPEG_V1, layer)][bitrate_index] * 1000
+    sample_rate = MPEG_SAMPLE_RATES[version][rate_index]
+    padding = (header >> 9) & 1
+    if layer == 1:
+        samples = 384
+        length = (12 * bitrate // sample_rate + padding) * 4
+    else:
+        samples = 1152 if layer == 2 or version == MPEG_V1 else 576
+        length = samples // 8 * bitrate // sample_rate + padding
+    return {
+        'version': version, 'bitrate': bitrate, 'sample_rate': sample_rate,
+        'samples': samples, 'length': length, 'mono': (header >> 6) & 3 == 3,
+    }
+
+
+def _read_mp3(f, size, metadata):
+    audio_start = _read_id3v2(f, metadata)
+    audio_end = size - ID3V1_SIZE if _read_id3v1(f, size, metadata) else size
+
+    f.seek(audio_start)
+    data = f.read(MP3_SCAN_SIZE)
+    position = data.find(b'\xff')
+    frame = None
+    while position != -1:
+        frame = _parse_mpeg_header(data, position)
+        # A second frame right after the first one tells a real header from stray sync bits
+        if frame and (position + frame['length'] + 4 > len(data)
+                      or _parse_mpeg_header(data, position + frame['length'])):
+            break
+        frame = None
+        position = data.find(b'\xff', position + 1)
+    if frame is None:
+        raise AudioMetadataError("No MPEG audio frames found")
+
+    audio_size = audio_end - audio_start - position
+    metadata['audio_size'] = audio_size
+
+    if frame['version'] == MPEG_V1:
+        side_info = 17 if frame['mono'] else 32
+    else:
+        side_info = 9 if frame['mono'] else 17
+    xing = data[position + 4 + side_info:position + 4 + side_info + 16]
+    vbri = data[position + 36:position + 36 + 18]
+
+    frames = None
+    if xing[:4] in (b'Xing', b'Info'):
+        flags = struct.unpack('>I', xing[4:8])[0]
+        if flags & 1:
+            frames = struct.unpack('>I', xing[8:12])[0]
+    elif vbri[:4] == b'VBRI':
+        frames = struct.unpack('>I', vbri[14:18])[0]
+
+    if frames:
+        metadata['duration'] = frames * frame['samples'] / frame['sample_rate']
+    else:
+        metadata['duration'] = audio_size * 8 / frame['bitrate']
+        metadata['bitrate'] = frame['bitrate'] // 1000
+
+
+# MP4
+
+def _iter_mp4_boxes(f, start, end):
+    position = start
+    while position + 8 <= end:
+        f.seek(position)
+        box_size, box_type = struct.unpack('>I4s', f.read(8))
+        header_size = 8
+        if box_size == 1:
+            box_size = struct.unpack('>Q', f.read(8))[0]
+            header_size = 16
+        elif box_size == 0:
+            box_size = end - position
+        if box_size < header_size:
+            return
+        yield box_type, position + header_size, min(position + box_size, end)
+        position += box_size
+
+
+def _read_mp4_box_data(f, start, end):
+    for box_type, data_start, data_end in _iter_mp4_boxes(f, start, end):
+        if box_type == b'data':
+            f.seek(data_start)
+            data = f.read(min(data_end - data_start, 64 * 1024))
+            return struct.unpack('>I', data[:4])[0] & 0xFFFFFF, data[8:]
+    return None, b''
+
+
+def _read_mp4_boxes(f, start, end, metadata):
+    for box_type, data_start, data_end in _iter_mp4_boxes(f, start, end):
+        if box_type == b'mdat':
+            metadata['audio_size'] = metadata.get('audio_size', 0) + data_end - data_start
+        elif box_type == b'mvhd':
+            f.seek(data_start)
+            version = f.read(4)[0]
+            if version == 1:
+                timescale, duration = struct.unpack('>16xIQ', f.read(28))
+            else:
+                timescale, duration = struct.unpack('>8xII', f.read(16))
+            if timescale:
+                metadata['duration'] = duration / timescale
+        elif box_type in MP4_TAGS:
+            data_type, payload = _read_mp4_box_data(f, data_start, data_end)
+            field = MP4_TAGS[box_type]
+            if field in ('title', 'album', 'artist') and data_type == 1:
+                _set_tag(metadata, field, payload.decode('utf-8', errors='replace'))
+            elif field in ('track_number', 'disc_number') and len(payload) >= 4:
+                _set_tag(metadata, field, struct.unpack('>H', payload[2:4])[0])
+        elif box_type in MP4_CONTAINERS:
+            if box_type == b'meta':
+                # ISO meta is a full box (4 bytes of version/flags), QuickTime meta is not
+                f.seek(data_start + 4)
+                if f.read(4) != b'hdlr':
+                    data_start += 4
+            _read_mp4_boxes(f, data_start, data_end, metadata)
+
+
+def _read_mp4(f, size, metadata):
+    _read_mp4_boxes(f, 0, size, metadata)
+    if metadata['duration'] is None:
+        raise AudioMetadataError("MP4 file has no movie header")
+
+
+# Ogg
+
+def _iter_ogg_packets(f):
+    packet = b''
+    read = 0
+    while read < OGG_HEADER_LIMIT:
+        header = f.read(27)
+        if len(header) < 27 or header[:4] != b'OggS':
+            return
+        segments = f.read(header[26])
+        page = f.read(sum(segments))
+        read += 27 + len(segments) + len(page)
+        position = 0
+        for lacing in segments:
+            packet += page[position:position + lacing]
+            position += lacing
+            if lacing < 255:
+                yield packet
+                packet = b''
+
+
+def _read_vorbis_comments(data, metadata):
+    try:
+        vendor_length = struct.unpack('<I', data[:4])[0]
+        position = 4 + vendor_length
+        count = struct.unpack('<I', data[position:position + 4])[0]
+        position += 4
+        for _ in range(count):
+            length = struct.unpack('<I', data[position:position + 4])[0]
+            comment = data[position + 4:position + 4 + length].decode('utf-8', errors='replace')
+            position += 4 + length
+            key, _, value = comment.partition('=')
+            field = VORBIS_COMMENTS.get(key.upper())
+            if field:
+                _set_tag(metadata, field, value)
+    except struct.error:
+        pass
+
+
+def _read_ogg_last_granule(f, size, serial):
+    tail_start = max(size - OGG_TAIL_SIZE, 0)
+    f.seek(tail_start)
+    tail = f.read()
+    position = tail.rfind(b'OggS')
+    while position != -1:
+        page = tail[position:position + 27]
+        if len(page) == 27 and page[4] == 0:
+            granule, page_serial = struct.unpack('<qI', page[6:18])
+            if page_serial == serial and granule >= 0:
+                return granule
+        position = tail.rfind(b'OggS', 0, position)
+    return None
+
+
+def _read_ogg(f, size, metadata):
+    header = f.read(27)
+    serial = struct.unpack('<I', header[14:18])[0]
+    f.seek(0)
+    packets = _iter_ogg_packets(f)
+    identification = next(packets, b'')
+
+    if identification[:7] == b'\x01vorbis':
+        sample_rate = struct.unpack('<I', identification[12:16])[0]
+        pre_skip = 0
+        comments = next(packets, b'')
+        if comments[:7] == b'\x03vorbis':
+            _read_vorbis_comments(comments[7:], metadata)
+    elif identification[:8] == b'OpusHead':
+        sample_rate = 48000
+        pre_skip = struct.unpack('<H', identification[10:12])[0]
+        comments = next(packets, b'')
+        if comments[:8] == b'OpusTags':
+            _read_vorbis_comments(comments[8:], metadata)
+    else:
+        raise AudioMetadataError("Unsupported Ogg codec")
+
+    granule = _read_ogg_last_granule(f, size, serial)
+    if granule is not None and sample_rate:
+        metadata['duration'] = max(granule - pre_skip, 0) / sample_rate
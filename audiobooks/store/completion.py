@@ -0,0 +1,140 @@
+import logging
+import re
+from bisect import bisect_left
+from collections import namedtuple
+
+from .fragments import catalog_version
+from .search import normalize_search_text
+
+
+logger = logging.getLogger(__name__)
+
+Entry = namedtuple('Entry', 'pk label')
+
+SHORT_PREFIX = 3
+SORT_LIMIT = 2000
+
+# (catalog version, index) per index name, for this process only
+_indexes = {}
+
+
+def words(text):
+    return re.findall(r'[a-z0-9]+', normalize_search_text(text))
+
+
+class CompletionIndex:
+    """
+    Prefix index over the words of a list of labels, kept in display order. A
+    query matches a label when each of its words starts one of the label's
+    words, in any order; labels that start with the whole query come first.
+    Both lookups stop as soon as limit labels are found.
+    """
+
+    def __init__(self, entries):
+        self.entries = entries
+        self.entry_words = [words(entry.label) for entry in entries]
+        labels = sorted((' '.join(label_words), position) for position, label_words in enumerate(self.entry_words))
+        self.labels = [label for label, position in labels]
+        self.label_positions = [position for label, position in labels]
+
+        pairs = sorted(
+            (word, position)
+            for position, label_words in enumerate(self.entry_words)
+            for word in set(label_words)
+        )
+        self.words = [word for word, position in pairs]
+        self.positions = [position for word, position in pairs]
+
+        # Short prefixes match the most labels; their positions are kept ready in display order
+        self.short_prefixes = {}
+        for position, label_words in enumerate(self.entry_words):
+            prefixes = {word[:length] for word in label_words for length in range(1, SHORT_PREFIX + 1)}
+            for prefix in prefixes:
+                self.short_prefixes.setdefault(prefix, []).append(position)
+
+    def candidates(self, prefix):
+        """Positions of the labels with a word starting with prefix, in display order."""
+        if len(prefix) <= SHORT_PREFIX:
+            return self.short_prefixes.get(prefix, [])
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + '\uffff', start)
+        if end - start <= SORT_LIMIT:
+            return sorted(set(self.positions[start:end]))
+        # Common enough that filtering the shorter prefix's labels finds them sooner than sorting
+        return (
+            position for position in self.short_prefixes[prefix[:SHORT_PREFIX]]
+            if any(word.startswith(prefix) for word in self.entry_words[position])
+        )
+
+    def search(self, query, limit):
+        query_words = words(query)
+        if not query_words:
+            return self.entries[:limit]
+
+        phrase = ' '.join(query_words)
+        found = []
+        index = bisect_left(self.labels, phrase)
+        while len(found) < limit and index < len(self.labels) and self.labels[index].startswith(phrase):
+            found.append(self.label_positions[index])
+            index += 1
+
+        # The longest word has the fewest labels to look through
+        query_words.sort(key=len, reverse=True)
+        first, rest = query_words[0], query_words[1:]
+        seen = set(found)
+        candidates = self.candidates(first) if len(found) < limit else []
+        for position in candidates:
+            if position not in seen and all(
+                any(word.startswith(query_word) for word in self.entry_words[position]) for query_word in rest
+            ):
+                found.append(position)
+                if len(found) >= limit:
+                    break
+        return [self.entries[position] for position in found]
+
+
+def author_entries():
+    from .models import Author
+
+    return [
+        Entry(pk, f"{first_name} {last_name}")
+        for pk, first_name, last_name in Author.objects.order_by('last_name', 'first_name')
+        .values_list('pk', 'first_name', 'last_name')
+    ]
+
+
+def genre_entries():
+    from .models import Genre
+
+    return [Entry(*row) for row in Genre.objects.order_by('name').values_list('pk', 'name')]
+
+
+def series_entries():
+    from .models import Series
+
+    return [Entry(*row) for row in Series.objects.order_by('title').values_list('pk', 'title')]
+
+
+LOADERS = {
+    'author': author_entries,
+    'genre': genre_entries,
+    'series': series_entries,
+}
+
+
+def get_index(name):
+    """
+    The index of one model, rebuilt on first use after the catalog version
+    changed. The version is read before loading, so a change made meanwhile
+    leads to one more rebuild rather than a stale index.
+    """
+    version = catalog_version()
+    cached = _indexes.get(name)
+    if cached is None or cached[0] != version:
+        cached = _indexes[name] = (version, CompletionIndex(LOADERS[name]()))
+        logger.debug(f"Completion index '{name}' rebuilt with {len(cached[1].entries)} entries")
+    return cached[1]
+
+
+def complete(name, query, limit):
+    return get_index(name).search(query, limit)
@@ -0,0 +1,25 @@
+from django.db.backends.signals import connection_created
+from django.db.models import CharField, Func
+from django.dispatch import receiver
+
+
+def _unicode_lower(value):
+    return value.lower() if value is not None else None
+
+
+@receiver(connection_created)
+def register_sqlite_functions(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('UNICODE_LOWER', 1, _unicode_lower, deterministic=True)
+
+
+class UnicodeLower(Func):
+    """SQLite's LOWER() only folds ASCII, which breaks case-insensitive search on Cyrillic titles."""
+    function = 'UNICODE_LOWER'
+    output_field = CharField()
+
+    def as_postgresql(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='LOWER', **extra_context)
+
+    as_mysql = as_postgresql
+    as_oracle = as_postgresql
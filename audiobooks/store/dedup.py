@@ -0,0 +1,80 @@
+import hashlib
+import logging
+import os
+import uuid
+
+from django.conf import settings
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def compute_sha256(path, chunk_size=CHUNK_SIZE):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def find_stored_copy(sha256, size=None, exclude_pk=None):
+    """Returns an AudioFile whose stored file has the given content, if any."""
+    from .models import AudioFile
+
+    if not sha256:
+        return None
+    candidates = AudioFile.objects.filter(sha256=sha256).only('pk', 'file', 'crc32', 'sha256')
+    if exclude_pk:
+        candidates = candidates.exclude(pk=exclude_pk)
+    for candidate in candidates:
+        path = candidate.file.path
+        if os.path.isfile(path) and (size is None or os.path.getsize(path) == size):
+            return candidate
+    return None
+
+
+def link_file(source, target):
+    """Replaces target with a hardlink to source; both must be on the same filesystem."""
+    temp_path = f"{target}.{uuid.uuid4().hex[:8]}.link"
+    os.link(source, temp_path)
+    try:
+        os.replace(temp_path, target)
+    except OSError:
+        os.remove(temp_path)
+        raise
+
+
+def deduplicate_audio_file(audio_file):
+    """
+    Hashes the stored file if needed and, when the same content is already stored
+    for another AudioFile, replaces this copy with a hardlink to it. The link count
+    acts as the reference count: deleting either path keeps the data until the last
+    link is gone. Returns the number of bytes freed.
+    """
+    from .models import AudioFile
+
+    path = audio_file.file.path
+    fields = {}
+    if not audio_file.sha256:
+        fields['sha256'] = audio_file.sha256 = compute_sha256(path)
+
+    freed = 0
+    copy = find_stored_copy(audio_file.sha256, os.path.getsize(path), exclude_pk=audio_file.pk) \
+        if settings.AUDIO_DEDUPLICATION else None
+    if copy and not os.path.samefile(copy.file.path, path):
+        stat = os.stat(path)
+        try:
+            link_file(copy.file.path, path)
+        except OSError as e:
+            logger.warning(f"Could not link {audio_file.file.name} to {copy.file.name}: {e}")
+        else:
+            freed = stat.st_size if stat.st_nlink == 1 else 0
+            logger.info(f"{audio_file.file.name} now shares its data with {copy.file.name}")
+            if audio_file.crc32 is None and copy.crc32 is not None:
+                fields['crc32'] = audio_file.crc32 = copy.crc32
+
+    if fields:
+        AudioFile.objects.filter(pk=audio_file.pk).update(**fields)
+    return freed
@@ -81,20 +81,28 @@ class BookForm(forms.ModelForm):
         series = cleaned_data.get('series')
         
         if title and authors is not None:
-            from .utils import custom_slugify
-            
-            author_slugs = "_".join([custom_slugify(author.slug) for author in authors]) \
-                if authors else "no_author"
-            series_slug = series.slug if series else "no_series"
-            new_slug = custom_slugify(f"{author_slugs}_{series_slug}_{title}")
+            from .slugs import compute_book_slug
+
+            new_slug = compute_book_slug(title, list(authors), series)
             if not self.instance.pk or (self.instance.pk and self.instance.slug != new_slug):
-                existing_book = Book.objects.filter(slug=new_slug).exclude(pk=self.instance.pk if self.instance.pk else None).first()
-                
-                if existing_book:
+                if Book.objects.filter(slug=new_slug).exclude(pk=self.instance.pk).exists():
                     raise ValidationError(_('Book with this combination already exists'))
-    
+            self.book_slug = new_slug
+
         return cleaned_data
 
+    def save(self, commit=True):
+        # The slug was computed once in clean(); Book.save and update_book_slug reuse it
+        slug = getattr(self, 'book_slug', None)
+        if slug:
+            self.instance.slug = slug
+            self.instance._slug_computed = True
+        try:
+            return super().save(commit)
+        finally:
+            if commit:
+                self.instance._slug_computed = False
+
 
 class AuthorForm(forms.ModelForm):
     image_fields = ['image']
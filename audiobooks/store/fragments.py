@@ -0,0 +1,59 @@
+import hashlib
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.translation import get_language
+
+
+VERSION_KEY = 'catalog:version'
+
+
+def catalog_version(create=True):
+    """
+    Token that changes whenever the catalog does; every cached fragment is keyed
+    by it, so a change makes all older fragments unreachable at once. With
+    create=False a missing token is not set, and None is returned.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None and create:
+        # Culled or never set: a fresh token only costs a round of cache misses
+        cache.add(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def bump_catalog_version():
+    # A new random token rather than a counter: the file cache has no atomic
+    # increment, and of two racing writers the last one still invalidates
+    cache.set(VERSION_KEY, uuid.uuid4().hex, timeout=None)
+
+
+def catalog_changed():
+    """
+    Invalidates the cached pages once the current transaction commits. Bumping
+    earlier would let a request that still sees the old rows cache them under
+    the new version.
+    """
+    transaction.on_commit(bump_catalog_version)
+
+
+def fragment_key(request, name):
+    params = '&'.join(f'{key}={value}' for key, value in sorted(request.GET.items()))
+    parts = f'{name}:{get_language()}:{int(request.user.is_superuser)}:{params}'
+    return f'fragment:{catalog_version()}:{hashlib.md5(parts.encode()).hexdigest()}'
+
+
+def cached_fragment(request, name, render):
+    """
+    Returns what render() made for this request the last time, as long as the
+    catalog has not changed since. The version is read before render() runs, so
+    anything stored is at least as new as the version it is stored under.
+    """
+    key = fragment_key(request, name)
+    fragment = cache.get(key)
+    if fragment is None:
+        fragment = render()
+        cache.set(key, fragment, settings.FRAGMENT_CACHE_TIMEOUT)
+    return fragment
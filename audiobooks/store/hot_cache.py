@@ -0,0 +1,182 @@
+import logging
+import os
+import shutil
+import uuid
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import F, Sum
+from django.utils import timezone
+
+from .media import file_response, guess_content_type, x_accel_response
+from .volumes import split_volume_name
+
+
+logger = logging.getLogger(__name__)
+
+WARMING_RECHECK = 600
+
+
+def hot_cache_enabled():
+    return bool(settings.MEDIA_HOT_CACHE_DIR and settings.MEDIA_HOT_CACHE_MAX_BYTES)
+
+
+def is_audio_name(name):
+    return split_volume_name(name)[1].startswith('audio/')
+
+
+def get_cached_copy(audio_file):
+    """The hot cache entry of an audio file, if its copy is on disk; never touches the media drive."""
+    from .models import HotCacheEntry
+
+    if not hot_cache_enabled():
+        return None
+    entry = HotCacheEntry.objects.filter(audio_file=audio_file).first()
+    if entry and os.path.isfile(entry.path):
+        return entry
+    return None
+
+
+def touch_entry(entry):
+    type(entry).objects.filter(pk=entry.pk).update(last_used_at=timezone.now(), hits=F('hits') + 1)
+
+
+def record_request(hit):
+    from .models import HotCacheStat
+
+    field = 'hits' if hit else 'misses'
+    today = timezone.localdate()
+    if not HotCacheStat.objects.filter(day=today).update(**{field: F(field) + 1}):
+        stat, created = HotCacheStat.objects.get_or_create(day=today)
+        HotCacheStat.objects.filter(pk=stat.pk).update(**{field: F(field) + 1})
+
+
+def starts_playback(request):
+    """Whether a request reads from the start of the file; players fetch the rest in many ranges."""
+    byte_range = request.headers.get('Range', '')
+    return not byte_range or byte_range.replace(' ', '').startswith('bytes=0-')
+
+
+def serve_cached_audio(request, audio_file):
+    """
+    Answers from the hot cache copy of an audio file, or returns None after
+    queueing the copy of its whole book (at most once per WARMING_RECHECK).
+    Both outcomes are counted per day, once per playback rather than per range.
+    """
+    if not hot_cache_enabled():
+        return None
+    entry = get_cached_copy(audio_file)
+    if starts_playback(request):
+        record_request(hit=entry is not None)
+    if entry is None:
+        queue_book_warming(audio_file.book_id)
+        return None
+
+    touch_entry(entry)
+    content_type = guess_content_type(audio_file.file.name)
+    if settings.MEDIA_X_ACCEL_REDIRECT:
+        return x_accel_response(entry.filename, content_type, prefix=settings.MEDIA_HOT_CACHE_X_ACCEL_PREFIX)
+    return file_response(request, entry.path, content_type)
+
+
+def needs_warming(book_id):
+    """Whether some audio of the book is not in the hot cache yet; one query."""
+    from .models import AudioFile
+
+    if not hot_cache_enabled():
+        return False
+    return AudioFile.objects.filter(book_id=book_id, hot_cache__isnull=True).exists()
+
+
+def queue_book_warming(book_id):
+    """
+    Queues the copy of a book that is not fully cached. Checked at most once
+    per WARMING_RECHECK seconds per book, so a cached detail page stays free of
+    queries on repeat views.
+    """
+    from .tasks import warm_book_cache_task
+
+    if not hot_cache_enabled() or not cache.add(f'hot-cache:checked:{book_id}', True, WARMING_RECHECK):
+        return
+    if needs_warming(book_id):
+        warm_book_cache_task(book_id)
+
+
+def warm_book_cache(book_id):
+    """
+    Copies the audio of a book to MEDIA_HOT_CACHE_DIR in track order, so the
+    first tracks are ready first. A book never takes more than half of the
+    budget, so opening one long book does not flush everything else.
+    """
+    from .models import AudioFile, HotCacheEntry
+
+    if not hot_cache_enabled():
+        return 0
+    audio_files = AudioFile.objects.filter(book_id=book_id).select_related('hot_cache') \
+        .order_by('disc_number', 'track_number', 'file').only('pk', 'file', 'size', 'book_id')
+    budget = settings.MEDIA_HOT_CACHE_MAX_BYTES // 2
+    used, copied = 0, 0
+    os.makedirs(settings.MEDIA_HOT_CACHE_DIR, exist_ok=True)
+    for audio in audio_files:
+        entry = getattr(audio, 'hot_cache', None)
+        if entry and os.path.isfile(entry.path):
+            used += entry.size
+            continue
+        source = audio.file.path
+        try:
+            size = os.path.getsize(source)
+        except OSError as e:
+            logger.warning(f"Not caching {audio.file.name}: {e}")
+            continue
+        if used + size > budget:
+            break
+
+        evict_hot_cache(reserve=size)
+        filename = f"{audio.pk}_{uuid.uuid4().hex[:8]}{os.path.splitext(audio.file.name)[1]}"
+        path = os.path.join(settings.MEDIA_HOT_CACHE_DIR, filename)
+        tmp_path = f"{path}.tmp"
+        try:
+            shutil.copyfile(source, tmp_path)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"Could not cache {audio.file.name}: {e}")
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            continue
+        if entry:
+            entry.delete()
+        HotCacheEntry.objects.create(audio_file=audio, filename=filename, size=size)
+        used += size
+        copied += 1
+    if copied:
+        logger.info(f"Cached {copied} audio files of book {book_id} on local storage")
+    return copied
+
+
+def evict_hot_cache(reserve=0):
+    """Drops the least recently used copies until reserve more bytes fit in the budget."""
+    from .models import HotCacheEntry
+
+    budget = settings.MEDIA_HOT_CACHE_MAX_BYTES - reserve
+    total = 0
+    for entry in HotCacheEntry.objects.order_by('-last_used_at', '-pk'):
+        total += entry.size
+        if total > budget:
+            logger.info(f"Evicting hot cache copy {entry.filename}")
+            entry.delete()
+
+
+def hot_cache_summary(days=30):
+    from .models import HotCacheEntry, HotCacheStat
+
+    since = timezone.localdate() - timedelta(days=days)
+    totals = HotCacheStat.objects.filter(day__gte=since).aggregate(hits=Sum('hits'), misses=Sum('misses'))
+    hits, misses = totals['hits'] or 0, totals['misses'] or 0
+    return {
+        'hits': hits,
+        'misses': misses,
+        'hit_ratio': round(hits / (hits + misses), 3) if hits + misses else None,
+        'files': HotCacheEntry.objects.count(),
+        'bytes': HotCacheEntry.objects.aggregate(size=Sum('size'))['size'] or 0,
+    }
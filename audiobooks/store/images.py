@@ -0,0 +1,142 @@
+import io
+import logging
+import os
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from .fragments import catalog_changed
+from .jobs import delete_stored_file
+
+
+logger = logging.getLogger(__name__)
+
+VARIANT_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 4}),
+    'jpeg': ('JPEG', {'quality': 82, 'optimize': True, 'progressive': True}),
+}
+TILE_SIZES = '240px'
+# Width of the JPEG given as plain src to browsers that ignore srcset
+FALLBACK_WIDTH = 480
+
+
+def variant_name(name, token, width, extension):
+    directory, filename = os.path.split(name)
+    return f"{directory}/thumbs/{os.path.splitext(filename)[0]}_{token}_{width}.{extension}"
+
+
+def variant_names(variants):
+    return [name for extension in VARIANT_FORMATS for name in (variants or {}).get(extension, {}).values()]
+
+
+def delete_image_variants(variants):
+    for name in variant_names(variants):
+        delete_stored_file(name)
+
+
+def load_image(name, max_width):
+    """Opens a stored image upright; JPEGs are decoded at a reduced scale when they are far bigger than needed."""
+    with default_storage.open(name, 'rb') as f:
+        image = Image.open(f)
+        image.draft(None, (max_width, max_width))
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    return image
+
+
+def prepare(image, extension):
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    if extension == 'webp' and has_alpha:
+        return image.convert('RGBA')
+    if has_alpha:
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image.convert('RGBA'), mask=image.convert('RGBA').getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def render_variants(image, name, token):
+    """
+    Downscales an image to every IMAGE_VARIANT_WIDTHS width below its own (or
+    keeps its width if it is smaller than all of them) and saves each as WebP
+    and JPEG. Nothing but the colour profile is carried over, so EXIF is gone.
+    """
+    widths = [width for width in settings.IMAGE_VARIANT_WIDTHS if width < image.width] or [image.width]
+    icc_profile = image.info.get('icc_profile')
+    variants = {extension: {} for extension in VARIANT_FORMATS}
+    for width in widths:
+        height = max(round(image.height * width / image.width), 1)
+        resized = image if width == image.width else image.resize((width, height), Image.LANCZOS)
+        for extension, (image_format, options) in VARIANT_FORMATS.items():
+            buffer = io.BytesIO()
+            prepare(resized, extension).save(buffer, image_format, icc_profile=icc_profile, **options)
+            saved = default_storage.save(variant_name(name, token, width, extension), ContentFile(buffer.getvalue()))
+            variants[extension][str(width)] = saved
+    return variants
+
+
+def generate_image_variants(instance, field_name='image', force=False):
+    """
+    Renders the variants of an image field and records them in <field>_variants,
+    together with the image they were made from. Variants of an older image are
+    deleted; ones made for an image that was replaced meanwhile are dropped.
+    Returns the new variants, or None when none were made.
+    """
+    image = getattr(instance, field_name)
+    variants_field = f'{field_name}_variants'
+    current = getattr(instance, variants_field) or {}
+    if not image or (not force and current.get('source') == image.name):
+        return None
+
+    try:
+        original = load_image(image.name, max(settings.IMAGE_VARIANT_WIDTHS))
+        variants = render_variants(original, image.name, uuid.uuid4().hex[:8])
+    except (OSError, ValueError, Image.DecompressionBombError) as e:
+        logger.warning(f"Could not make variants of {image.name}: {e}")
+        return None
+    variants['source'] = image.name
+
+    model = type(instance)
+    if not model.objects.filter(pk=instance.pk, **{field_name: image.name}).update(**{variants_field: variants}, updated_at=timezone.now()):
+        delete_image_variants(variants)
+        return None
+    delete_image_variants(current)
+    setattr(instance, variants_field, variants)
+    catalog_changed()
+    return variants
+
+
+def image_sources(obj, default='', field_name='image'):
+    """
+    What a template needs to show an image: src, and when its variants are
+    ready, the JPEG and WebP srcsets. Until then the original is used.
+    """
+    image = getattr(obj, field_name)
+    if not image:
+        return {'src': default}
+    variants = getattr(obj, f'{field_name}_variants') or {}
+    if variants.get('source') != image.name:
+        return {'src': image.url}
+
+    def srcset(extension):
+        return ', '.join(
+            f"{default_storage.url(name)} {width}w"
+            for width, name in sorted(variants[extension].items(), key=lambda item: int(item[0]))
+        )
+
+    jpeg = sorted(variants['jpeg'].items(), key=lambda item: int(item[0]))
+    fallback = next((name for width, name in jpeg if int(width) >= FALLBACK_WIDTH), jpeg[-1][1])
+    return {'src': default_storage.url(fallback), 'srcset': srcset('jpeg'), 'webp_srcset': srcset('webp')}
+
+
+def smallest_variant_url(obj, field_name='image'):
+    image = getattr(obj, field_name)
+    variants = getattr(obj, f'{field_name}_variants') or {}
+    if not image or variants.get('source') != image.name:
+        return None
+    width, name = min(variants['jpeg'].items(), key=lambda item: int(item[0]))
+    return default_storage.url(name)
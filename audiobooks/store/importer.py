@@ -0,0 +1,346 @@
+import hashlib
+import logging
+import os
+import re
+import shutil
+import time
+import zlib
+from concurrent.futures import ProcessPoolExecutor
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.utils import timezone
+
+from .audiometa import read_audio_metadata
+from .ingest import METADATA_FIELDS, update_book_totals
+from .moves import move_path
+from .slugs import compute_book_slug
+from .utils import book_audio_dir, custom_slugify
+from .volumes import placed_name
+
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {'.mp3', '.m4a', '.m4b', '.mp4', '.aac', '.ogg', '.oga', '.opus', '.flac', '.wav'}
+EMPTY_PARTS = {'no_author', 'no_series'}
+CHUNK_SIZE = 1024 * 1024
+
+
+def probe_file(args):
+    """Reads the headers (and optionally the checksums) of one file; runs in a worker process."""
+    path, with_hash = args
+    result = {'path': path, 'size': os.path.getsize(path)}
+    try:
+        result.update(read_audio_metadata(path))
+    except Exception as e:
+        # One damaged file must not take the whole import down with it
+        result['error'] = str(e) or type(e).__name__
+    if with_hash:
+        digest, crc = hashlib.sha256(), 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+                digest.update(chunk)
+                crc = zlib.crc32(chunk, crc)
+        result['sha256'] = digest.hexdigest()
+        result['crc32'] = crc
+    return result
+
+
+def find_book_dirs(root):
+    """Yields (directory, sorted audio file names) for every directory holding audio."""
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames.sort()
+        names = sorted(name for name in filenames if os.path.splitext(name)[1].lower() in AUDIO_EXTENSIONS)
+        if names:
+            yield dirpath, names
+
+
+def prettify(name):
+    if ' ' not in name:
+        name = name.replace('_', ' ')
+    name = re.sub(r'\s+', ' ', name).strip()
+    return name[:1].upper() + name[1:]
+
+
+def split_names(value):
+    return [name.strip() for name in re.split(r'[,;&/]', value or '') if name.strip()]
+
+
+class LibraryImporter:
+    """
+    Imports a directory tree of audio files: every directory holding audio becomes a
+    book, its parents name the series and the authors (the same
+    <authors>/<series>/<book> shape the slug layout writes), and tags fill in what
+    the path does not say. Rows are written with bulk_create per batch, so the
+    per-object signals do not run; the search index and the book totals are
+    updated explicitly instead. Books and files that already exist are reused, so
+    an interrupted import can simply be started again.
+    """
+
+    def __init__(self, root, mode='copy', with_hash=False, workers=None, batch_size=500, dry_run=False, log=None):
+        from .models import AudioFile, Author, Book, Series
+
+        self.root = os.path.abspath(root)
+        media_root = os.path.abspath(settings.MEDIA_ROOT)
+        self.in_place = self.root == media_root or self.root.startswith(media_root + os.sep)
+        self.media_root = media_root
+        self.mode = mode
+        self.with_hash = with_hash
+        self.workers = workers or os.cpu_count() or 1
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.log = log or logger.info
+
+        self.authors = {author.slug: author for author in Author.objects.only('pk', 'slug', 'first_name', 'last_name')}
+        self.series = {series.slug: series for series in Series.objects.only('pk', 'slug', 'title')}
+        self.books = {book.slug: book for book in Book.objects.only('pk', 'slug', 'title', 'series')}
+        self.stored_names = set(AudioFile.objects.values_list('file', flat=True))
+        self.stored_keys = {(book_id, os.path.basename(name)) for book_id, name in
+                            AudioFile.objects.values_list('book_id', 'file')}
+        self.stats = {'books': 0, 'new_books': 0, 'files': 0, 'skipped': 0, 'unreadable': 0, 'bytes': 0}
+        self.started = None
+
+    def run(self, report=None):
+        self.started = time.monotonic()
+        batch, batch_files = [], 0
+        pool = ProcessPoolExecutor(max_workers=self.workers) if self.workers > 1 else None
+        try:
+            for directory, names in find_book_dirs(self.root):
+                batch.append((directory, names))
+                batch_files += len(names)
+                if batch_files >= self.batch_size:
+                    self.import_batch(batch, pool)
+                    batch, batch_files = [], 0
+                    if report:
+                        report(self.throughput())
+            if batch:
+                self.import_batch(batch, pool)
+        finally:
+            if pool:
+                pool.shutdown()
+        return self.throughput()
+
+    def throughput(self):
+        elapsed = max(time.monotonic() - self.started, 1e-6)
+        return dict(
+            self.stats,
+            elapsed=elapsed,
+            files_per_second=(self.stats['files'] + self.stats['skipped']) / elapsed,
+            mb_per_second=self.stats['bytes'] / elapsed / (1024 * 1024),
+        )
+
+    def probe(self, paths, pool):
+        tasks = [(path, self.with_hash) for path in paths]
+        if pool is None:
+            return [probe_file(task) for task in tasks]
+        return list(pool.map(probe_file, tasks, chunksize=16))
+
+    def stored_name(self, path):
+        return os.path.relpath(path, self.media_root).replace(os.sep, '/')
+
+    def import_batch(self, batch, pool):
+        paths = []
+        for directory, names in batch:
+            for name in names:
+                path = os.path.join(directory, name)
+                if self.in_place and self.stored_name(path) in self.stored_names:
+                    self.stats['skipped'] += 1
+                    continue
+                paths.append(path)
+        probes = {probe['path']: probe for probe in self.probe(paths, pool)}
+        self.stats['bytes'] += sum(probe['size'] for probe in probes.values())
+        for probe in probes.values():
+            if 'error' in probe:
+                self.stats['unreadable'] += 1
+                self.log(f"Unreadable, imported without metadata: {probe['path']} ({probe['error']})")
+
+        plans = []
+        for directory, names in batch:
+            files = [probes[os.path.join(directory, name)] for name in names if os.path.join(directory, name) in probes]
+            if files:
+                plans.append(self.plan_book(directory, files))
+        if self.dry_run:
+            for plan in plans:
+                authors = ', '.join(str(author) for author in plan['authors']) or '-'
+                series = plan['series'].title if plan['series'] else '-'
+                state = 'new' if plan['book'].pk is None else 'existing'
+                self.log(f"{plan['book'].title} | {authors} | {series} | {len(plan['files'])} files ({state})")
+                self.stats['books'] += 1
+                self.stats['new_books'] += plan['book'].pk is None
+                self.stats['files'] += len(plan['files'])
+            return plans
+        self.save_batch(plans)
+        return plans
+
+    def plan_book(self, directory, files):
+        from .models import Book
+
+        relative = os.path.relpath(directory, self.root)
+        parts = [] if relative == '.' else relative.split(os.sep)
+        if self.in_place and parts and parts[0] == 'audio':
+            parts = parts[1:]
+        title_part = parts[-1] if parts else os.path.basename(self.root)
+        series_part = parts[-2] if len(parts) >= 3 else None
+        author_part = parts[-3] if len(parts) >= 3 else parts[-2] if len(parts) == 2 else None
+
+        tags = files[0]
+        authors = self.authors_from_dir(author_part) if author_part else []
+        if not authors:
+            authors = self.authors_from_names(split_names(tags.get('artist')))
+        series = self.series_from_dir(series_part)
+
+        # Directories written by the slug layout repeat the authors and the series in the book name
+        prefix = f"{author_part}_{series_part}_" if author_part and series_part else None
+        if prefix and title_part.startswith(prefix) and len(title_part) > len(prefix):
+            title = prettify(title_part[len(prefix):])
+        elif author_part:
+            title = prettify(title_part)
+        else:
+            title = (tags.get('album') or prettify(title_part)).strip()
+
+        slug = compute_book_slug(title, authors, series)
+        book = self.books.get(slug)
+        if book is None:
+            book = Book(title=title[:200], series=series, slug=slug)
+            self.books[slug] = book
+        return {'book': book, 'authors': authors, 'series': series, 'files': files}
+
+    def get_author(self, first_name, last_name):
+        from .models import Author
+
+        slug = custom_slugify(f"{last_name} {first_name}")
+        if not slug:
+            return None
+        if slug not in self.authors:
+            self.authors[slug] = Author(first_name=first_name[:100], last_name=last_name[:100], slug=slug)
+        return self.authors[slug]
+
+    def authors_from_names(self, names):
+        authors = []
+        for name in names:
+            words = name.split()
+            if len(words) < 2:
+                logger.warning(f"Skipping author '{name}': first and last name are required")
+                continue
+            author = self.get_author(' '.join(words[:-1]), words[-1])
+            if author and author not in authors:
+                authors.append(author)
+        return authors
+
+    def authors_from_dir(self, part):
+        if part in EMPTY_PARTS:
+            return []
+        if ' ' in part or ',' in part:
+            return self.authors_from_names(split_names(part))
+
+        # "<last>_<first>" slugs, several of them joined with "_"; known authors win
+        tokens = part.split('_')
+        authors, start = [], 0
+        while start < len(tokens):
+            for end in range(len(tokens), start, -1):
+                author = self.authors.get('_'.join(tokens[start:end]))
+                if author:
+                    break
+            else:
+                end = start + 2
+                if end > len(tokens):
+                    logger.warning(f"Skipping author '{tokens[start]}' in {part}: first and last name are required")
+                    break
+                author = self.get_author(prettify(tokens[start + 1]), prettify(tokens[start]))
+            if author and author not in authors:
+                authors.append(author)
+            start = end
+        return authors
+
+    def series_from_dir(self, part):
+        from .models import Series
+
+        if not part or part in EMPTY_PARTS:
+            return None
+        slug = custom_slugify(part)
+        if not slug:
+            return None
+        if slug not in self.series:
+            self.series[slug] = Series(title=prettify(part)[:200], slug=slug)
+        return self.series[slug]
+
+    def save_batch(self, plans):
+        from .models import AudioFile, Author, Book, Series
+        from . import search
+
+        new_authors = list({id(a): a for plan in plans for a in plan['authors'] if a.pk is None}.values())
+        new_series = list({id(s): s for s in (plan['series'] for plan in plans) if s and s.pk is None}.values())
+        new_books = list({id(p['book']): p['book'] for p in plans if p['book'].pk is None}.values())
+
+        with transaction.atomic():
+            Author.objects.bulk_create(new_authors)
+            Series.objects.bulk_create(new_series)
+            Book.objects.bulk_create(new_books)
+            new_book_ids = {book.pk for book in new_books}
+            Book.authors.through.objects.bulk_create([
+                Book.authors.through(book_id=plan['book'].pk, author_id=author.pk)
+                for plan in plans if plan['book'].pk in new_book_ids
+                for author in plan['authors']
+            ], ignore_conflicts=True)
+
+        audio_files = []
+        for plan in plans:
+            book = plan['book']
+            self.stats['books'] += 1
+            target_dir = None
+            for probe in plan['files']:
+                basename = os.path.basename(probe['path'])
+                if self.in_place:
+                    name = self.stored_name(probe['path'])
+                else:
+                    if (book.pk, basename) in self.stored_keys:
+                        self.stats['skipped'] += 1
+                        continue
+                    target_dir = target_dir or placed_name(book_audio_dir(book), probe['size'], book)
+                    name = self.place_file(probe, f"{target_dir}/{basename}")
+                fields = {field: probe.get(field) for field in METADATA_FIELDS}
+                fields['size'] = probe['size']
+                fields['title'] = (fields['title'] or '')[:255]
+                audio_files.append(AudioFile(
+                    book=book, file=name, sha256=probe.get('sha256', ''), crc32=probe.get('crc32'),
+                    scanned_at=timezone.now(), **fields
+                ))
+                self.stored_names.add(name)
+                self.stored_keys.add((book.pk, basename))
+
+        with transaction.atomic():
+            AudioFile.objects.bulk_create(audio_files, batch_size=500)
+        self.stats['files'] += len(audio_files)
+        self.stats['new_books'] += len(new_books)
+
+        for obj in new_authors + new_series:
+            search.index_object(obj)
+        if new_book_ids:
+            search.index_books(Book.objects.filter(pk__in=new_book_ids))
+        update_book_totals({audio.book_id for audio in audio_files})
+
+    def place_file(self, probe, name):
+        """Copies, moves or links a file into MEDIA_ROOT; a file left by an interrupted run is reused."""
+        source = probe['path']
+        target = default_storage.path(name)
+        if os.path.exists(target):
+            if os.path.getsize(target) == probe['size']:
+                return name
+            name = default_storage.get_available_name(name)
+            target = default_storage.path(name)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        temp_path = f"{target}.importing"
+        if self.mode == 'move':
+            move_path(source, target)
+            return name
+        if self.mode == 'link':
+            try:
+                os.link(source, temp_path)
+            except OSError as e:
+                logger.warning(f"Could not hardlink {source} ({e}), copying instead")
+                shutil.copyfile(source, temp_path)
+        else:
+            shutil.copyfile(source, temp_path)
+        os.replace(temp_path, target)
+        return name
@@ -0,0 +1,75 @@
+import logging
+import os
+
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .audiometa import AudioMetadataError, read_audio_metadata
+from .fragments import catalog_changed
+from .space import book_author_ids, queue_volume_totals, update_author_totals
+
+
+logger = logging.getLogger(__name__)
+
+METADATA_FIELDS = ('size', 'duration', 'bitrate', 'title', 'track_number', 'disc_number')
+
+
+def ingest_audio_file(audio_file):
+    """Reads the headers of an audio file and stores what they say on its row."""
+    from .models import AudioFile
+
+    fields = {'scanned_at': timezone.now()}
+    try:
+        metadata = read_audio_metadata(audio_file.file.path)
+        fields.update({name: metadata[name] for name in METADATA_FIELDS})
+    except (AudioMetadataError, OSError, ValueError, IndexError) as e:
+        logger.warning(f"Could not read metadata of {audio_file.file.name}: {e}")
+        if os.path.isfile(audio_file.file.path):
+            fields['size'] = os.path.getsize(audio_file.file.path)
+
+    AudioFile.objects.filter(pk=audio_file.pk).update(**fields)
+    for name, value in fields.items():
+        setattr(audio_file, name, value)
+    return audio_file
+
+
+def update_book_totals(book_ids):
+    """
+    Recomputes the denormalized listening time and size of the given books,
+    then the bytes of their authors and, once the transaction commits, of
+    every volume.
+    """
+    from .models import Book
+
+    if isinstance(book_ids, int):
+        book_ids = [book_ids]
+    if not book_ids:
+        return
+    for book_id in book_ids:
+        totals = Book.objects.filter(pk=book_id).aggregate(
+            duration=Coalesce(Sum('audio_files__duration'), 0.0),
+            size=Coalesce(Sum('audio_files__size'), 0),
+        )
+        Book.objects.filter(pk=book_id).update(
+            total_duration=totals['duration'], total_size=totals['size'], updated_at=timezone.now(),
+        )
+    update_author_totals(book_author_ids(book_ids))
+    queue_volume_totals()
+    catalog_changed()
+
+
+def scan_audio_files(queryset, batch_size=500):
+    """Ingests every file in the queryset; yields the number done so far."""
+    book_ids = set()
+    done = 0
+    for audio_file in queryset.only('pk', 'file', 'book_id').iterator(chunk_size=batch_size):
+        ingest_audio_file(audio_file)
+        book_ids.add(audio_file.book_id)
+        done += 1
+        if done % batch_size == 0:
+            update_book_totals(book_ids)
+            book_ids = set()
+            yield done
+    update_book_totals(book_ids)
+    yield done
@@ -0,0 +1,91 @@
+import contextvars
+import logging
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 20
+PRIORITY_NORMAL = 10
+PRIORITY_LOW = 0
+
+_deferred_file_deletions = contextvars.ContextVar('deferred_file_deletions', default=None)
+
+
+def create_job(kind, user=None, total=0):
+    from .models import Job
+
+    return Job.objects.create(kind=kind, user=user if user and user.is_authenticated else None, progress_total=total)
+
+
+def update_job(job, **fields):
+    for name, value in fields.items():
+        setattr(job, name, value)
+    job.save(update_fields=list(fields) + ['updated_at'])
+
+
+def set_progress(job, current, total=None):
+    if job is None:
+        return
+    fields = {'progress_current': current}
+    if total is not None:
+        fields['progress_total'] = total
+    update_job(job, **fields)
+
+
+def run_job(job_id, func, *args, **kwargs):
+    """
+    Runs func(job, *args, **kwargs) inside a background task and mirrors its outcome on
+    the Job row. Exceptions are re-raised so background_task retries with backoff;
+    the job only turns "failed" once MAX_ATTEMPTS is used up.
+    """
+    from .models import Job
+
+    job = Job.objects.filter(pk=job_id).first() if job_id else None
+    if job is None:
+        return func(None, *args, **kwargs)
+
+    update_job(job, status=Job.STATUS_RUNNING, attempts=job.attempts + 1)
+    try:
+        result = func(job, *args, **kwargs)
+    except Exception as e:
+        final = job.attempts >= settings.MAX_ATTEMPTS
+        update_job(job, status=Job.STATUS_FAILED if final else Job.STATUS_RETRYING, message=str(e))
+        logger.error(f"Job {job} failed: {e}")
+        raise
+    update_job(job, status=Job.STATUS_DONE, result=result, progress_current=job.progress_total)
+    return result
+
+
+def delete_stored_file(name):
+    """Deletes a media file, or queues it when inside collect_file_deletions()."""
+    if not name:
+        return
+    pending = _deferred_file_deletions.get()
+    if pending is not None:
+        pending.append(name)
+    elif default_storage.exists(name):
+        default_storage.delete(name)
+
+
+@contextmanager
+def collect_file_deletions():
+    names = []
+    token = _deferred_file_deletions.set(names)
+    try:
+        yield names
+    finally:
+        _deferred_file_deletions.reset(token)
+
+
+def delete_files(job, names):
+    set_progress(job, 0, len(names))
+    for index, name in enumerate(names, start=1):
+        if default_storage.exists(name):
+            default_storage.delete(name)
+        if index % 50 == 0:
+            set_progress(job, index)
+    return {'deleted': len(names)}
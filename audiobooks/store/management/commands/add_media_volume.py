@@ -0,0 +1,28 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import Volume
+from store.volumes import check_volume, default_volume_root, read_marker
+
+
+class Command(BaseCommand):
+    help = 'Register a mounted drive as a media volume that new files can be placed on'
+
+    def add_arguments(self, parser):
+        parser.add_argument('name', help='Volume name, used in stored file names as volumes/<name>/')
+        parser.add_argument('--path', default='', help='Mount point, MEDIA_ROOT/volumes/<name> by default')
+        parser.add_argument('--priority', type=int, default=0, help='Order for MEDIA_PLACEMENT_POLICY=priority')
+
+    def handle(self, *args, **options):
+        if Volume.objects.filter(name=options['name']).exists():
+            raise CommandError(f'Volume "{options["name"]}" already exists')
+        root = options['path'] or default_volume_root(options['name'])
+        if not os.path.isdir(root):
+            raise CommandError(f'Nothing is mounted at {root}')
+        if read_marker(root):
+            raise CommandError(f'{root} already belongs to a volume')
+
+        volume = Volume.objects.create(name=options['name'], path=options['path'], priority=options['priority'])
+        check_volume(volume)
+        self.stdout.write(self.style.SUCCESS(f'Added volume "{volume.name}" at {root}'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from store.models import Volume
+from store.volumes import check_volume, volume_root
+
+
+class Command(BaseCommand):
+    help = 'Check that every media volume is mounted and refresh its capacity and free space'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--fix', action='store_true',
+                            help='Point a volume found under MEDIA_VOLUME_SEARCH_PATHS at its new mount point')
+
+    def handle(self, *args, **options):
+        for volume in Volume.objects.all():
+            status = check_volume(volume, fix=options['fix'])
+            if status == Volume.STATUS_ONLINE:
+                self.stdout.write(self.style.SUCCESS(
+                    f'{volume.name}: online at {volume_root(volume)}, '
+                    f'{filesizeformat(volume.free)} free of {filesizeformat(volume.capacity)}'
+                ))
+            elif status == Volume.STATUS_MOVED:
+                self.stdout.write(self.style.ERROR(
+                    f'{volume.name}: not at {volume_root(volume)} but at {volume.found_at} (run with --fix)'
+                ))
+            else:
+                self.stdout.write(self.style.ERROR(f'{volume.name}: missing, nothing mounted at {volume_root(volume)}'))
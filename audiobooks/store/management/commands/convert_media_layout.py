@@ -0,0 +1,45 @@
+import os
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from store.models import AudioFile, Book
+from store.moves import move_book_audio
+from store.utils import book_audio_dir
+from store.volumes import split_volume_name
+
+
+class Command(BaseCommand):
+    help = 'Move existing audio files into the slug- or id-based storage layout (AUDIO_STORAGE_LAYOUT)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--to', choices=['slug', 'id'], help='Target layout, AUDIO_STORAGE_LAYOUT by default')
+        parser.add_argument('--dry-run', action='store_true', help='Only report what would be moved')
+
+    def handle(self, *args, **options):
+        layout = options['to'] or settings.AUDIO_STORAGE_LAYOUT
+        if layout != settings.AUDIO_STORAGE_LAYOUT:
+            self.stdout.write(self.style.WARNING(
+                f'AUDIO_STORAGE_LAYOUT is "{settings.AUDIO_STORAGE_LAYOUT}", new uploads will not use "{layout}"'
+            ))
+
+        moved = 0
+        books = Book.objects.order_by('pk').prefetch_related('authors').select_related('series')
+        for book in books.iterator(chunk_size=200):
+            target_dir = book_audio_dir(book, layout)
+            if options['dry_run']:
+                for audio in AudioFile.objects.filter(book=book).only('file'):
+                    if split_volume_name(os.path.dirname(audio.file.name))[1] != target_dir:
+                        self.stdout.write(f'{audio.file.name} -> {target_dir}/')
+                        moved += 1
+                continue
+            try:
+                count = move_book_audio(book, target_dir)
+            except OSError as e:
+                raise CommandError(f'Failed to move files of "{book.slug}": {e}')
+            if count:
+                self.stdout.write(f'{book.slug}: {count} files -> {target_dir}/')
+            moved += count
+
+        action = 'Would move' if options['dry_run'] else 'Moved'
+        self.stdout.write(self.style.SUCCESS(f'{action} {moved} audio files to the "{layout}" layout'))
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from store.dedup import deduplicate_audio_file
+from store.models import AudioFile
+
+
+class Command(BaseCommand):
+    help = 'Hash stored audio files and replace identical copies with hardlinks to a single one'
+
+    def handle(self, *args, **options):
+        queryset = AudioFile.objects.order_by('pk').only('pk', 'file', 'sha256', 'crc32')
+        total = queryset.count()
+        freed = 0
+        for done, audio_file in enumerate(queryset.iterator(chunk_size=500), start=1):
+            try:
+                freed += deduplicate_audio_file(audio_file)
+            except OSError as e:
+                self.stderr.write(f'{audio_file.file.name}: {e}')
+            if done % 100 == 0:
+                self.stdout.write(f'Checked {done}/{total} files')
+        self.stdout.write(self.style.SUCCESS(f'Checked {total} audio files, freed {filesizeformat(freed)}'))
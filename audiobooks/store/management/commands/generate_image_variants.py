@@ -0,0 +1,27 @@
+from django.core.management.base import BaseCommand
+
+from store.images import generate_image_variants
+from store.models import Author, Book, Genre, Series
+
+MODELS = {'book': Book, 'author': Author, 'series': Series, 'genre': Genre}
+
+
+class Command(BaseCommand):
+    help = 'Make the downscaled WebP and JPEG variants of cover images that do not have them yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--model', choices=sorted(MODELS), action='append',
+                            help='Only these kinds of objects (repeatable); all of them by default')
+        parser.add_argument('--force', action='store_true', help='Render the variants again even if they are current')
+
+    def handle(self, *args, **options):
+        done = 0
+        for name in options['model'] or sorted(MODELS):
+            queryset = MODELS[name].objects.exclude(image='').exclude(image__isnull=True) \
+                .only('pk', 'image', 'image_variants').order_by('pk')
+            for instance in queryset.iterator(chunk_size=200):
+                if generate_image_variants(instance, force=options['force']):
+                    done += 1
+                    if done % 100 == 0:
+                        self.stdout.write(f'{done} images done')
+        self.stdout.write(self.style.SUCCESS(f'Made variants of {done} images'))
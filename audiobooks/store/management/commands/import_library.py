@@ -0,0 +1,44 @@
+import os
+
+from django.core.management.base import BaseCommand, CommandError
+
+from store.importer import LibraryImporter
+
+
+class Command(BaseCommand):
+    help = 'Import an existing <authors>/<series>/<book>/ tree of audio files as books'
+
+    def add_arguments(self, parser):
+        parser.add_argument('root', help='Directory to import; files inside MEDIA_ROOT are used where they are')
+        parser.add_argument('--mode', choices=['copy', 'move', 'link'], default='copy',
+                            help='How files outside MEDIA_ROOT get into it (link makes hardlinks)')
+        parser.add_argument('--hash', action='store_true', help='Also compute sha256 and crc32 of every file')
+        parser.add_argument('--workers', type=int, help='Processes reading file headers, one per CPU by default')
+        parser.add_argument('--batch-size', type=int, default=500, help='Files written per database batch')
+        parser.add_argument('--dry-run', action='store_true', help='Only report the books that would be imported')
+
+    def handle(self, *args, **options):
+        if not os.path.isdir(options['root']):
+            raise CommandError(f'Not a directory: {options["root"]}')
+
+        importer = LibraryImporter(
+            options['root'], mode=options['mode'], with_hash=options['hash'], workers=options['workers'],
+            batch_size=options['batch_size'], dry_run=options['dry_run'], log=self.stdout.write,
+        )
+        stats = importer.run(report=self.report)
+        self.report(stats)
+        action = 'Would import' if options['dry_run'] else 'Imported'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} {stats["files"]} files into {stats["books"]} books ({stats["new_books"]} new), '
+            f'{stats["skipped"]} files already imported'
+        ))
+        if stats['unreadable']:
+            self.stdout.write(self.style.WARNING(
+                f'{stats["unreadable"]} files had unreadable headers and were imported without metadata'
+            ))
+
+    def report(self, stats):
+        self.stdout.write(
+            f'{stats["files"] + stats["skipped"]} files in {stats["elapsed"]:.1f}s: '
+            f'{stats["files_per_second"]:.1f} files/s, {stats["mb_per_second"]:.1f} MB/s'
+        )
@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.template.defaultfilters import filesizeformat
+
+from store.jobs import create_job
+from store.models import Volume
+from store.tasks import move_book_to_volume_task
+from store.volumes import plan_rebalance
+
+
+class Command(BaseCommand):
+    help = 'Queue background jobs that move books between media volumes to even out their free space'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--drain', help='Move every book off this volume instead')
+        parser.add_argument('--tolerance', type=float, default=0.05,
+                            help='Acceptable difference in the share of free space between volumes')
+        parser.add_argument('--dry-run', action='store_true', help='Only print the planned moves')
+
+    def handle(self, *args, **options):
+        if options['drain'] and not Volume.objects.filter(name=options['drain']).exists():
+            raise CommandError(f'Unknown volume "{options["drain"]}"')
+
+        moves = plan_rebalance(tolerance=options['tolerance'], drain=options['drain'])
+        for book, source, target in moves:
+            self.stdout.write(f'{book.slug}: {source} -> {target} ({filesizeformat(book.total_size)})')
+            if not options['dry_run']:
+                job = create_job('move_book_to_volume')
+                move_book_to_volume_task(book.pk, target, job_id=job.pk)
+
+        action = 'Would move' if options['dry_run'] else 'Queued moves of'
+        total = sum(book.total_size for book, source, target in moves)
+        self.stdout.write(self.style.SUCCESS(f'{action} {len(moves)} books ({filesizeformat(total)})'))
@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import filesizeformat
+
+from store.reconcile import dispose_orphans, reconcile
+
+
+class Command(BaseCommand):
+    help = 'Find media files no row points at and rows whose file is missing'
+
+    def add_arguments(self, parser):
+        action = parser.add_mutually_exclusive_group()
+        action.add_argument('--quarantine', action='store_true', help='Move orphaned files to MEDIA_QUARANTINE_DIR')
+        action.add_argument('--delete', action='store_true', help='Delete orphaned files')
+        parser.add_argument('--full', action='store_true', help='Ignore the index and list every directory again')
+        parser.add_argument('--workers', type=int, default=8, help='Directories listed in parallel')
+        parser.add_argument('--min-age', type=int, default=3600,
+                            help='Seconds a file must be unchanged before it counts as orphaned')
+
+    def handle(self, *args, **options):
+        report = reconcile(full=options['full'], workers=options['workers'], min_age=options['min_age'])
+        self.stdout.write(
+            f'{report["files"]} files in {report["directories_scanned"] + report["directories_reused"]} directories '
+            f'({report["directories_reused"]} unchanged since the last scan) in {report["elapsed"]:.1f}s'
+        )
+
+        for name, size in report['orphans']:
+            self.stdout.write(f'orphan: {name} ({filesizeformat(size)})')
+        for label, pk, field, name in report['dangling']:
+            self.stdout.write(f'missing: {label} {pk} {field} -> {name}')
+        for volume in report['offline_volumes']:
+            self.stdout.write(self.style.ERROR(f'Volume "{volume}" is not mounted, its files were not checked'))
+        self.stdout.write(self.style.WARNING(
+            f'{len(report["orphans"])} orphaned files ({filesizeformat(report["orphan_bytes"])}), '
+            f'{len(report["dangling"])} rows with a missing file'
+        ))
+
+        if report['orphans'] and (options['quarantine'] or options['delete']):
+            action = 'delete' if options['delete'] else 'quarantine'
+            disposed = dispose_orphans([name for name, size in report['orphans']], action)
+            verb = 'Deleted' if action == 'delete' else 'Quarantined'
+            self.stdout.write(self.style.SUCCESS(f'{verb} {len(disposed)} orphaned files'))
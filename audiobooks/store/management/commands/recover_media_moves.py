@@ -0,0 +1,11 @@
+from django.core.management.base import BaseCommand
+
+from store.moves import recover_moves
+
+
+class Command(BaseCommand):
+    help = 'Finish book directory moves that were interrupted, using their journals'
+
+    def handle(self, *args, **options):
+        recovered = recover_moves()
+        self.stdout.write(self.style.SUCCESS(f'Finished {recovered} interrupted moves'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+
+from store.ingest import scan_audio_files, update_book_totals
+from store.models import AudioFile, Book
+
+
+class Command(BaseCommand):
+    help = 'Read duration, bitrate, size and tags of audio files that have not been scanned yet'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Rescan files that were already scanned')
+        parser.add_argument('--book', help='Only scan the files of the book with this slug')
+
+    def handle(self, *args, **options):
+        queryset = AudioFile.objects.order_by('pk')
+        if not options['all']:
+            queryset = queryset.filter(scanned_at__isnull=True)
+        if options['book']:
+            queryset = queryset.filter(book__slug=options['book'])
+
+        total = queryset.count()
+        done = 0
+        for done in scan_audio_files(queryset):
+            self.stdout.write(f'Scanned {done}/{total} files')
+
+        if options['all'] and not options['book']:
+            update_book_totals(list(Book.objects.values_list('pk', flat=True)))
+        self.stdout.write(self.style.SUCCESS(f'Scanned {done} audio files'))
@@ -0,0 +1,49 @@
+import os
+import time
+
+from django.core.management.base import BaseCommand
+
+from store.scrub import book_integrity_report, due_audio_files, scrub
+
+
+class Command(BaseCommand):
+    help = 'Re-hash stored audio files against their recorded checksums at a limited read rate'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--forever', action='store_true', help='Keep scrubbing, sleeping while nothing is due')
+        parser.add_argument('--max-files', type=int, help='Stop after this many files')
+        parser.add_argument('--max-seconds', type=int, help='Stop after this many seconds')
+        parser.add_argument('--rate', type=float, help='Read rate in MB/s, SCRUB_MAX_BYTES_PER_SECOND by default')
+        parser.add_argument('--book', help='Only verify the files of the book with this slug, due or not')
+        parser.add_argument('--idle-sleep', type=int, default=3600, help='Seconds to wait when nothing is due')
+        parser.add_argument('--report', action='store_true', help='Only print books with corrupt or missing files')
+
+    def handle(self, *args, **options):
+        if options['report']:
+            self.print_report()
+            return
+
+        if hasattr(os, 'nice'):
+            os.nice(10)
+        rate = int(options['rate'] * 1024 * 1024) if options['rate'] is not None else None
+        while True:
+            queryset = due_audio_files(interval_days=0 if options['book'] else None)
+            if options['book']:
+                queryset = queryset.filter(book__slug=options['book'])
+            counts = scrub(queryset, options['max_files'], options['max_seconds'], rate)
+            summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(counts.items())) or 'nothing due'
+            self.stdout.write(f'Verified audio files: {summary}')
+            if not options['forever'] or options['book']:
+                break
+            if set(counts) <= {'offline'}:
+                time.sleep(options['idle_sleep'])
+        self.print_report()
+
+    def print_report(self):
+        books = book_integrity_report()
+        for book in books:
+            self.stdout.write(self.style.ERROR(
+                f'{book["slug"]}: {book["corrupt"]} corrupt, {book["missing"]} missing of {book["files"]} files'
+            ))
+        if not books:
+            self.stdout.write(self.style.SUCCESS('No corrupt or missing audio files found'))
@@ -0,0 +1,104 @@
+import mimetypes
+import os
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.http import FileResponse, HttpResponse, StreamingHttpResponse
+from django.utils.http import http_date
+
+from .utils import parse_range_header
+
+
+CHUNK_SIZE = 1024 * 1024
+
+
+def guess_content_type(path):
+    content_type, encoding = mimetypes.guess_type(path)
+    return content_type or 'application/octet-stream'
+
+
+def x_accel_response(relative_path, content_type=None, prefix=None):
+    response = HttpResponse(content_type=content_type or guess_content_type(relative_path))
+    response['X-Accel-Redirect'] = quote(f"{prefix or settings.MEDIA_X_ACCEL_PREFIX}{relative_path}")
+    return response
+
+
+def iter_file_range(path, start, end, chunk_size=CHUNK_SIZE):
+    remaining = end - start + 1
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while remaining > 0:
+            chunk = f.read(min(chunk_size, remaining))
+            if not chunk:
+                break
+            remaining -= len(chunk)
+            yield chunk
+
+
+def file_response(request, path, content_type=None):
+    """
+    Serves a file from disk with Range/If-Range support. Whole files and open-ended
+    ranges ("bytes=N-", what players send when seeking) go through FileResponse, so
+    gunicorn can hand them to sendfile() via wsgi.file_wrapper.
+    """
+    stat = os.stat(path)
+    size = stat.st_size
+    last_modified = http_date(stat.st_mtime)
+    content_type = content_type or guess_content_type(path)
+
+    byte_range = None
+    if_range = request.headers.get('If-Range')
+    if not if_range or if_range == last_modified:
+        try:
+            byte_range = parse_range_header(request.headers.get('Range'), size)
+        except ValueError:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            return response
+
+    if byte_range is None:
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    else:
+        start, end = byte_range
+        if end == size - 1:
+            f = open(path, 'rb')
+            f.seek(start)
+            response = FileResponse(f, content_type=content_type, status=206)
+        else:
+            response = StreamingHttpResponse(iter_file_range(path, start, end), content_type=content_type, status=206)
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+        response['Content-Length'] = end - start + 1
+
+    response['Accept-Ranges'] = 'bytes'
+    response['Last-Modified'] = last_modified
+    return response
+
+
+def under_media_root(path):
+    media_root = os.path.abspath(settings.MEDIA_ROOT)
+    return os.path.commonpath([media_root, os.path.abspath(path)]) == media_root
+
+
+def serve_media(request, relative_path, content_type=None):
+    """
+    Hands the file to nginx when it can find it: nginx only knows MEDIA_ROOT,
+    so files of a volume mounted elsewhere (add_media_volume --path, or
+    repointed by check_media_volumes --fix) are served from here.
+    """
+    path = default_storage.path(relative_path)
+    if settings.MEDIA_X_ACCEL_REDIRECT and under_media_root(path):
+        return x_accel_response(relative_path, content_type)
+    return file_response(request, path, content_type)
+
+
+def missing_file_response(name):
+    """503 when the file is on a volume that is not mounted; None when it is simply gone."""
+    from .volumes import is_name_online, split_volume_name
+
+    if is_name_online(name):
+        return None
+    response = HttpResponse(f"Storage volume '{split_volume_name(name)[0]}' is not available", status=503,
+                            content_type='text/plain')
+    response['Retry-After'] = 300
+    return response
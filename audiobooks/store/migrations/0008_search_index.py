@@ -0,0 +1,23 @@
+from django.db import migrations
+
+
+def populate_search_index(apps, schema_editor):
+    from store.search import rebuild_index
+    rebuild_index(apps)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0007_alter_author_options_alter_book_options_and_more'),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql="CREATE VIRTUAL TABLE store_search_index USING fts5("
+                "title, authors, series, genres, "
+                "tokenize = 'unicode61 remove_diacritics 2', prefix = '2 3')",
+            reverse_sql="DROP TABLE store_search_index",
+        ),
+        migrations.RunPython(populate_search_index, migrations.RunPython.noop),
+    ]
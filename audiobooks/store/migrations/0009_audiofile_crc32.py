@@ -0,0 +1,18 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:39
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0008_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiofile',
+            name='crc32',
+            field=models.PositiveBigIntegerField(blank=True, editable=False, null=True),
+        ),
+    ]
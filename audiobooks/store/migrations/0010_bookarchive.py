@@ -0,0 +1,26 @@
+# Generated by Django 4.2.16 on 2026-10-18 19:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0009_audiofile_crc32'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookArchive',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('filename', models.CharField(max_length=250)),
+                ('size', models.PositiveBigIntegerField(default=0)),
+                ('etag', models.CharField(max_length=64)),
+                ('built_at', models.DateTimeField(auto_now=True)),
+                ('last_downloaded_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('book', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='archive', to='store.book')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0014_audio_sha256'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='audiofile',
+            name='integrity',
+            field=models.CharField(blank=True, choices=[('ok', 'OK'), ('corrupt', 'Corrupt'), ('missing', 'Missing')], db_index=True, editable=False, max_length=10),
+        ),
+        migrations.AddField(
+            model_name='audiofile',
+            name='verified_at',
+            field=models.DateTimeField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:03
+
+from django.db import migrations, models
+import uuid
+
+
+def create_default_volume(apps, schema_editor):
+    Volume = apps.get_model('store', 'Volume')
+    Volume.objects.get_or_create(name='default')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0015_audio_integrity'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Volume',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.SlugField(unique=True)),
+                ('path', models.CharField(blank=True, help_text='Mount point; MEDIA_ROOT/volumes/<name> if empty', max_length=400)),
+                ('uuid', models.UUIDField(default=uuid.uuid4, editable=False, unique=True)),
+                ('is_active', models.BooleanField(default=True, help_text='New files may be placed here')),
+                ('priority', models.PositiveSmallIntegerField(default=0)),
+                ('capacity', models.PositiveBigIntegerField(default=0, editable=False)),
+                ('free', models.PositiveBigIntegerField(default=0, editable=False)),
+                ('status', models.CharField(choices=[('online', 'Online'), ('missing', 'Missing'), ('moved', 'Remounted elsewhere')], default='online', editable=False, max_length=10)),
+                ('found_at', models.CharField(blank=True, editable=False, max_length=400)),
+                ('checked_at', models.DateTimeField(blank=True, editable=False, null=True)),
+            ],
+            options={
+                'ordering': ['priority', 'name'],
+            },
+        ),
+        migrations.RunPython(create_default_volume, migrations.RunPython.noop),
+    ]
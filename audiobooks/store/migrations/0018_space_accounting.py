@@ -0,0 +1,49 @@
+# Generated by Django 4.2.16 on 2026-10-18 20:15
+
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+
+def compute_space_totals(apps, schema_editor):
+    Author = apps.get_model('store', 'Author')
+    AudioFile = apps.get_model('store', 'AudioFile')
+    Volume = apps.get_model('store', 'Volume')
+
+    for author in Author.objects.annotate(size=Coalesce(Sum('books__total_size'), 0)):
+        Author.objects.filter(pk=author.pk).update(total_size=author.size)
+
+    total = AudioFile.objects.aggregate(size=Coalesce(Sum('size'), 0))['size']
+    others = 0
+    for volume in Volume.objects.exclude(name='default'):
+        used = AudioFile.objects.filter(file__startswith=f"volumes/{volume.name}/") \
+            .aggregate(size=Coalesce(Sum('size'), 0))['size']
+        Volume.objects.filter(pk=volume.pk).update(used=used)
+        others += used
+    Volume.objects.filter(name='default').update(used=total - others)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('store', '0017_hot_cache'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='author',
+            name='total_size',
+            field=models.PositiveBigIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='volume',
+            name='quota',
+            field=models.PositiveBigIntegerField(default=0, help_text='Most bytes of audio to place here, 0 for no limit'),
+        ),
+        migrations.AddField(
+            model_name='volume',
+            name='used',
+            field=models.PositiveBigIntegerField(default=0, editable=False, help_text='Bytes of audio stored here'),
+        ),
+        migrations.RunPython(compute_space_totals, migrations.RunPython.noop),
+    ]
@@ -1,10 +1,14 @@
 import logging
 import os
 import shutil
+import uuid
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.db.models.signals import m2m_changed, pre_delete
 from django.dispatch import receiver
+from .images import delete_image_variants
+from .jobs import delete_stored_file
 from .utils import custom_slugify, delete_old_image, genre_image_upload_path, author_image_upload_path, \
     series_image_upload_path, book_image_upload_path, audio_file_upload_path
 
@@ -17,6 +21,8 @@ class Genre(models.Model):
     name = models.CharField(max_length=100)
     slug = models.SlugField(max_length=120, unique=True, blank=True, editable=False)
     image = models.ImageField(upload_to=genre_image_upload_path, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         self.slug = custom_slugify(self.name) if self.name else ""
@@ -28,6 +34,7 @@ class Genre(models.Model):
     def delete(self, *args, **kwargs):
         if self.image and os.path.isfile(self.image.path):
             os.remove(self.image.path)
+        delete_image_variants(self.image_variants)
         super().delete(*args, **kwargs)
 
     def __str__(self):
@@ -43,6 +50,9 @@ class Author(models.Model):
     description = models.TextField(blank=True)
     slug = models.SlugField(max_length=120, unique=True, blank=True, editable=False)
     image = models.ImageField(upload_to=author_image_upload_path, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    total_size = models.PositiveBigIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         self.slug = custom_slugify(f"{self.last_name} {self.first_name}") if self.last_name and self.first_name else ""
@@ -54,6 +64,7 @@ class Author(models.Model):
     def delete(self, *args, **kwargs):
         if self.image and os.path.isfile(self.image.path):
             os.remove(self.image.path)
+        delete_image_variants(self.image_variants)
         super().delete(*args, **kwargs)
 
     def __str__(self):
@@ -67,6 +78,8 @@ class Series(models.Model):
     title = models.CharField(max_length=200)
     slug = models.SlugField(max_length=120, unique=True, blank=True, editable=False)
     image = models.ImageField(upload_to=series_image_upload_path, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
         self.slug = custom_slugify(self.title) if self.title else ""
@@ -78,6 +91,7 @@ class Series(models.Model):
     def delete(self, *args, **kwargs):
         if self.image and os.path.isfile(self.image.path):
             os.remove(self.image.path)
+        delete_image_variants(self.image_variants)
         super().delete(*args, **kwargs)
 
     def __str__(self):
@@ -92,25 +106,26 @@ class Book(models.Model):
     slug = models.SlugField(max_length=200, unique=True, blank=True, editable=False)
     is_read = models.BooleanField(default=False, verbose_name="Is read")
     image = models.ImageField(upload_to=book_image_upload_path, blank=True, null=True)
+    image_variants = models.JSONField(default=dict, blank=True, editable=False)
+    total_duration = models.FloatField(default=0, editable=False)
+    total_size = models.PositiveBigIntegerField(default=0, editable=False)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
 
     def save(self, *args, **kwargs):
+        from .slugs import book_slug, check_slug_available
+
         if not self.title:
             raise ValidationError("Book title is required")
-        if not self.pk:
-            import uuid
+        if getattr(self, '_slug_computed', False):
+            # BookForm already computed and checked the slug from its cleaned data
+            pass
+        elif not self.pk:
+            # Authors are only known once the book exists; update_book_slug fills the slug in
             self.slug = f"temp_{uuid.uuid4().hex[:8]}"
-            super().save(*args, **kwargs)
-            return
-
-        if self.title:
-            author_slugs = "_".join([custom_slugify(author.slug) for author in self.authors.all()]) \
-                if self.authors.exists() else "no_author"
-            series_slug = self.series.slug if self.series else "no_series"
-            new_slug = custom_slugify(f"{author_slugs}_{series_slug}_{self.title}")
+        else:
+            new_slug = book_slug(self)
             if new_slug != self.slug:
-                if Book.objects.filter(slug=new_slug).exclude(pk=self.pk).exists():
-                    logger.error(f"Book with slug '{new_slug}' already exists!")
-                    raise ValidationError(f"Book with slug '{new_slug}' already exists")
+                check_slug_available(new_slug, exclude_pk=self.pk)
                 self.slug = new_slug
 
         delete_old_image(self)
@@ -124,17 +139,48 @@ class Book(models.Model):
 
 
 @receiver(m2m_changed, sender=Book.authors.through)
-def update_book_slug(sender, instance, action, **kwargs):
-    if action == 'post_add' or action == 'post_remove' or action == 'post_clear':
-        author_slugs = "_".join([custom_slugify(author.first_name + author.last_name) for author in instance.authors.all()])
-        series_slug = custom_slugify(instance.series.title) if instance.series else "no_series"
-        instance.slug = custom_slugify(f"{author_slugs}_{series_slug}_{instance.title}")
-        instance.save()
+def update_book_slug(sender, instance, action, reverse, pk_set, **kwargs):
+    from .slugs import book_slug, check_slug_available, recompute_book_slugs
+
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        if pk_set:
+            recompute_book_slugs(Book.objects.filter(pk__in=pk_set))
+        return
+    if getattr(instance, '_slug_computed', False):
+        return
+
+    new_slug = book_slug(instance)
+    if new_slug != instance.slug:
+        check_slug_available(new_slug, exclude_pk=instance.pk)
+        Book.objects.filter(pk=instance.pk).update(slug=new_slug)
+        instance.slug = new_slug
 
 
 class AudioFile(models.Model):
+    INTEGRITY_OK = 'ok'
+    INTEGRITY_CORRUPT = 'corrupt'
+    INTEGRITY_MISSING = 'missing'
+    INTEGRITY_CHOICES = [
+        (INTEGRITY_OK, 'OK'),
+        (INTEGRITY_CORRUPT, 'Corrupt'),
+        (INTEGRITY_MISSING, 'Missing'),
+    ]
+
     book = models.ForeignKey(Book, related_name="audio_files", on_delete=models.CASCADE)
     file = models.FileField(upload_to=audio_file_upload_path, max_length=400)
+    crc32 = models.PositiveBigIntegerField(null=True, blank=True, editable=False)
+    sha256 = models.CharField(max_length=64, blank=True, editable=False, db_index=True)
+    size = models.PositiveBigIntegerField(null=True, blank=True, editable=False, db_index=True)
+    duration = models.FloatField(null=True, blank=True, editable=False, db_index=True)
+    bitrate = models.PositiveIntegerField(null=True, blank=True, editable=False)
+    title = models.CharField(max_length=255, blank=True, editable=False)
+    track_number = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, db_index=True)
+    disc_number = models.PositiveSmallIntegerField(null=True, blank=True, editable=False, db_index=True)
+    scanned_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    verified_at = models.DateTimeField(null=True, blank=True, editable=False, db_index=True)
+    integrity = models.CharField(max_length=10, choices=INTEGRITY_CHOICES, blank=True, editable=False, db_index=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def save(self, *args, **kwargs):
@@ -142,18 +188,207 @@ class AudioFile(models.Model):
             old_file = AudioFile.objects.get(pk=self.pk).file
             if old_file and old_file != self.file:
                 old_file.delete(save=False)
+                self.scanned_at = None
+                self.crc32 = None
+                self.sha256 = ''
+                self.verified_at = None
+                self.integrity = ''
+                HotCacheEntry.objects.filter(audio_file=self).delete()
         super().save(*args, **kwargs)
 
     def delete(self, *args, **kwargs):
-        if self.file:
-            self.file.delete(save=False)
+        release_audio_file(self)
         super().delete(*args, **kwargs)
 
+    @property
+    def download_name(self):
+        """The name a listener sees; independent of where the file is stored."""
+        return os.path.basename(self.file.name)
+
     def __str__(self):
         return os.path.basename(self.file.name)
 
 
+def release_audio_file(audio_file):
+    """
+    Removes the file of an AudioFile that is going away. Deduplicated copies are
+    hardlinks, so the data itself is only freed when its last link is removed.
+    """
+    if not audio_file.file:
+        return
+    if AudioFile.objects.filter(file=audio_file.file.name).exclude(pk=audio_file.pk).exists():
+        return
+    delete_stored_file(audio_file.file.name)
+
+
 @receiver(pre_delete, sender=AudioFile)
 def delete_file_on_instance_delete(sender, instance, **kwargs):
-    if instance.file:
-        instance.file.delete(save=False)
+    release_audio_file(instance)
+
+
+class BookArchive(models.Model):
+    book = models.OneToOneField(Book, related_name='archive', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=250)
+    size = models.PositiveBigIntegerField(default=0)
+    etag = models.CharField(max_length=64)
+    built_at = models.DateTimeField(auto_now=True)
+    last_downloaded_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    @property
+    def path(self):
+        return os.path.join(settings.ARCHIVE_CACHE_DIR, self.filename)
+
+    @property
+    def relative_path(self):
+        return os.path.relpath(self.path, settings.MEDIA_ROOT)
+
+    def __str__(self):
+        return self.filename
+
+
+@receiver(pre_delete, sender=BookArchive)
+def delete_archive_on_instance_delete(sender, instance, **kwargs):
+    if os.path.isfile(instance.path):
+        os.remove(instance.path)
+
+
+class HotCacheEntry(models.Model):
+    audio_file = models.OneToOneField(AudioFile, related_name='hot_cache', on_delete=models.CASCADE)
+    filename = models.CharField(max_length=250)
+    size = models.PositiveBigIntegerField(default=0)
+    cached_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    hits = models.PositiveIntegerField(default=0)
+
+    @property
+    def path(self):
+        return os.path.join(settings.MEDIA_HOT_CACHE_DIR, self.filename)
+
+    def __str__(self):
+        return self.filename
+
+
+@receiver(pre_delete, sender=HotCacheEntry)
+def delete_hot_cache_copy_on_instance_delete(sender, instance, **kwargs):
+    if os.path.isfile(instance.path):
+        os.remove(instance.path)
+
+
+class HotCacheStat(models.Model):
+    day = models.DateField(unique=True)
+    hits = models.PositiveIntegerField(default=0)
+    misses = models.PositiveIntegerField(default=0)
+
+    @property
+    def hit_ratio(self):
+        total = self.hits + self.misses
+        return round(self.hits / total, 3) if total else None
+
+    def __str__(self):
+        return str(self.day)
+
+    class Meta:
+        ordering = ['-day']
+
+
+class UploadSession(models.Model):
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='upload_sessions', on_delete=models.CASCADE)
+    book = models.ForeignKey(Book, related_name='upload_sessions', on_delete=models.CASCADE, null=True, blank=True)
+    filename = models.CharField(max_length=255)
+    size = models.PositiveBigIntegerField()
+    chunk_size = models.PositiveIntegerField()
+    sha256 = models.CharField(max_length=64, blank=True)
+    audio_file = models.OneToOneField(AudioFile, on_delete=models.SET_NULL, null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    @property
+    def total_chunks(self):
+        return max((self.size + self.chunk_size - 1) // self.chunk_size, 1)
+
+    def chunk_length(self, index):
+        return min(self.chunk_size, self.size - index * self.chunk_size)
+
+    def __str__(self):
+        return self.filename
+
+
+@receiver(pre_delete, sender=UploadSession)
+def delete_upload_data_on_instance_delete(sender, instance, **kwargs):
+    from .uploads import discard_upload_data
+    discard_upload_data(instance)
+
+
+class Job(models.Model):
+    STATUS_PENDING = 'pending'
+    STATUS_RUNNING = 'running'
+    STATUS_RETRYING = 'retrying'
+    STATUS_DONE = 'done'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_RUNNING, 'Running'),
+        (STATUS_RETRYING, 'Retrying'),
+        (STATUS_DONE, 'Done'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING, db_index=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, related_name='jobs', on_delete=models.SET_NULL,
+                             null=True, blank=True)
+    progress_current = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    attempts = models.PositiveIntegerField(default=0)
+    message = models.TextField(blank=True)
+    result = models.JSONField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @property
+    def percent(self):
+        if self.status == self.STATUS_DONE:
+            return 100
+        if not self.progress_total:
+            return 0
+        return round(100 * self.progress_current / self.progress_total)
+
+    @property
+    def is_finished(self):
+        return self.status in (self.STATUS_DONE, self.STATUS_FAILED)
+
+    def __str__(self):
+        return f"{self.kind} #{self.pk} ({self.status})"
+
+    class Meta:
+        ordering = ['-created_at']
+
+
+class Volume(models.Model):
+    STATUS_ONLINE = 'online'
+    STATUS_MISSING = 'missing'
+    STATUS_MOVED = 'moved'
+    STATUS_CHOICES = [
+        (STATUS_ONLINE, 'Online'),
+        (STATUS_MISSING, 'Missing'),
+        (STATUS_MOVED, 'Remounted elsewhere'),
+    ]
+
+    name = models.SlugField(max_length=50, unique=True)
+    path = models.CharField(max_length=400, blank=True, help_text="Mount point; MEDIA_ROOT/volumes/<name> if empty")
+    uuid = models.UUIDField(default=uuid.uuid4, unique=True, editable=False)
+    is_active = models.BooleanField(default=True, help_text="New files may be placed here")
+    priority = models.PositiveSmallIntegerField(default=0)
+    capacity = models.PositiveBigIntegerField(default=0, editable=False)
+    free = models.PositiveBigIntegerField(default=0, editable=False)
+    used = models.PositiveBigIntegerField(default=0, editable=False, help_text="Bytes of audio stored here")
+    quota = models.PositiveBigIntegerField(default=0, help_text="Most bytes of audio to place here, 0 for no limit")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_ONLINE, editable=False)
+    found_at = models.CharField(max_length=400, blank=True, editable=False)
+    checked_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    def __str__(self):
+        return self.name
+
+    class Meta:
+        ordering = ['priority', 'name']
@@ -0,0 +1,199 @@
+import errno
+import json
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from .fragments import catalog_changed
+from .timestamps import touch
+from .utils import remove_empty_dirs
+from .volumes import split_volume_name, volume_prefix
+
+
+logger = logging.getLogger(__name__)
+
+
+def journal_path(book_id):
+    return os.path.join(settings.MEDIA_MOVE_JOURNAL_DIR, f"book_{book_id}.json")
+
+
+def write_journal(journal):
+    os.makedirs(settings.MEDIA_MOVE_JOURNAL_DIR, exist_ok=True)
+    path = journal_path(journal['book'])
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump(journal, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def move_path(source, target):
+    try:
+        os.rename(source, target)
+    except OSError as e:
+        if e.errno != errno.EXDEV:
+            raise
+        # Across filesystems the copy only appears under its final name once complete
+        temp_path = f"{target}.moving"
+        shutil.copy2(source, temp_path)
+        os.replace(temp_path, target)
+        os.remove(source)
+
+
+def same_filesystem(source, target):
+    existing = target
+    while not os.path.exists(existing):
+        existing = os.path.dirname(existing)
+    return os.stat(source).st_dev == os.stat(existing).st_dev
+
+
+def plan_book_move(book, target_dir, volume=None):
+    """
+    Works out where every audio file of the book goes: target_dir on the volume
+    given, or on the volume each file is already on. When all of them sit alone
+    in one directory and the target does not exist yet on the same filesystem,
+    the whole directory is moved with a single rename.
+    """
+    from .models import AudioFile
+
+    files = []
+    for audio in AudioFile.objects.filter(book=book).only('pk', 'file').order_by('pk'):
+        prefix = volume_prefix(volume if volume else split_volume_name(audio.file.name)[0])
+        if os.path.dirname(audio.file.name) == f"{prefix}{target_dir}":
+            continue
+        if not os.path.isfile(audio.file.path):
+            logger.warning(f"File not found, not moved: {audio.file.name}")
+            continue
+        files.append([audio.pk, audio.file.name, f"{prefix}{target_dir}/{os.path.basename(audio.file.name)}"])
+    if not files:
+        return None
+
+    target_dirs = {os.path.dirname(new_name) for pk, old_name, new_name in files}
+    target_dir = target_dirs.pop() if len(target_dirs) == 1 else None
+    source_dirs = {os.path.dirname(old_name) for pk, old_name, new_name in files}
+    source_dir = source_dirs.pop() if len(source_dirs) == 1 and target_dir else None
+    if source_dir:
+        target_path = default_storage.path(target_dir)
+        source_path = default_storage.path(source_dir)
+        names = {os.path.basename(old_name) for pk, old_name, new_name in files}
+        if os.path.exists(target_path) or set(os.listdir(source_path)) != names \
+                or not same_filesystem(source_path, target_path):
+            source_dir = None
+
+    if not source_dir:
+        taken = set()
+        for entry in files:
+            if entry[2] in taken or default_storage.exists(entry[2]):
+                entry[2] = default_storage.get_available_name(entry[2])
+            taken.add(entry[2])
+
+    return {'book': book.pk, 'source_dir': source_dir, 'target_dir': target_dir, 'files': files}
+
+
+def apply_move(journal, job=None):
+    """Moves the files of a journal; safe to run again after an interruption."""
+    from .jobs import set_progress
+
+    files = journal['files']
+    set_progress(job, 0, len(files))
+    if journal['source_dir']:
+        source_path = default_storage.path(journal['source_dir'])
+        target_path = default_storage.path(journal['target_dir'])
+        if os.path.isdir(source_path) and not os.path.exists(target_path):
+            os.makedirs(os.path.dirname(target_path), exist_ok=True)
+            os.rename(source_path, target_path)
+
+    for index, (pk, old_name, new_name) in enumerate(files, start=1):
+        old_path, new_path = default_storage.path(old_name), default_storage.path(new_name)
+        if os.path.exists(old_path) and not os.path.exists(new_path):
+            os.makedirs(os.path.dirname(new_path), exist_ok=True)
+            move_path(old_path, new_path)
+        if index % 50 == 0:
+            set_progress(job, index)
+
+    from .models import AudioFile, Book
+
+    moved = {pk: new_name for pk, old_name, new_name in files if default_storage.exists(new_name)}
+    audio_files = list(AudioFile.objects.filter(pk__in=moved).only('pk', 'file'))
+    for audio in audio_files:
+        audio.file.name = moved[audio.pk]
+    with transaction.atomic():
+        AudioFile.objects.bulk_update(audio_files, ['file'], batch_size=500)
+        touch(Book, [journal['book']])
+        catalog_changed()
+
+    os.remove(journal_path(journal['book']))
+    for old_dir in {os.path.dirname(old_name) for pk, old_name, new_name in files}:
+        stop = default_storage.path(f"{volume_prefix(split_volume_name(old_dir)[0])}audio")
+        remove_empty_dirs(default_storage.path(old_dir), stop)
+    set_progress(job, len(files))
+    return len(moved)
+
+
+def move_book_audio(book, target_dir, job=None, volume=None):
+    """
+    Moves the audio of a book into target_dir, on another volume if one is
+    given. The plan is written to a journal before anything is touched, so
+    recover_moves() can finish a move that was cut short; the database is only
+    updated once every file is in place, in one bulk_update.
+    """
+    recover_moves(book.pk)
+    journal = plan_book_move(book, target_dir, volume)
+    if journal is None:
+        return 0
+    write_journal(journal)
+    moved = apply_move(journal, job)
+    logger.info(f"Moved {moved} audio files of '{book.slug}' to {journal['target_dir'] or target_dir}")
+    return moved
+
+
+def journal_paths():
+    if not os.path.isdir(settings.MEDIA_MOVE_JOURNAL_DIR):
+        return []
+    return [
+        os.path.join(settings.MEDIA_MOVE_JOURNAL_DIR, name)
+        for name in os.listdir(settings.MEDIA_MOVE_JOURNAL_DIR) if name.endswith('.json')
+    ]
+
+
+def read_journal(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def journaled_names():
+    """
+    Old and new name of every file of a move that has not finished, and the
+    temporary name of a copy in progress. Until the move is done no row points
+    at the new names, yet the files there are as old as the originals.
+    """
+    names = set()
+    for path in journal_paths():
+        journal = read_journal(path)
+        for pk, old_name, new_name in journal['files'] if journal else []:
+            names.update((old_name, new_name, f"{new_name}.moving"))
+    return names
+
+
+def recover_moves(book_id=None):
+    """Rolls interrupted moves forward from their journals; returns how many were finished."""
+    paths = [journal_path(book_id)] if book_id is not None else journal_paths()
+
+    recovered = 0
+    for path in paths:
+        journal = read_journal(path)
+        if journal is None:
+            continue
+        logger.warning(f"Finishing interrupted move of book {journal['book']} to {journal['target_dir']}")
+        apply_move(journal)
+        recovered += 1
+    return recovered
+
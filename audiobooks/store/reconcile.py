@@ -0,0 +1,243 @@
+import json
+import logging
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import models
+from django.utils import timezone
+
+from .images import variant_names
+from .moves import journaled_names, move_path, recover_moves
+from .utils import remove_empty_dirs
+from .volumes import is_online, split_volume_name, volume_prefix
+
+
+logger = logging.getLogger(__name__)
+
+INDEX_VERSION = 1
+# A directory changed this recently may still change within the same mtime tick, so it is rescanned next time
+MTIME_SETTLE_NS = 2 * 10 ** 9
+CHUNK_SIZE = 500
+
+
+def load_index(path=None):
+    path = path or settings.MEDIA_RECONCILE_INDEX
+    try:
+        with open(path) as f:
+            index = json.load(f)
+    except (FileNotFoundError, ValueError):
+        return {}
+    if index.get('version') != INDEX_VERSION or index.get('media_root') != os.path.abspath(settings.MEDIA_ROOT):
+        return {}
+    return index['dirs']
+
+
+def save_index(dirs, path=None):
+    path = path or settings.MEDIA_RECONCILE_INDEX
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, 'w') as f:
+        json.dump({'version': INDEX_VERSION, 'media_root': os.path.abspath(settings.MEDIA_ROOT), 'dirs': dirs}, f)
+    os.replace(tmp_path, path)
+
+
+def scan_directory(name, cached=None):
+    """
+    Lists one media directory. Adding, removing or renaming an entry
+    changes the mtime of its directory, so when that is unchanged the cached
+    listing is returned after a single stat. Returns (entry, reused).
+    """
+    path = default_storage.path(name)
+    try:
+        mtime = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None, False
+    if cached and cached['mtime'] == mtime:
+        return cached, True
+
+    files, dirs = {}, []
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                dirs.append(entry.name)
+            elif entry.is_file(follow_symlinks=False):
+                stat = entry.stat(follow_symlinks=False)
+                files[entry.name] = [stat.st_mtime_ns, stat.st_size]
+    if time.time_ns() - mtime < MTIME_SETTLE_NS:
+        mtime = None
+    return {'mtime': mtime, 'files': files, 'dirs': sorted(dirs)}, False
+
+
+def scan_media(roots=None, previous=None, workers=8):
+    """
+    Walks the given media directories breadth first, listing each level
+    in a thread pool (scandir and stat release the GIL). Returns the new index,
+    {directory: {'mtime', 'files': {name: [mtime_ns, size]}, 'dirs'}}, and how
+    many directories were listed and reused from the previous index.
+    """
+    roots = reconcile_roots() if roots is None else roots
+    previous = previous or {}
+    index, stats = {}, {'scanned': 0, 'reused': 0}
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        level = list(roots)
+        while level:
+            results = pool.map(lambda name: (name, *scan_directory(name, previous.get(name))), level)
+            level = []
+            for name, entry, reused in results:
+                if entry is None:
+                    continue
+                index[name] = entry
+                stats['reused' if reused else 'scanned'] += 1
+                level.extend(f"{name}/{child}" for child in entry['dirs'])
+    return index, stats
+
+
+def reconcile_roots():
+    """MEDIA_RECONCILE_DIRS on every volume that is mounted."""
+    from .models import Volume
+
+    return [
+        f"{volume_prefix(volume)}{directory}"
+        for volume in Volume.objects.all() if is_online(volume)
+        for directory in settings.MEDIA_RECONCILE_DIRS
+    ]
+
+
+def file_fields():
+    """(model, field name) of every FileField and ImageField in the store app."""
+    return [
+        (model, field.name)
+        for model in apps.get_app_config('store').get_models()
+        for field in model._meta.fields
+        if isinstance(field, models.FileField)
+    ]
+
+
+def variant_fields():
+    """(model, field name) of every JSON field holding the names of image variants."""
+    return [
+        (model, f'{field}_variants')
+        for model, field in file_fields()
+        if isinstance(model._meta.get_field(field), models.ImageField)
+        and any(f.name == f'{field}_variants' for f in model._meta.fields)
+    ]
+
+
+def referenced_files():
+    """Maps every stored file name to the (model label, pk, field) rows pointing at it."""
+    references = {}
+    for model, field in file_fields():
+        rows = model.objects.exclude(**{f'{field}__isnull': True}).exclude(**{field: ''}).values_list('pk', field)
+        for pk, name in rows.iterator(chunk_size=2000):
+            references.setdefault(name, []).append((model._meta.label, pk, field))
+    for model, field in variant_fields():
+        for pk, variants in model.objects.values_list('pk', field).iterator(chunk_size=2000):
+            for name in variant_names(variants):
+                references.setdefault(name, []).append((model._meta.label, pk, field))
+    return references
+
+
+def still_referenced(names):
+    """Re-checks candidate orphans against the database right before touching them."""
+    found = set()
+    for model, field in file_fields():
+        for start in range(0, len(names), CHUNK_SIZE):
+            chunk = names[start:start + CHUNK_SIZE]
+            found.update(model.objects.filter(**{f'{field}__in': chunk}).values_list(field, flat=True))
+    candidates = set(names)
+    for model, field in variant_fields():
+        for variants in model.objects.values_list(field, flat=True).iterator(chunk_size=2000):
+            found.update(candidates.intersection(variant_names(variants)))
+    return found
+
+
+def reconcile(full=False, workers=8, min_age=3600):
+    """
+    Compares the mounted volumes with the database. Returns a report with the
+    orphans (files no row points at, older than min_age seconds so uploads in
+    flight are left alone) and the dangling rows (rows whose file is missing).
+    Rows on a volume that is not mounted are counted apart, not as dangling.
+    Interrupted moves are finished first; files of moves still running are
+    neither orphans nor dangling.
+    """
+    from .models import Volume
+
+    try:
+        recover_moves()
+    except OSError as e:
+        # Most likely a move job is working on the same journal; its files are skipped below
+        logger.warning(f"Could not finish an interrupted move before reconciling: {e}")
+    moving = journaled_names()
+    roots = reconcile_roots()
+    offline = {volume.name for volume in Volume.objects.all() if not is_online(volume)}
+    started = time.monotonic()
+    index, stats = scan_media(roots, {} if full else load_index(), workers)
+    save_index(index)
+
+    references = referenced_files()
+    cutoff = time.time_ns() - min_age * 10 ** 9
+    orphans, found = [], set()
+    for directory, entry in index.items():
+        for filename, (mtime, size) in entry['files'].items():
+            name = f"{directory}/{filename}"
+            found.add(name)
+            if name not in references and name not in moving and mtime < cutoff:
+                orphans.append((name, size))
+
+    dangling, unavailable = [], 0
+    for name, rows in references.items():
+        if split_volume_name(name)[0] in offline:
+            unavailable += len(rows)
+            continue
+        if name in moving:
+            continue
+        if any(name.startswith(f"{root}/") for root in roots):
+            missing = name not in found
+        else:
+            missing = not os.path.isfile(default_storage.path(name))
+        if missing:
+            dangling.extend((label, pk, field, name) for label, pk, field in rows)
+
+    return {
+        'orphans': sorted(orphans),
+        'orphan_bytes': sum(size for name, size in orphans),
+        'dangling': sorted(dangling),
+        'offline_volumes': sorted(offline),
+        'unavailable': unavailable,
+        'files': len(found),
+        'directories_scanned': stats['scanned'],
+        'directories_reused': stats['reused'],
+        'elapsed': time.monotonic() - started,
+    }
+
+
+def dispose_orphans(names, action):
+    """Moves orphans into MEDIA_QUARANTINE_DIR (keeping their paths) or deletes them."""
+    # A move may have started since the report was made
+    referenced = still_referenced(names) | journaled_names()
+    quarantine = os.path.join(settings.MEDIA_QUARANTINE_DIR, timezone.now().strftime('%Y%m%d_%H%M%S'))
+    disposed = []
+    for name in names:
+        if name in referenced:
+            logger.warning(f"{name} is referenced again or being moved, left in place")
+            continue
+        path = default_storage.path(name)
+        try:
+            if action == 'delete':
+                os.remove(path)
+            else:
+                target = os.path.join(quarantine, name)
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                move_path(path, target)
+        except FileNotFoundError:
+            continue
+        volume_name, volume_relative = split_volume_name(name)
+        stop = default_storage.path(f"{volume_prefix(volume_name)}{volume_relative.split('/')[0]}")
+        remove_empty_dirs(os.path.dirname(path), stop)
+        disposed.append(name)
+    logger.info(f"{'Deleted' if action == 'delete' else 'Quarantined'} {len(disposed)} orphaned media files")
+    return disposed
@@ -0,0 +1,156 @@
+import hashlib
+import logging
+import os
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import Count, F, Q
+from django.utils import timezone
+
+from .volumes import VOLUME_PREFIX, is_name_online, is_online, volume_prefix
+
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 256 * 1024
+
+
+class RateLimiter:
+    """Token bucket holding at most one second of bytes, so reads never come in bursts."""
+
+    def __init__(self, bytes_per_second):
+        self.rate = bytes_per_second
+        self.allowance = bytes_per_second
+        self.last = time.monotonic()
+
+    def consume(self, size):
+        if not self.rate:
+            return
+        now = time.monotonic()
+        self.allowance = min(self.rate, self.allowance + (now - self.last) * self.rate)
+        self.last = now
+        self.allowance -= size
+        if self.allowance < 0:
+            time.sleep(-self.allowance / self.rate)
+            self.last = time.monotonic()
+            self.allowance = 0
+
+
+def hash_file(path, limiter):
+    """sha256 of a file read at the limiter's pace; pages read are dropped from the page cache."""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        fd = f.fileno()
+        offset = 0
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+            if hasattr(os, 'posix_fadvise'):
+                os.posix_fadvise(fd, offset, len(chunk), os.POSIX_FADV_DONTNEED)
+            offset += len(chunk)
+            limiter.consume(len(chunk))
+    return digest.hexdigest()
+
+
+def verify_audio_file(audio_file, limiter):
+    """
+    Re-hashes one stored file and records the outcome. A file without a recorded
+    checksum gets its current hash as the baseline for later passes.
+    """
+    from .models import AudioFile
+
+    fields = {'verified_at': timezone.now()}
+    try:
+        sha256 = hash_file(audio_file.file.path, limiter)
+    except FileNotFoundError:
+        if not is_name_online(audio_file.file.name):
+            # The drive is not mounted; the file is checked again once it is
+            return 'offline'
+        fields['integrity'] = AudioFile.INTEGRITY_MISSING
+        logger.error(f"Audio file is missing: {audio_file.file.name}")
+    except OSError as e:
+        # EIO from a bad sector, EACCES, ...: the file cannot be read back, which is what scrubbing looks for
+        fields['integrity'] = AudioFile.INTEGRITY_CORRUPT
+        logger.error(f"Could not read audio file {audio_file.file.name}: {e}")
+    else:
+        if not audio_file.sha256:
+            fields['sha256'] = sha256
+            fields['integrity'] = AudioFile.INTEGRITY_OK
+        elif sha256 == audio_file.sha256:
+            fields['integrity'] = AudioFile.INTEGRITY_OK
+        else:
+            fields['integrity'] = AudioFile.INTEGRITY_CORRUPT
+            logger.error(f"Checksum mismatch, audio file is corrupt: {audio_file.file.name}")
+
+    # Only written if the file was not replaced while it was being read
+    AudioFile.objects.filter(pk=audio_file.pk, file=audio_file.file.name).update(**fields)
+    return fields['integrity']
+
+
+def offline_volumes_filter():
+    """Leaves out the files on volumes that are not mounted."""
+    from .models import Volume
+
+    condition = Q()
+    for volume in Volume.objects.all():
+        if not is_online(volume):
+            prefix = volume_prefix(volume)
+            # Files on the default volume are the ones without a volume prefix
+            condition &= ~Q(file__startswith=prefix) if prefix else Q(file__startswith=f"{VOLUME_PREFIX}/")
+    return condition
+
+
+def due_audio_files(interval_days=None):
+    """
+    Files in scrub order: never verified first, then the longest ago. The
+    verified_at column is the cursor, so a restarted scrubber carries on where
+    it stopped and new files are picked up on the next round. Files on
+    unmounted volumes are left out until their volume is back.
+    """
+    from .models import AudioFile
+
+    interval_days = settings.SCRUB_INTERVAL_DAYS if interval_days is None else interval_days
+    cutoff = timezone.now() - timedelta(days=interval_days)
+    return AudioFile.objects.filter(Q(verified_at__isnull=True) | Q(verified_at__lt=cutoff)) \
+        .filter(offline_volumes_filter()) \
+        .order_by(F('verified_at').asc(nulls_first=True), 'pk').only('pk', 'file', 'sha256', 'book_id')
+
+
+def scrub(queryset=None, max_files=None, max_seconds=None, bytes_per_second=None):
+    """Verifies due files until there are none left or a limit is hit; returns the counts per outcome."""
+    rate = settings.SCRUB_MAX_BYTES_PER_SECOND if bytes_per_second is None else bytes_per_second
+    limiter = RateLimiter(rate)
+    queryset = due_audio_files() if queryset is None else queryset
+    started = time.monotonic()
+    counts = {}
+    while True:
+        # Verified files drop out of the queryset, so every slice starts at the cursor again
+        batch = list(queryset[:100])
+        if not batch:
+            return counts
+        offline = 0
+        for audio_file in batch:
+            outcome = verify_audio_file(audio_file, limiter)
+            counts[outcome] = counts.get(outcome, 0) + 1
+            offline += outcome == 'offline'
+            done = sum(counts.values())
+            if (max_files and done >= max_files) or (max_seconds and time.monotonic() - started >= max_seconds):
+                return counts
+        if offline == len(batch):
+            # A volume went away during the run; offline files keep their place, so the slice would not move
+            return counts
+
+
+def book_integrity_report(only_problems=True):
+    """Per-book counts of files, and of those verified, corrupt and missing."""
+    from .models import AudioFile, Book
+
+    books = Book.objects.annotate(
+        files=Count('audio_files'),
+        verified=Count('audio_files', filter=Q(audio_files__integrity=AudioFile.INTEGRITY_OK)),
+        corrupt=Count('audio_files', filter=Q(audio_files__integrity=AudioFile.INTEGRITY_CORRUPT)),
+        missing=Count('audio_files', filter=Q(audio_files__integrity=AudioFile.INTEGRITY_MISSING)),
+    ).order_by('slug').values('slug', 'files', 'verified', 'corrupt', 'missing')
+    if only_problems:
+        books = books.filter(Q(corrupt__gt=0) | Q(missing__gt=0))
+    return list(books)
@@ -0,0 +1,185 @@
+import logging
+import re
+
+from django.apps import apps as django_apps
+from django.db import connection
+from unidecode import unidecode
+
+
+logger = logging.getLogger(__name__)
+
+SEARCH_TABLE = 'store_search_index'
+
+KIND_BOOK = 0
+KIND_AUTHOR = 1
+KIND_SERIES = 2
+KIND_GENRE = 3
+KIND_COUNT = 4
+
+KIND_NAMES = {
+    KIND_BOOK: 'book',
+    KIND_AUTHOR: 'author',
+    KIND_SERIES: 'series',
+    KIND_GENRE: 'genre',
+}
+
+# bm25 weights for the (title, authors, series, genres) columns
+RANK_WEIGHTS = (10.0, 4.0, 2.0, 1.0)
+
+BATCH_SIZE = 2000
+
+
+def normalize_search_text(value):
+    """
+    Transliterates with unidecode (as custom_slugify does) and folds the
+    spelling variants transliteration produces, so that "Dostoevsky",
+    "Dostoevskii" and "Достоевский" all end up as "dostoevski".
+    """
+    text = unidecode(value or '').lower()
+    text = re.sub(r"['`]", '', text)
+    text = re.sub(r'[yj]', 'i', text)
+    return re.sub(r'i{2,}', 'i', text)
+
+
+def build_match_query(query):
+    tokens = re.findall(r'[a-z0-9]+', normalize_search_text(query))
+    return ' '.join(f'"{token}"*' for token in tokens)
+
+
+def _rowid(kind, pk):
+    return pk * KIND_COUNT + kind
+
+
+def _book_row(book):
+    return (
+        _rowid(KIND_BOOK, book.pk),
+        normalize_search_text(book.title),
+        normalize_search_text(' '.join(f"{a.first_name} {a.last_name}" for a in book.authors.all())),
+        normalize_search_text(book.series.title if book.series else ''),
+        normalize_search_text(' '.join(g.name for g in book.genres.all())),
+    )
+
+
+def _author_row(author):
+    return (_rowid(KIND_AUTHOR, author.pk), normalize_search_text(f"{author.first_name} {author.last_name}"), '', '', '')
+
+
+def _series_row(series):
+    return (_rowid(KIND_SERIES, series.pk), normalize_search_text(series.title), '', '', '')
+
+
+def _genre_row(genre):
+    return (_rowid(KIND_GENRE, genre.pk), normalize_search_text(genre.name), '', '', '')
+
+
+def _write_rows(rows):
+    if not rows:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(row[0],) for row in rows])
+        cursor.executemany(
+            f"INSERT INTO {SEARCH_TABLE} (rowid, title, authors, series, genres) VALUES (%s, %s, %s, %s, %s)",
+            rows
+        )
+
+
+def _delete_rows(rowids):
+    if not rowids:
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(f"DELETE FROM {SEARCH_TABLE} WHERE rowid = %s", [(rowid,) for rowid in rowids])
+
+
+def index_books(queryset):
+    queryset = queryset.select_related('series').prefetch_related('authors', 'genres')
+    rows = []
+    for book in queryset.iterator(chunk_size=BATCH_SIZE):
+        rows.append(_book_row(book))
+        if len(rows) >= BATCH_SIZE:
+            _write_rows(rows)
+            rows = []
+    _write_rows(rows)
+
+
+def index_object(obj):
+    from .models import Book, Author, Series, Genre
+
+    if isinstance(obj, Book):
+        index_books(Book.objects.filter(pk=obj.pk))
+    elif isinstance(obj, Author):
+        _write_rows([_author_row(obj)])
+    elif isinstance(obj, Series):
+        _write_rows([_series_row(obj)])
+    elif isinstance(obj, Genre):
+        _write_rows([_genre_row(obj)])
+
+
+def remove_object(obj):
+    from .models import Book, Author, Series, Genre
+
+    kinds = {Book: KIND_BOOK, Author: KIND_AUTHOR, Series: KIND_SERIES, Genre: KIND_GENRE}
+    _delete_rows([_rowid(kinds[obj.__class__], obj.pk)])
+
+
+def rebuild_index(apps=None):
+    apps = apps or django_apps
+    Book = apps.get_model('store', 'Book')
+    Author = apps.get_model('store', 'Author')
+    Series = apps.get_model('store', 'Series')
+    Genre = apps.get_model('store', 'Genre')
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"DELETE FROM {SEARCH_TABLE}")
+
+    index_books(Book.objects.all())
+    for model, make_row in ((Author, _author_row), (Series, _series_row), (Genre, _genre_row)):
+        rows = []
+        for obj in model.objects.all().iterator(chunk_size=BATCH_SIZE):
+            rows.append(make_row(obj))
+            if len(rows) >= BATCH_SIZE:
+                _write_rows(rows)
+                rows = []
+        _write_rows(rows)
+
+    with connection.cursor() as cursor:
+        cursor.execute(f"INSERT INTO {SEARCH_TABLE} ({SEARCH_TABLE}) VALUES ('optimize')")
+    logger.info("Search index rebuilt")
+
+
+def search(query, kind=None, limit=20, offset=0):
+    """Returns (kind, pk) pairs ordered by relevance."""
+    match = build_match_query(query)
+    if not match:
+        return []
+
+    sql = f"SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s"
+    params = [match]
+    if kind is not None:
+        sql += f" AND rowid %% {KIND_COUNT} = %s"
+        params.append(kind)
+    weights = ', '.join(str(weight) for weight in RANK_WEIGHTS)
+    sql += f" ORDER BY bm25({SEARCH_TABLE}, {weights}) LIMIT %s OFFSET %s"
+    params += [limit, offset]
+
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return [(rowid % KIND_COUNT, rowid // KIND_COUNT) for rowid, in cursor.fetchall()]
+
+
+def search_objects(query, kind=None, limit=20, offset=0):
+    from .models import Book, Author, Series, Genre
+
+    models = {KIND_BOOK: Book, KIND_AUTHOR: Author, KIND_SERIES: Series, KIND_GENRE: Genre}
+    hits = search(query, kind=kind, limit=limit, offset=offset)
+
+    objects = {}
+    for hit_kind, model in models.items():
+        pks = [pk for k, pk in hits if k == hit_kind]
+        if pks:
+            objects[hit_kind] = model.objects.in_bulk(pks)
+
+    return [
+        (KIND_NAMES[hit_kind], objects[hit_kind][pk])
+        for hit_kind, pk in hits
+        if pk in objects.get(hit_kind, {})
+    ]
@@ -0,0 +1,76 @@
+from django.urls import reverse
+from rest_framework import serializers
+
+from .models import AudioFile, Author, Book, Genre, Series
+
+
+def requested_fields(request):
+    """The field names asked for with ?fields=a,b, or None for all of them."""
+    value = request.query_params.get('fields') if request else None
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    """Drops the fields not listed in ?fields=; an unknown name is a 400."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        wanted = requested_fields(self.context.get('request'))
+        if wanted is None:
+            return
+        unknown = wanted - set(self.fields)
+        if unknown:
+            raise serializers.ValidationError({'fields': f"Unknown fields: {', '.join(sorted(unknown))}"})
+        for name in set(self.fields) - wanted:
+            self.fields.pop(name)
+
+
+class GenreSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Genre
+        fields = ['id', 'slug', 'name', 'image', 'updated_at']
+
+
+class SeriesSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Series
+        fields = ['id', 'slug', 'title', 'image', 'updated_at']
+
+
+class AuthorSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = Author
+        fields = ['id', 'slug', 'first_name', 'last_name', 'description', 'image', 'total_size', 'updated_at']
+
+
+class BookSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    authors = serializers.SlugRelatedField(many=True, read_only=True, slug_field='slug')
+    genres = serializers.SlugRelatedField(many=True, read_only=True, slug_field='slug')
+    series = serializers.SlugRelatedField(read_only=True, slug_field='slug')
+
+    class Meta:
+        model = Book
+        fields = [
+            'id', 'slug', 'title', 'authors', 'genres', 'series', 'is_read', 'image',
+            'total_duration', 'total_size', 'updated_at',
+        ]
+
+
+class AudioFileSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    book = serializers.SlugRelatedField(read_only=True, slug_field='slug')
+    name = serializers.CharField(source='download_name', read_only=True)
+    url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = AudioFile
+        fields = [
+            'id', 'book', 'name', 'url', 'title', 'track_number', 'disc_number',
+            'duration', 'size', 'bitrate', 'created_at',
+        ]
+
+    def get_url(self, audio_file):
+        url = reverse('audio_file_download', args=[audio_file.book.slug, audio_file.pk])
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
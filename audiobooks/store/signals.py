@@ -0,0 +1,171 @@
+from django.db.models.signals import post_save, post_delete, pre_delete, m2m_changed
+from django.dispatch import receiver
+
+from . import search
+from .archive_cache import get_cached_archive, invalidate_book_archive
+from .dedup import deduplicate_audio_file
+from .fragments import catalog_changed
+from .ingest import ingest_audio_file, update_book_totals
+from .slugs import recompute_book_slugs
+from .space import update_author_totals
+from .timestamps import touch
+from .models import Book, Author, Series, Genre, AudioFile, BookArchive, Volume
+from .tasks import build_book_archive_task, generate_image_variants_task
+from .volumes import clear_volume_roots
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Series)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=AudioFile)
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Series)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=AudioFile)
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genres.through)
+def invalidate_cached_pages(sender, **kwargs):
+    if kwargs.get('action', 'post_').startswith('post_'):
+        catalog_changed()
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Series)
+@receiver(post_save, sender=Genre)
+def update_search_index(sender, instance, **kwargs):
+    search.index_object(instance)
+    if sender is not Book:
+        search.index_books(instance.books.all())
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Series)
+@receiver(post_save, sender=Genre)
+def queue_image_variants(sender, instance, **kwargs):
+    if instance.image and (instance.image_variants or {}).get('source') != instance.image.name:
+        generate_image_variants_task(sender._meta.model_name, instance.pk)
+
+
+@receiver(post_save, sender=Author)
+@receiver(post_save, sender=Series)
+def update_related_book_slugs(sender, instance, created, **kwargs):
+    if not created:
+        recompute_book_slugs(instance.books.all())
+
+
+@receiver(pre_delete, sender=Author)
+@receiver(pre_delete, sender=Series)
+@receiver(pre_delete, sender=Genre)
+def remember_related_books(sender, instance, **kwargs):
+    instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+@receiver(post_delete, sender=Author)
+@receiver(post_delete, sender=Series)
+@receiver(post_delete, sender=Genre)
+def remove_from_search_index(sender, instance, **kwargs):
+    search.remove_object(instance)
+    book_ids = getattr(instance, '_search_book_ids', None)
+    if book_ids:
+        search.index_books(Book.objects.filter(pk__in=book_ids))
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genres.through)
+def update_book_search_index(sender, instance, action, reverse, pk_set, **kwargs):
+    if not reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            search.index_books(Book.objects.filter(pk=instance.pk))
+        return
+
+    if action == 'pre_clear':
+        instance._search_book_ids = list(instance.books.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        search.index_books(Book.objects.filter(pk__in=pk_set))
+    elif action == 'post_clear':
+        search.index_books(Book.objects.filter(pk__in=getattr(instance, '_search_book_ids', [])))
+
+
+@receiver(post_save, sender=AudioFile)
+def ingest_audio_metadata(sender, instance, **kwargs):
+    if instance.scanned_at is None:
+        deduplicate_audio_file(instance)
+        ingest_audio_file(instance)
+        update_book_totals(instance.book_id)
+
+
+@receiver(post_delete, sender=AudioFile)
+def update_book_totals_on_delete(sender, instance, **kwargs):
+    update_book_totals(instance.book_id)
+
+
+@receiver(post_save, sender=AudioFile)
+@receiver(post_delete, sender=AudioFile)
+def refresh_book_archive(sender, instance, **kwargs):
+    invalidate_book_archive(instance.book_id)
+    build_book_archive_task(instance.book_id)
+
+
+@receiver(post_save, sender=Book)
+def refresh_renamed_book_archive(sender, instance, created, **kwargs):
+    if created:
+        return
+    if BookArchive.objects.filter(book=instance).exists() and not get_cached_archive(instance):
+        invalidate_book_archive(instance.pk)
+        build_book_archive_task(instance.pk)
+
+
+@receiver(pre_delete, sender=Book)
+def remember_book_authors(sender, instance, **kwargs):
+    instance._space_author_ids = list(instance.authors.values_list('pk', flat=True))
+
+
+@receiver(post_delete, sender=Book)
+def update_author_totals_on_delete(sender, instance, **kwargs):
+    update_author_totals(getattr(instance, '_space_author_ids', []))
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def update_author_totals_on_change(sender, instance, action, reverse, pk_set, **kwargs):
+    if reverse:
+        if action in ('post_add', 'post_remove', 'post_clear'):
+            update_author_totals([instance.pk])
+        return
+    if action == 'pre_clear':
+        instance._space_author_ids = list(instance.authors.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove'):
+        update_author_totals(pk_set)
+    elif action == 'post_clear':
+        update_author_totals(getattr(instance, '_space_author_ids', []))
+
+
+@receiver(post_save, sender=AudioFile)
+@receiver(post_delete, sender=AudioFile)
+def touch_book_of_audio_file(sender, instance, **kwargs):
+    touch(Book, [instance.book_id])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+@receiver(m2m_changed, sender=Book.genres.through)
+def touch_related_objects(sender, instance, action, reverse, model, pk_set, **kwargs):
+    # Both sides list each other, so both are touched
+    if action == 'pre_clear':
+        if reverse:
+            instance._touch_pks = list(instance.books.values_list('pk', flat=True))
+        else:
+            related = instance.authors if sender is Book.authors.through else instance.genres
+            instance._touch_pks = list(related.values_list('pk', flat=True))
+    elif action in ('post_add', 'post_remove', 'post_clear'):
+        touch(type(instance), [instance.pk])
+        touch(model, pk_set if action != 'post_clear' else getattr(instance, '_touch_pks', []))
+
+
+@receiver(post_save, sender=Volume)
+@receiver(post_delete, sender=Volume)
+def reload_volume_roots(sender, instance, **kwargs):
+    clear_volume_roots()
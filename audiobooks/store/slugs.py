@@ -0,0 +1,84 @@
+import logging
+
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Prefetch
+from django.utils import timezone
+
+from .utils import custom_slugify, should_move_files
+
+
+logger = logging.getLogger(__name__)
+
+
+def compute_book_slug(title, authors, series):
+    """The one place the book slug formula lives; authors and series are objects, not queries."""
+    author_slugs = "_".join(custom_slugify(author.slug) for author in authors) if authors else "no_author"
+    series_slug = series.slug if series else "no_series"
+    return custom_slugify(f"{author_slugs}_{series_slug}_{title}")
+
+
+def book_slug(book):
+    """Computes the slug of a saved book, reusing prefetched authors and a cached series."""
+    prefetched = getattr(book, '_prefetched_objects_cache', {})
+    if 'authors' in prefetched:
+        authors = list(prefetched['authors'])
+    else:
+        authors = list(book.authors.only('slug'))
+    return compute_book_slug(book.title, authors, book.series if book.series_id else None)
+
+
+def check_slug_available(slug, exclude_pk=None):
+    from .models import Book
+
+    if Book.objects.filter(slug=slug).exclude(pk=exclude_pk).exists():
+        logger.error(f"Book with slug '{slug}' already exists!")
+        raise ValidationError(f"Book with slug '{slug}' already exists")
+
+
+def recompute_book_slugs(books):
+    """
+    Recomputes the slugs of many books at once, e.g. after a series or an author was
+    renamed: authors and series are loaded in two queries, changed slugs are written
+    with one bulk_update, and the books whose files follow the slug get a move job.
+    Returns (book, old_slug) pairs for the books that changed.
+    """
+    from .models import Author, Book
+    from .tasks import move_book_files_task
+
+    books = books.select_related('series').prefetch_related(
+        Prefetch('authors', queryset=Author.objects.only('slug'))
+    ).only('pk', 'title', 'slug', 'series', 'series__slug')
+
+    changed = []
+    for book in books:
+        new_slug = book_slug(book)
+        if new_slug != book.slug:
+            changed.append((book, book.slug, new_slug))
+    if not changed:
+        return []
+
+    new_slugs = [new_slug for book, old_slug, new_slug in changed]
+    taken = set(
+        Book.objects.filter(slug__in=new_slugs)
+        .exclude(pk__in=[book.pk for book, old_slug, new_slug in changed])
+        .values_list('slug', flat=True)
+    )
+    updated = []
+    now = timezone.now()
+    for book, old_slug, new_slug in changed:
+        if new_slug in taken:
+            logger.error(f"Book with slug '{new_slug}' already exists, '{old_slug}' kept")
+            continue
+        taken.add(new_slug)
+        book.slug = new_slug
+        book.updated_at = now
+        updated.append((book, old_slug))
+
+    with transaction.atomic():
+        Book.objects.bulk_update([book for book, old_slug in updated], ['slug', 'updated_at'], batch_size=500)
+
+    for book, old_slug in updated:
+        if should_move_files(book, old_slug):
+            transaction.on_commit(lambda pk=book.pk, slug=old_slug: move_book_files_task(pk, slug))
+    return updated
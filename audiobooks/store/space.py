@@ -0,0 +1,174 @@
+import logging
+import os
+import shutil
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .volumes import DEFAULT_VOLUME, free_space, is_online, place_file, volume_prefix, volume_root
+
+
+logger = logging.getLogger(__name__)
+
+
+class InsufficientSpace(Exception):
+    def __init__(self, size, available):
+        self.size = size
+        self.available = max(available, 0)
+        super().__init__(f"{size} bytes do not fit, {self.available} bytes available")
+
+
+def update_author_totals(author_ids):
+    """
+    Recomputes the bytes of audio of the given authors. A book by several
+    authors counts in full for each of them. Authors whose total changed are
+    touched, since the API (and its ETag) includes the total.
+    """
+    from .models import Author
+
+    for author_id in set(author_ids):
+        size = Author.objects.filter(pk=author_id).aggregate(size=Coalesce(Sum('books__total_size'), 0))['size']
+        Author.objects.filter(pk=author_id).exclude(total_size=size).update(total_size=size, updated_at=timezone.now())
+
+
+def book_author_ids(book_ids):
+    from .models import Book
+
+    return Book.authors.through.objects.filter(book_id__in=book_ids).values_list('author_id', flat=True)
+
+
+def update_volume_totals():
+    """Recomputes the bytes of audio stored on every volume in one pass over the audio files."""
+    from .models import AudioFile, Volume
+
+    volumes = list(Volume.objects.only('pk', 'name'))
+    sums = {
+        volume.name: Coalesce(Sum('size', filter=Q(file__startswith=volume_prefix(volume))), 0)
+        for volume in volumes if volume.name != DEFAULT_VOLUME
+    }
+    totals = AudioFile.objects.aggregate(**{DEFAULT_VOLUME: Coalesce(Sum('size'), 0)}, **sums)
+    totals[DEFAULT_VOLUME] -= sum(totals[name] for name in sums)
+    for volume in volumes:
+        Volume.objects.filter(pk=volume.pk).update(used=totals[volume.name])
+
+
+def queue_volume_totals():
+    """
+    Recomputes the volume totals once the current transaction commits, so that
+    deleting a book of hundreds of files (one transaction) costs one pass rather
+    than one per file. Outside a transaction it runs right away.
+    """
+    connection = transaction.get_connection()
+    if any(func is update_volume_totals for savepoint_ids, func, *rest in connection.run_on_commit):
+        return
+    transaction.on_commit(update_volume_totals)
+
+
+def disk_free(path):
+    """Free bytes on the drive a path is on, or would be on once it is created."""
+    while not os.path.exists(path) and os.path.dirname(path) != path:
+        path = os.path.dirname(path)
+    return shutil.disk_usage(path).free
+
+
+def volume_room(volume):
+    """Bytes that can still be placed on a volume: free space above the reserve, capped by its quota."""
+    free = free_space(volume)
+    if free is None and volume.name == DEFAULT_VOLUME and not os.path.exists(settings.MEDIA_ROOT):
+        # Nothing is stored yet; the first upload creates MEDIA_ROOT
+        free = disk_free(settings.MEDIA_ROOT)
+    if free is None:
+        return 0
+    room = free - settings.MEDIA_VOLUME_RESERVE
+    if volume.quota:
+        room = min(room, volume.quota - volume.used)
+    return max(room, 0)
+
+
+def upload_room(size=0, book=None):
+    """
+    Bytes that can still be uploaded for a book. Uploads are staged on the
+    MEDIA_ROOT drive and then placed on a volume, so both need the room; staged
+    data is preallocated, so uploads in flight are already taken off the free space.
+    """
+    staging = max(disk_free(settings.UPLOAD_SESSION_DIR) - settings.MEDIA_VOLUME_RESERVE, 0)
+    volume = place_file(size, book)
+    if volume is None:
+        return staging
+    return min(staging, volume_room(volume))
+
+
+def check_upload_space(size, book=None):
+    """Raises InsufficientSpace unless size more bytes can be uploaded; returns the room there is."""
+    room = upload_room(size, book)
+    if size > room:
+        logger.warning(f"Rejected an upload of {size} bytes, {room} bytes available")
+        raise InsufficientSpace(size, room)
+    return room
+
+
+def directory_size(path):
+    """Bytes on disk taken by the files below path, 0 if it does not exist."""
+    total = 0
+    for directory, dirnames, filenames in os.walk(path):
+        for filename in filenames:
+            try:
+                total += os.lstat(os.path.join(directory, filename)).st_blocks * 512
+            except OSError:
+                continue
+    return total
+
+
+def file_size(path):
+    try:
+        return os.path.getsize(path)
+    except OSError:
+        return 0
+
+
+def space_report(limit=20):
+    """What takes up space: the volumes, the biggest books and authors, and the caches and staging areas."""
+    from .models import Author, Book, BookArchive, HotCacheEntry, UploadSession, Volume
+
+    volumes = []
+    for volume in Volume.objects.all():
+        online = is_online(volume)
+        usage = shutil.disk_usage(volume_root(volume)) if online else None
+        volumes.append({
+            'volume': volume,
+            'online': online,
+            'capacity': usage.total if usage else volume.capacity,
+            'free': usage.free if usage else volume.free,
+            'used': volume.used,
+            'other': max(usage.used - volume.used, 0) if usage else None,
+            'quota': volume.quota,
+            'room': volume_room(volume) if online else 0,
+        })
+
+    archives = BookArchive.objects.aggregate(size=Coalesce(Sum('size'), 0))['size']
+    hot_cache = HotCacheEntry.objects.aggregate(size=Coalesce(Sum('size'), 0))['size']
+    log_file = settings.LOGGING['handlers']['file']['filename']
+    pending = UploadSession.objects.filter(audio_file__isnull=True, sha256='')
+    areas = [
+        ('Archive cache', settings.ARCHIVE_CACHE_DIR, archives),
+        ('Hot cache', settings.MEDIA_HOT_CACHE_DIR, hot_cache),
+        ('Chunked uploads', settings.UPLOAD_SESSION_DIR, directory_size(settings.UPLOAD_SESSION_DIR)),
+        ('Form uploads', settings.UPLOAD_TEMP_DIR, directory_size(settings.UPLOAD_TEMP_DIR)),
+        ('Quarantine', settings.MEDIA_QUARANTINE_DIR, directory_size(settings.MEDIA_QUARANTINE_DIR)),
+        ('Database', str(settings.DATABASES['default']['NAME']), file_size(settings.DATABASES['default']['NAME'])),
+        ('Log', log_file, file_size(log_file)),
+    ]
+
+    return {
+        'volumes': volumes,
+        'areas': [{'name': name, 'path': path, 'size': size} for name, path, size in areas],
+        'pending_uploads': pending.count(),
+        'pending_upload_bytes': pending.aggregate(size=Coalesce(Sum('size'), 0))['size'],
+        'books': Book.objects.filter(total_size__gt=0).order_by('-total_size')[:limit],
+        'authors': Author.objects.filter(total_size__gt=0).order_by('-total_size')[:limit],
+        'reserve': settings.MEDIA_VOLUME_RESERVE,
+        'upload_room': upload_room(),
+    }
@@ -0,0 +1,18 @@
+from django.core.files.storage import FileSystemStorage
+from django.utils._os import safe_join
+
+from .volumes import DEFAULT_VOLUME, name_root, split_volume_name
+
+
+class VolumeStorage(FileSystemStorage):
+    """
+    MEDIA_ROOT plus extra volumes. Files on an extra volume are stored as
+    "volumes/<volume>/<name>" and live under that volume's mount point (by default
+    MEDIA_ROOT/volumes/<volume>, so MEDIA_URL and nginx serve them unchanged).
+    """
+
+    def path(self, name):
+        volume_name, volume_relative = split_volume_name(name)
+        if volume_name == DEFAULT_VOLUME:
+            return super().path(name)
+        return safe_join(name_root(volume_name), volume_relative)
@@ -0,0 +1,101 @@
+import os
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from background_task import background
+
+from .archive_cache import build_book_archive
+from .hot_cache import warm_book_cache
+from .jobs import PRIORITY_HIGH, PRIORITY_NORMAL, PRIORITY_LOW, run_job, delete_files, set_progress
+
+
+@background(schedule={'run_at': settings.ARCHIVE_CACHE_BUILD_DELAY, 'priority': PRIORITY_LOW},
+            remove_existing_tasks=True)
+def build_book_archive_task(book_id):
+    build_book_archive(book_id)
+
+
+@background(schedule={'priority': PRIORITY_NORMAL}, remove_existing_tasks=True)
+def warm_book_cache_task(book_id):
+    warm_book_cache(book_id)
+
+
+@background(schedule={'priority': PRIORITY_NORMAL}, remove_existing_tasks=True)
+def generate_image_variants_task(model_name, pk):
+    from django.apps import apps
+    from .images import generate_image_variants
+
+    instance = apps.get_model('store', model_name).objects.filter(pk=pk).first()
+    if instance:
+        generate_image_variants(instance)
+
+
+def move_book_files(job, book_id, old_slug):
+    from .models import Book
+    from .utils import handle_book_slug_change
+
+    book = Book.objects.filter(pk=book_id).first()
+    if book:
+        handle_book_slug_change(book, old_slug, job=job)
+
+
+@background(schedule={'priority': PRIORITY_NORMAL})
+def move_book_files_task(book_id, old_slug, job_id=None):
+    run_job(job_id, move_book_files, book_id, old_slug)
+
+
+def move_book_to_volume(job, book_id, volume_name):
+    from .models import Book, Volume
+    from .moves import move_book_audio
+    from .space import update_volume_totals
+    from .utils import book_audio_dir
+
+    book = Book.objects.filter(pk=book_id).first()
+    if book is None:
+        return {'moved': 0}
+    volume = Volume.objects.get(name=volume_name)
+    moved = move_book_audio(book, book_audio_dir(book), job=job, volume=volume)
+    update_volume_totals()
+    return {'moved': moved}
+
+
+@background(schedule={'priority': PRIORITY_LOW})
+def move_book_to_volume_task(book_id, volume_name, job_id=None):
+    run_job(job_id, move_book_to_volume, book_id, volume_name)
+
+
+@background(schedule={'priority': PRIORITY_LOW})
+def delete_files_task(names, job_id=None):
+    run_job(job_id, delete_files, names)
+
+
+def export_csv(job, kind):
+    from .utils import export_authors_to_csv, export_books_to_csv
+
+    export = export_authors_to_csv if kind == 'authors' else export_books_to_csv
+    filepath, filename, count, data = export()
+    name = os.path.relpath(filepath, settings.MEDIA_ROOT).replace(os.sep, '/')
+    return {'file': name, 'filename': filename, 'count': count, 'url': default_storage.url(name)}
+
+
+@background(schedule={'priority': PRIORITY_LOW})
+def export_csv_task(kind, job_id=None):
+    run_job(job_id, export_csv, kind)
+
+
+def attach_uploads(job, book_id, upload_ids):
+    from .models import Book, UploadSession
+    from .uploads import attach_upload
+
+    book = Book.objects.get(pk=book_id)
+    uploads = list(UploadSession.objects.filter(pk__in=upload_ids).order_by('filename'))
+    set_progress(job, 0, len(uploads))
+    for index, upload in enumerate(uploads, start=1):
+        attach_upload(upload, book)
+        set_progress(job, index)
+    return {'attached': len(uploads)}
+
+
+@background(schedule={'priority': PRIORITY_HIGH})
+def attach_uploads_task(book_id, upload_ids, job_id=None):
+    run_job(job_id, attach_uploads, book_id, upload_ids)
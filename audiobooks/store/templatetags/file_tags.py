@@ -1,5 +1,6 @@
 import os
 from django import template
+from django.utils.translation import gettext as _
 
 register = template.Library()
 
@@ -7,3 +8,25 @@ register = template.Library()
 @register.filter
 def basename(value):
     return os.path.basename(value)
+
+
+@register.filter
+def listening_time(seconds):
+    """Formats a total duration as "12 h 34 m"."""
+    minutes = round(seconds or 0) // 60
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return _('%(hours)d h %(minutes)d m') % {'hours': hours, 'minutes': minutes}
+    return _('%(minutes)d m') % {'minutes': minutes}
+
+
+@register.filter
+def track_time(seconds):
+    """Formats a track duration as "m:ss" or "h:mm:ss"."""
+    if seconds is None:
+        return ''
+    minutes, seconds = divmod(round(seconds), 60)
+    hours, minutes = divmod(minutes, 60)
+    if hours:
+        return f"{hours}:{minutes:02d}:{seconds:02d}"
+    return f"{minutes}:{seconds:02d}"
@@ -0,0 +1,17 @@
+from django import template
+
+from store.images import TILE_SIZES, image_sources
+
+register = template.Library()
+
+
+@register.inclusion_tag('store/_picture.html')
+def picture(image, default='', css_class='custom-card-img-top', alt='Image', sizes=TILE_SIZES, lazy=True):
+    """Renders a model's image, or the sources already worked out by image_sources(), with srcset."""
+    return {
+        'image': image if isinstance(image, dict) else image_sources(image, default),
+        'css_class': css_class,
+        'alt': alt,
+        'sizes': sizes,
+        'lazy': lazy,
+    }
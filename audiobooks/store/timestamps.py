@@ -0,0 +1,115 @@
+import hashlib
+from functools import wraps
+
+from django.conf import settings
+from django.db.models import Count, Max
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.translation import get_language
+from django.views.decorators.http import condition
+
+
+def touch(model, pks):
+    """
+    Marks rows as changed without saving them, so no signals run. Pages get
+    their ETag and Last-Modified from updated_at, so whatever changes what a
+    page shows through .update() or bulk_update() has to touch the rows too.
+    """
+    pks = {pk for pk in pks if pk}
+    if pks:
+        model.objects.filter(pk__in=pks).update(updated_at=timezone.now())
+
+
+def latest(*timestamps):
+    return max((timestamp for timestamp in timestamps if timestamp), default=None)
+
+
+def book_validators(request, slug, **kwargs):
+    """
+    A book page shows its authors, genres and series too; the counts catch
+    related rows that were deleted, which leaves no newer timestamp behind.
+    """
+    from .models import Book
+
+    state = Book.objects.filter(slug=slug).aggregate(
+        book_id=Max('pk'),
+        updated=Max('updated_at'),
+        authors_updated=Max('authors__updated_at'),
+        author_count=Count('authors', distinct=True),
+        genres_updated=Max('genres__updated_at'),
+        genre_count=Count('genres', distinct=True),
+        series_updated=Max('series__updated_at'),
+    )
+    if state['updated'] is None:
+        return None
+    return latest(state['updated'], state['authors_updated'], state['genres_updated'], state['series_updated']), state
+
+
+def related_books_validators(model):
+    """Validators of an author, series or genre page: the object and the books it lists."""
+    def validators(request, slug, **kwargs):
+        state = model.objects.filter(slug=slug).aggregate(
+            updated=Max('updated_at'),
+            books_updated=Max('books__updated_at'),
+            book_count=Count('books', distinct=True),
+        )
+        if state['updated'] is None:
+            return None
+        return latest(state['updated'], state['books_updated']), state
+    return validators
+
+
+def list_validators(model):
+    def validators(request, *args, **kwargs):
+        state = model.objects.aggregate(updated=Max('updated_at'), count=Count('pk'))
+        return state['updated'], state
+    return validators
+
+
+def page_etag(request, state):
+    """
+    Hashes the validators with everything else a page depends on: the path and
+    query string, the language, who is looking and the CSRF token in its forms.
+    """
+    user = request.user
+    parts = [
+        sorted(state.items()),
+        request.get_full_path(),
+        get_language(),
+        user.pk,
+        user.is_superuser,
+        request.COOKIES.get(settings.CSRF_COOKIE_NAME, ''),
+    ]
+    return hashlib.md5(repr(parts).encode()).hexdigest()
+
+
+def conditional_page(validators):
+    """
+    Answers If-None-Match and If-Modified-Since with 304 before the view renders
+    anything. validators(request, *args, **kwargs) returns (last modified,
+    state) from a single query, or None when there is nothing to compare, e.g.
+    for an unknown slug. Responses are private and always revalidated.
+    """
+    def state(request, *args, **kwargs):
+        if not hasattr(request, '_page_validators'):
+            request._page_validators = validators(request, *args, **kwargs)
+        return request._page_validators
+
+    def etag(request, *args, **kwargs):
+        validated = state(request, *args, **kwargs)
+        return page_etag(request, validated[1]) if validated else None
+
+    def last_modified(request, *args, **kwargs):
+        validated = state(request, *args, **kwargs)
+        return validated[0] if validated else None
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag, last_modified_func=last_modified)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional_view(request, *args, **kwargs)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+        return wrapper
+    return decorator
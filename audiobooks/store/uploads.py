@@ -0,0 +1,195 @@
+import errno
+import logging
+import os
+import shutil
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .dedup import find_stored_copy
+from .space import InsufficientSpace, check_upload_space, disk_free
+
+
+logger = logging.getLogger(__name__)
+
+READ_SIZE = 1024 * 1024
+
+
+class UploadError(Exception):
+    pass
+
+
+class AssembledUpload(File):
+    """A finished chunked upload; storage renames it into place like a temporary upload."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def session_dir(session):
+    return os.path.join(settings.UPLOAD_SESSION_DIR, str(session.id))
+
+
+def data_path(session):
+    return os.path.join(session_dir(session), 'data')
+
+
+def chunks_dir(session):
+    return os.path.join(session_dir(session), 'chunks')
+
+
+def create_upload(user, filename, size, book=None, sha256=None):
+    """
+    Starts an upload session. When the client sends the SHA-256 of a file the
+    server already stores, the stored data is linked in and every chunk is marked
+    as received, so the client has nothing left to send. Otherwise the whole file
+    is allocated up front; InsufficientSpace is raised before any chunk is sent.
+    """
+    from .models import UploadSession
+
+    discard_expired_uploads()
+    session = UploadSession.objects.create(
+        user=user, book=book, filename=os.path.basename(filename), size=size,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE
+    )
+    os.makedirs(chunks_dir(session), exist_ok=True)
+    if sha256 and settings.AUDIO_DEDUPLICATION and link_stored_copy(session, sha256):
+        return session
+    try:
+        check_upload_space(size, book)
+        allocate_data(session)
+    except InsufficientSpace:
+        session.delete()
+        raise
+    return session
+
+
+def allocate_data(session):
+    """Reserves the blocks of the data file, so a full disk shows up now and not halfway through the upload."""
+    with open(data_path(session), 'wb') as f:
+        if session.size and hasattr(os, 'posix_fallocate'):
+            try:
+                os.posix_fallocate(f.fileno(), 0, session.size)
+                return
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise InsufficientSpace(session.size, disk_free(settings.UPLOAD_SESSION_DIR))
+                if e.errno not in (errno.EOPNOTSUPP, errno.EINVAL):
+                    raise
+        f.truncate(session.size)
+
+
+def link_stored_copy(session, sha256):
+    copy = find_stored_copy(sha256.lower(), session.size)
+    if copy is None:
+        return False
+    try:
+        os.link(copy.file.path, data_path(session))
+    except OSError as e:
+        logger.warning(f"Could not link {copy.file.name} for upload {session.id}: {e}")
+        return False
+    for index in range(session.total_chunks):
+        open(os.path.join(chunks_dir(session), str(index)), 'wb').close()
+    session.sha256 = copy.sha256
+    session.save(update_fields=['sha256'])
+    logger.info(f"Upload {session.id} ({session.filename}) reuses the stored data of {copy.file.name}")
+    return True
+
+
+def received_chunks(session):
+    try:
+        return sorted(int(name) for name in os.listdir(chunks_dir(session)) if name.isdigit())
+    except FileNotFoundError:
+        return []
+
+
+def received_offset(session):
+    offset = 0
+    for expected, index in enumerate(received_chunks(session)):
+        if index != expected:
+            break
+        offset += session.chunk_length(index)
+    return offset
+
+
+def is_complete(session):
+    return len(received_chunks(session)) == session.total_chunks
+
+
+def write_chunk(session, index, stream):
+    """
+    Writes one chunk at its offset in the preallocated data file. Chunks land in
+    disjoint regions, so they can arrive in any order and in parallel; an empty
+    marker file records each chunk once its bytes are fully written.
+    """
+    if session.audio_file_id:
+        raise UploadError("Upload is already attached")
+    if session.sha256:
+        # The data file is a hardlink to stored content and must never be written to
+        raise UploadError("Upload already has all of its data")
+    if not 0 <= index < session.total_chunks:
+        raise UploadError(f"Chunk index {index} is out of range")
+
+    expected = session.chunk_length(index)
+    written = 0
+    fd = os.open(data_path(session), os.O_WRONLY)
+    try:
+        offset = index * session.chunk_size
+        while written < expected:
+            data = stream.read(min(READ_SIZE, expected - written))
+            if not data:
+                break
+            try:
+                os.pwrite(fd, data, offset + written)
+            except OSError as e:
+                if e.errno == errno.ENOSPC:
+                    raise InsufficientSpace(expected, disk_free(settings.UPLOAD_SESSION_DIR))
+                raise
+            written += len(data)
+        if stream.read(1):
+            raise UploadError(f"Chunk {index} is longer than {expected} bytes")
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+    if written != expected:
+        raise UploadError(f"Chunk {index} has {written} bytes, expected {expected}")
+    open(os.path.join(chunks_dir(session), str(index)), 'wb').close()
+
+
+def attach_upload(session, book):
+    from .models import AudioFile
+
+    if session.audio_file_id:
+        return session.audio_file
+    if not is_complete(session):
+        raise UploadError(f"Upload {session.id} is missing chunks")
+
+    with transaction.atomic():
+        with open(data_path(session), 'rb') as f:
+            audio_file = AudioFile.objects.create(
+                book=book, file=AssembledUpload(f, name=session.filename), sha256=session.sha256
+            )
+        session.book = book
+        session.audio_file = audio_file
+        session.save(update_fields=['book', 'audio_file'])
+    discard_upload_data(session)
+    return audio_file
+
+
+def discard_upload_data(session):
+    shutil.rmtree(session_dir(session), ignore_errors=True)
+
+
+def discard_expired_uploads():
+    from .models import UploadSession
+
+    expired = UploadSession.objects.filter(
+        created_at__lt=timezone.now() - timedelta(seconds=settings.UPLOAD_SESSION_TTL)
+    )
+    for session in expired:
+        logger.info(f"Discarding expired upload {session.id} ({session.filename})")
+        session.delete()
@@ -6,6 +6,7 @@ urlpatterns = [
     path('books/', views.BookListView.as_view(), name='book_list'),
     path('books/<slug:slug>/', views.BookDetailView.as_view(), name='book_detail'),
     path('book/<slug:slug>/download-all/', views.DownloadAllAudioView.as_view(), name='download_all_audio'),
+    path('book/<slug:slug>/audio/<int:pk>/download/', views.AudioFileDownloadView.as_view(), name='audio_file_download'),
     path('book/add/', views.BookCreateOrEditView.as_view(), name='book_add'),
     path('book/<slug:slug>/edit/', views.BookCreateOrEditView.as_view(), name='book_edit'),
     path('book/<slug:slug>/delete/', views.BookDeleteView.as_view(), name='book_delete'),
@@ -30,5 +31,22 @@ urlpatterns = [
     path('genre/<slug:slug>/edit/', views.GenreCreateOrEditView.as_view(), name='genre_edit'),
     path('genre/<slug:slug>/delete/', views.GenreDeleteView.as_view(), name='genre_delete'),
     path('genre/<slug:slug>/', views.GenreDetailView.as_view(), name='genre_detail'),
+    path('search/', views.SearchView.as_view(), name='search'),
+    path('api/search/', views.SearchAPIView.as_view(), name='api_search'),
+    path('api/uploads/', views.UploadSessionListAPIView.as_view(), name='api_uploads'),
+    path('api/uploads/preflight/', views.UploadPreflightAPIView.as_view(), name='api_upload_preflight'),
+    path('api/uploads/<uuid:pk>/', views.UploadSessionAPIView.as_view(), name='api_upload'),
+    path('api/uploads/<uuid:pk>/chunks/<int:index>/', views.UploadChunkAPIView.as_view(), name='api_upload_chunk'),
+    path('api/uploads/<uuid:pk>/complete/', views.UploadCompleteAPIView.as_view(), name='api_upload_complete'),
+    path('api/content/<str:sha256>/', views.StoredContentAPIView.as_view(), name='api_stored_content'),
+    path('api/jobs/<int:pk>/', views.JobAPIView.as_view(), name='api_job'),
+    path('api/books/', views.BooksListAPIView.as_view(), name='api_books_list'),
+    path('api/books/<slug:slug>/', views.BookAPIView.as_view(), name='api_book'),
     path('api/authors/', views.AuthorsListAPIView.as_view(), name='api_authors_list'),
+    path('api/authors/<slug:slug>/', views.AuthorAPIView.as_view(), name='api_author'),
+    path('api/series/', views.SeriesListAPIView.as_view(), name='api_series_list'),
+    path('api/series/<slug:slug>/', views.SeriesAPIView.as_view(), name='api_series'),
+    path('api/genres/', views.GenresListAPIView.as_view(), name='api_genres_list'),
+    path('api/genres/<slug:slug>/', views.GenreAPIView.as_view(), name='api_genre'),
+    path('api/audio-files/', views.AudioFilesListAPIView.as_view(), name='api_audio_files_list'),
 ]
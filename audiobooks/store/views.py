@@ -1,30 +1,62 @@
+import hashlib
 import logging
 import os
-import zipfile
 import json
 
+from django.conf import settings
+from django.core.cache import caches
 from django.views.generic.edit import FormView, DeleteView
 from django.contrib.auth.mixins import LoginRequiredMixin, UserPassesTestMixin
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
 from django.core.paginator import Paginator
 from django.contrib import messages
-from django.db.models import Value, CharField
+from django.db.models import Prefetch, Value, CharField
 from django.db.models.functions import Concat
+from django.template.defaultfilters import filesizeformat
 from django.templatetags.static import static
 from django.views.generic import TemplateView, DetailView
 from django.views import View
-from django.http import HttpResponse
-from django.shortcuts import get_object_or_404, redirect
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.shortcuts import get_object_or_404, redirect, render
+from django.template.loader import render_to_string
 from django.urls import reverse, reverse_lazy
+from django.utils.http import content_disposition_header
+from django.utils.decorators import method_decorator
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext_lazy as _
 from dal import autocomplete
+from rest_framework import generics
+from rest_framework.exceptions import ValidationError
+from rest_framework.pagination import CursorPagination
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAuthenticated
+from rest_framework_simplejwt.authentication import JWTAuthentication
 
 from .forms import BookForm, AuthorForm, SeriesForm, GenreForm
-from .models import Book, Author, Series, Genre, AudioFile
-from .utils import export_authors_to_csv, export_books_to_csv, handle_book_slug_change
+from . import search
+from .archive_cache import get_book_archive, get_cached_archive, touch_cached_archive
+from .completion import complete
+from .db import UnicodeLower
+from .dedup import find_stored_copy
+from .fragments import cached_fragment, catalog_version
+from .hot_cache import hot_cache_enabled, is_audio_name, queue_book_warming, serve_cached_audio
+from .images import delete_image_variants, image_sources
+from .media import missing_file_response, serve_media, x_accel_response
+from .jobs import collect_file_deletions, create_job, delete_stored_file
+from .models import Book, Author, Series, Genre, AudioFile, Job, UploadSession
+from .permissions import IsSuperUser
+from .serializers import AudioFileSerializer, AuthorSerializer, BookSerializer, GenreSerializer, SeriesSerializer, \
+    requested_fields
+from .space import InsufficientSpace, check_upload_space
+from .tasks import attach_uploads_task, build_book_archive_task, delete_files_task, move_book_files_task
+from .timestamps import book_validators, conditional_page, list_validators, related_books_validators
+from .uploads import UploadError, attach_upload, create_upload, received_chunks, received_offset, write_chunk
+from .utils import parse_range_header, should_move_files
+from .volumes import DEFAULT_VOLUME, split_volume_name
 
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -37,6 +69,7 @@ class HomeView(TemplateView):
 
 class PaginatedListView(LoginRequiredMixin, TemplateView):
     template_name = 'store/tile_list.html'
+    body_template_name = 'store/_tile_list_body.html'
     login_url = 'login'
     paginate_by = 18
     model = None
@@ -45,26 +78,54 @@ class PaginatedListView(LoginRequiredMixin, TemplateView):
     title_url = ''
     add_item_name = ''
     show_unread_filter = False
+    search_field = None
+    ordering = None
 
-    def get_items(self):
-        return []
+    def get_queryset(self):
+        qs = self.model.objects.all()
+        if self.ordering:
+            qs = qs.order_by(*self.ordering)
+        return qs
+
+    def filter_query(self, queryset, query):
+        return queryset.annotate(search_label=UnicodeLower(self.search_field)) \
+            .filter(search_label__contains=query.lower())
+
+    def filter_unread(self, queryset):
+        return queryset.filter(is_read=False)
+
+    def get_item(self, obj):
+        return {
+            'image': image_sources(obj, self.image),
+            'label': str(obj),
+            'slug': obj.slug,
+        }
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
+        context['body'] = mark_safe(cached_fragment(self.request, f'{self.model._meta.model_name}_list', self.render_body))
+        return context
+
+    def render_body(self):
+        return render_to_string(self.body_template_name, self.get_list_context(), request=self.request)
+
+    def get_list_context(self):
+        context = {}
         query = self.request.GET.get('query', '')
         unread_only = self.request.GET.get('unread_only', '') == '1' if self.show_unread_filter else False
-        
-        item_list = self.get_items()
+
+        queryset = self.get_queryset()
         if query:
-            item_list = [item for item in item_list if query.lower() in item['label'].lower()]
-        
-        if unread_only and hasattr(self, 'filter_unread'):
-            item_list = self.filter_unread(item_list)
-            
-        paginator = Paginator(item_list, self.paginate_by)
+            queryset = self.filter_query(queryset, query)
+
+        if unread_only:
+            queryset = self.filter_unread(queryset)
+
+        paginator = Paginator(queryset, self.paginate_by)
         page_number = self.request.GET.get('page')
         page_obj = paginator.get_page(page_number)
-        
+        page_obj.object_list = [self.get_item(obj) for obj in page_obj.object_list]
+
         context['title'] = self.title
         context['title_url'] = self.title_url
         context['page_obj'] = page_obj
@@ -75,84 +136,158 @@ class PaginatedListView(LoginRequiredMixin, TemplateView):
         return context
 
 
+@method_decorator(conditional_page(list_validators(Book)), name='get')
 class BookListView(PaginatedListView):
+    model = Book
     title = _('Books')
     title_url = 'book'
     image = static('store/images/default_book.png')
     add_item_name = _('Add new book')
     show_unread_filter = True
+    search_field = 'title'
 
-    def get_items(self):
-        return [
-            {
-                'image': book.image.url if book.image else self.image,
-                'label': book.title,
-                'slug': book.slug,
-                'book_obj': book,
-            }
-            for book in Book.objects.all()
-        ]
-    
-    def filter_unread(self, item_list):
-        return [item for item in item_list if not item['book_obj'].is_read]
+    def get_queryset(self):
+        return super().get_queryset().only('title', 'slug', 'image', 'image_variants')
 
+    def get_item(self, obj):
+        item = super().get_item(obj)
+        item['book_obj'] = obj
+        return item
 
+
+@method_decorator(conditional_page(list_validators(Author)), name='get')
 class AuthorListView(PaginatedListView):
+    model = Author
     title = _('Authors')
     title_url = 'author'
     image = static('store/images/default_author.png')
     add_item_name = _('Add new author')
+    search_field = 'full_name'
 
-    def get_items(self):
-        return [
-            {
-                'image': author.image.url if author.image else self.image,
-                'label': f"{author.first_name} {author.last_name}",
-                'slug': author.slug,
-            }
-            for author in Author.objects.all()
-        ]
+    def get_queryset(self):
+        return super().get_queryset().only('first_name', 'last_name', 'slug', 'image', 'image_variants').annotate(
+            full_name=Concat('first_name', Value(' '), 'last_name', output_field=CharField())
+        )
 
 
+@method_decorator(conditional_page(list_validators(Series)), name='get')
 class SeriesListView(PaginatedListView):
+    model = Series
     title = _('Series')
     title_url = 'series'
     image = static('store/images/default_series.png')
     add_item_name = _('Add new series')
+    search_field = 'title'
+    ordering = ['title']
 
-    def get_items(self):
-        return [
-            {
-                'image': series.image.url if series.image else self.image,
-                'label': series.title,
-                'slug': series.slug,
-            }
-            for series in Series.objects.all()
-        ]
+    def get_queryset(self):
+        return super().get_queryset().only('title', 'slug', 'image', 'image_variants')
 
 
+@method_decorator(conditional_page(list_validators(Genre)), name='get')
 class GenreListView(PaginatedListView):
+    model = Genre
     title = _('Genres')
     title_url = 'genre'
     image = static('store/images/default_genre.png')
     add_item_name = _('Add new genre')
+    search_field = 'name'
+
+    def get_queryset(self):
+        return super().get_queryset().only('name', 'slug', 'image', 'image_variants')
+
 
-    def get_items(self):
-        return [
+class SearchView(LoginRequiredMixin, TemplateView):
+    template_name = 'store/search.html'
+    login_url = 'login'
+    paginate_by = 30
+    images = {
+        'book': static('store/images/default_book.png'),
+        'author': static('store/images/default_author.png'),
+        'series': static('store/images/default_series.png'),
+        'genre': static('store/images/default_genre.png'),
+    }
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        query = self.request.GET.get('query', '')
+        results = [
             {
-                'image': genre.image.url if genre.image else self.image,
-                'label': genre.name,
-                'slug': genre.slug,
+                'kind': kind,
+                'image': image_sources(obj, self.images[kind]),
+                'label': str(obj),
+                'slug': obj.slug,
             }
-            for genre in Genre.objects.all()
+            for kind, obj in search.search_objects(query, limit=self.paginate_by)
         ]
+        context['query'] = query
+        context['results'] = results
+        return context
+
+
+class SearchAPIView(APIView):
+    permission_classes = [IsAuthenticated]
+    max_limit = 100
+
+    def get(self, request, *args, **kwargs):
+        query = request.query_params.get('q', '')
+        kind = {name: code for code, name in search.KIND_NAMES.items()}.get(request.query_params.get('kind'))
+        try:
+            limit = max(min(int(request.query_params.get('limit', 20)), self.max_limit), 1)
+            offset = max(int(request.query_params.get('offset', 0)), 0)
+        except ValueError:
+            return Response({'error': 'limit and offset must be integers'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = [
+            {
+                'kind': kind_name,
+                'label': str(obj),
+                'slug': obj.slug,
+                'url': reverse(f"{kind_name}_detail", args=[obj.slug]),
+            }
+            for kind_name, obj in search.search_objects(query, kind=kind, limit=limit, offset=offset)
+        ]
+        return Response({
+            'query': query,
+            'results': results,
+        }, status=status.HTTP_200_OK)
+
+
+class CachedDetailView(LoginRequiredMixin, DetailView):
+    """
+    A detail page whose body is rendered once per catalog version (and
+    language, superuser flag and query string), so a repeat view runs no
+    catalog queries. Only the parts that differ per user stay outside the body.
+    """
+    login_url = 'login'
+    body_template_name = None
+
+    def get(self, request, *args, **kwargs):
+        name = f'{self.model._meta.model_name}:{kwargs[self.slug_url_kwarg]}'
+        self.page = cached_fragment(request, name, self.render_page)
+        return render(request, self.template_name, dict(self.page, body=mark_safe(self.page['body'])))
 
+    def render_page(self):
+        self.object = self.get_object()
+        context = self.get_context_data(object=self.object)
+        body = render_to_string(self.body_template_name, context, request=self.request)
+        return {'body': body, 'slug': self.object.slug}
 
-class BookDetailView(LoginRequiredMixin, DetailView):
+
+def book_page_validators(request, slug, **kwargs):
+    # Runs for revalidated visits too, which end in a 304 before get() is reached
+    validated = book_validators(request, slug, **kwargs)
+    if validated:
+        queue_book_warming(validated[1]['book_id'])
+    return validated
+
+
+@method_decorator(conditional_page(book_page_validators), name='get')
+class BookDetailView(CachedDetailView):
     model = Book
     template_name = 'store/book_detail.html'
+    body_template_name = 'store/_book_detail_body.html'
     context_object_name = 'book'
-    login_url = 'login'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -163,11 +298,12 @@ class BookDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
-class AuthorDetailView(LoginRequiredMixin, DetailView):
+@method_decorator(conditional_page(related_books_validators(Author)), name='get')
+class AuthorDetailView(CachedDetailView):
     model = Author
     template_name = 'store/author_detail.html'
+    body_template_name = 'store/_author_detail_body.html'
     context_object_name = 'author'
-    login_url = 'login'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -175,11 +311,12 @@ class AuthorDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
-class SeriesDetailView(LoginRequiredMixin, DetailView):
+@method_decorator(conditional_page(related_books_validators(Series)), name='get')
+class SeriesDetailView(CachedDetailView):
     model = Series
     template_name = 'store/series_detail.html'
+    body_template_name = 'store/_series_detail_body.html'
     context_object_name = 'series'
-    login_url = 'login'
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
@@ -187,20 +324,21 @@ class SeriesDetailView(LoginRequiredMixin, DetailView):
         return context
 
 
-class GenreDetailView(LoginRequiredMixin, DetailView):
+@method_decorator(conditional_page(related_books_validators(Genre)), name='get')
+class GenreDetailView(CachedDetailView):
     model = Genre
     template_name = 'store/genre_detail.html'
+    body_template_name = 'store/_genre_detail_body.html'
     context_object_name = 'genre'
-    login_url = 'login'
     paginate_by = 18
 
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
         query = self.request.GET.get('query', '')
-        books = Book.objects.filter(genres=self.object)
-        book_list = books
+        book_list = Book.objects.filter(genres=self.object)
         if query:
-            book_list = [book for book in books if query.lower() in book.title.lower()]
+            book_list = book_list.annotate(search_label=UnicodeLower('title')) \
+                .filter(search_label__contains=query.lower())
 
         paginator = Paginator(book_list, self.paginate_by)
         page_number = self.request.GET.get('page')
@@ -217,20 +355,103 @@ class DownloadAllAudioView(LoginRequiredMixin, View):
 
     def get(self, request, slug, *args, **kwargs):
         book = get_object_or_404(Book, slug=slug)
-        audio_files = book.audio_files.all()
-
-        response = HttpResponse(content_type='application/zip')
         zip_filename = f"{slug}.zip"
+
+        if settings.MEDIA_X_ACCEL_REDIRECT:
+            cached = get_cached_archive(book)
+            if cached:
+                touch_cached_archive(cached)
+                response = x_accel_response(cached.relative_path, 'application/zip')
+                response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
+                return response
+            build_book_archive_task(book.pk)
+
+        archive = get_book_archive(book)
+
+        byte_range = None
+        if_range = request.headers.get('If-Range')
+        if not if_range or if_range == archive.etag:
+            try:
+                byte_range = parse_range_header(request.headers.get('Range'), archive.size)
+            except ValueError:
+                response = HttpResponse(status=416)
+                response['Content-Range'] = f"bytes */{archive.size}"
+                return response
+
+        if byte_range:
+            start, end = byte_range
+            response = StreamingHttpResponse(archive.iter_range(start, end), content_type='application/zip', status=206)
+            response['Content-Range'] = f"bytes {start}-{end}/{archive.size}"
+            response['Content-Length'] = end - start + 1
+        else:
+            response = StreamingHttpResponse(archive, content_type='application/zip')
+            response['Content-Length'] = archive.size
+
         response['Content-Disposition'] = f'attachment; filename="{zip_filename}"'
+        response['Accept-Ranges'] = 'bytes'
+        response['ETag'] = archive.etag
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class AudioFileDownloadView(LoginRequiredMixin, View):
+    login_url = 'login'
 
-        with zipfile.ZipFile(response, 'w') as zip_file:
-            for audio in audio_files:
-                file_path = audio.file.path
-                file_name = os.path.basename(file_path)
-                zip_file.write(file_path, arcname=file_name)
+    def get(self, request, slug, pk, *args, **kwargs):
+        audio = get_object_or_404(AudioFile.objects.select_related('book'), pk=pk, book__slug=slug)
+        response = serve_cached_audio(request, audio)
+        if response is not None:
+            response['Content-Disposition'] = content_disposition_header(True, audio.download_name)
+            return response
+        if not os.path.isfile(audio.file.path):
+            response = missing_file_response(audio.file.name)
+            if response is None:
+                raise Http404
+            return response
+        response = serve_media(request, audio.file.name)
+        response['Content-Disposition'] = content_disposition_header(True, audio.download_name)
         return response
 
 
+class ProtectedMediaView(APIView):
+    """
+    Audio and images, and the CSV exports for staff. Everything else under
+    MEDIA_ROOT (upload sessions, quarantine, move journals, caches) is internal
+    and answers 404.
+    """
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    served_dirs = ('audio', 'media')
+    staff_dirs = ('exports',)
+
+    def is_served(self, request, path):
+        volume, name = split_volume_name(path)
+        top = name.split('/')[0]
+        if top in self.served_dirs:
+            return True
+        return top in self.staff_dirs and volume == DEFAULT_VOLUME and request.user.is_staff
+
+    def get(self, request, path, *args, **kwargs):
+        path = os.path.normpath(path).replace('\\', '/')
+        if not self.is_served(request, path):
+            raise Http404
+        if is_audio_name(path) and hot_cache_enabled():
+            audio = AudioFile.objects.filter(file=path).only('pk', 'file', 'book_id').first()
+            response = serve_cached_audio(request, audio) if audio else None
+            if response is not None:
+                return response
+        try:
+            full_path = default_storage.path(path)
+        except SuspiciousFileOperation:
+            raise Http404
+        if not os.path.isfile(full_path):
+            response = missing_file_response(path)
+            if response is None:
+                raise Http404
+            return response
+        return serve_media(request, path)
+
+
 class GenericCreateOrEditView(LoginRequiredMixin, UserPassesTestMixin, FormView):
     model = None
     form_class = None
@@ -308,6 +529,21 @@ class BookCreateOrEditView(GenericCreateOrEditView):
         kwargs['is_edit_mode'] = kwargs.get('instance') is not None
         return kwargs
 
+    def post(self, request, *args, **kwargs):
+        # A form carrying the audio files is turned away before its body is read, so no book is left without them
+        try:
+            size = int(request.META.get('CONTENT_LENGTH') or 0)
+        except ValueError:
+            size = 0
+        if size > settings.FILE_UPLOAD_MAX_MEMORY_SIZE and not self.kwargs.get('slug'):
+            try:
+                check_upload_space(size)
+            except InsufficientSpace as e:
+                messages.error(request, _("Not enough disk space for these files: %(size)s needed, %(available)s free")
+                               % {'size': filesizeformat(e.size), 'available': filesizeformat(e.available)})
+                return redirect(request.get_full_path())
+        return super().post(request, *args, **kwargs)
+
     def get_initial(self):
         initial = super().get_initial()
         genre_slug = self.kwargs.get('genre_slug')
@@ -340,19 +576,38 @@ class BookCreateOrEditView(GenericCreateOrEditView):
         
         result = super().form_valid(form)
         
+        job = None
         try:
             if old_slug:
                 saved_book = Book.objects.get(pk=book_id)
-                handle_book_slug_change(saved_book, old_slug)
+                if should_move_files(saved_book, old_slug):
+                    job = create_job('move_book_files', self.request.user)
+                    move_book_files_task(saved_book.pk, old_slug, job_id=job.pk)
             else:
                 audio_files = self.request.FILES.getlist('audio_files')
                 saved_book = Book.objects.get(slug=form.instance.slug)
                 for audio_file in audio_files:
-                    AudioFile.objects.create(book=saved_book, file=audio_file)
+                    AudioFile.objects.create(
+                        book=saved_book, file=audio_file, crc32=getattr(audio_file, 'crc32', None),
+                        sha256=getattr(audio_file, 'sha256', None) or ''
+                    )
+                upload_ids = [
+                    str(pk) for pk in UploadSession.objects.filter(
+                        pk__in=self.request.POST.getlist('upload_ids'), user=self.request.user
+                    ).values_list('pk', flat=True)
+                ]
+                if upload_ids:
+                    job = create_job('attach_uploads', self.request.user, total=len(upload_ids))
+                    attach_uploads_task(saved_book.pk, upload_ids, job_id=job.pk)
         except Exception as e:
             logger.error(f"Error handling audio files: {e}")
             messages.error(self.request, _("Error processing audio files"))
-    
+
+        if job and self.request.headers.get('X-Requested-With') == 'XMLHttpRequest':
+            return JsonResponse({
+                'redirect': result.url,
+                'job': reverse('api_job', args=[job.pk]),
+            })
         return result
 
 
@@ -412,75 +667,317 @@ class BookDeleteView(GenericDeleteView):
     def form_valid(self, form):
         book = self.get_object()
 
-        if book.image:
-            if os.path.isfile(book.image.path):
-                os.remove(book.image.path)
+        with collect_file_deletions() as file_names:
+            if book.image:
+                delete_stored_file(book.image.name)
+            delete_image_variants(book.image_variants)
+            response = super().form_valid(form)
 
-        audio_files = AudioFile.objects.filter(book=book)
-        for audio in audio_files:
-            if audio.file and os.path.isfile(audio.file.path):
-                os.remove(audio.file.path)
-            audio.delete()
+        if file_names:
+            job = create_job('delete_files', self.request.user, total=len(file_names))
+            delete_files_task(file_names, job_id=job.pk)
+        return response
 
-        return super().form_valid(form)
 
+class IndexedAutocomplete(autocomplete.Select2QuerySetView):
+    """
+    Answers from the in-process completion index rather than the database; the
+    results are (pk, label) entries, which is all Select2 needs.
+    """
+    index_name = None
 
-class AuthorAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        qs = Author.objects.all().order_by('last_name', 'first_name')
-        if self.q and len(self.q) >= 2:
-            qs = Author.objects.annotate(
-                full_name=Concat('first_name', Value(' '), 'last_name', output_field=CharField())
-            )
-            qs = qs.filter(full_name__iregex=self.q).order_by('last_name', 'first_name')
-        return qs
+        try:
+            page = max(int(self.request.GET.get('page', 1)), 1)
+        except ValueError:
+            page = 1
+        # One more than shown, so that Select2 knows whether there is a next page
+        return complete(self.index_name, self.q, page * self.paginate_by + 1)
 
     def get_result_label(self, item):
-        return f"{item.first_name} {item.last_name}"
+        return item.label
+
+
+class AuthorAutocomplete(IndexedAutocomplete):
+    index_name = 'author'
+
+
+class GenreAutocomplete(IndexedAutocomplete):
+    index_name = 'genre'
+
+
+class SeriesAutocomplete(IndexedAutocomplete):
+    index_name = 'series'
+
+
+class CatalogCursorPagination(CursorPagination):
+    """Pages by primary key, so a page costs the same queries however deep it is."""
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+    ordering = 'pk'
+
+
+class CatalogAPIMixin:
+    """
+    Read-only catalog endpoints. Responses are kept in the in-memory 'api' cache
+    under the catalog version, so a GET neither repeats its queries nor writes
+    anything to disk.
+    """
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+    pagination_class = CatalogCursorPagination
+    lookup_field = 'slug'
+
+    def get(self, request, *args, **kwargs):
+        version = catalog_version(create=False)
+        if version is None:
+            return super().get(request, *args, **kwargs)
+        params = '&'.join(f'{key}={value}' for key, value in sorted(request.query_params.items()))
+        url = f'{request.build_absolute_uri(request.path)}?{params}'
+        key = f'api:{version}:{hashlib.md5(url.encode()).hexdigest()}'
+        data = caches['api'].get(key)
+        if data is not None:
+            return Response(data)
+        response = super().get(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            caches['api'].set(key, response.data, settings.API_CACHE_TIMEOUT)
+        return response
 
+    def wants(self, name):
+        fields = requested_fields(self.request)
+        return fields is None or name in fields
+
+
+def query_flag(params, name):
+    value = params.get(name, '').lower()
+    if value in ('1', 'true'):
+        return True
+    if value in ('0', 'false'):
+        return False
+    raise ValidationError({name: 'Expected true or false'})
+
+
+class BookAPIMixin(CatalogAPIMixin):
+    serializer_class = BookSerializer
 
-class GenreAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        qs = Genre.objects.all().order_by('name')
-        if self.q:
-            qs = qs.filter(name__iregex=self.q).order_by('name')
-        return qs
+        queryset = Book.objects.all()
+        if self.wants('series'):
+            queryset = queryset.select_related('series')
+        for name, model in (('authors', Author), ('genres', Genre)):
+            if self.wants(name):
+                queryset = queryset.prefetch_related(Prefetch(name, queryset=model.objects.only('pk', 'slug')))
+        return queryset
+
+
+class BooksListAPIView(BookAPIMixin, generics.ListAPIView):
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        params = self.request.query_params
+        if params.get('author'):
+            queryset = queryset.filter(authors__slug=params['author'])
+        if params.get('series'):
+            queryset = queryset.filter(series__slug=params['series'])
+        if params.get('genre'):
+            queryset = queryset.filter(genres__slug=params['genre'])
+        if params.get('is_read'):
+            queryset = queryset.filter(is_read=query_flag(params, 'is_read'))
+        return queryset
+
+
+class BookAPIView(BookAPIMixin, generics.RetrieveAPIView):
+    pass
+
+
+@method_decorator(conditional_page(list_validators(Author)), name='get')
+class AuthorsListAPIView(CatalogAPIMixin, generics.ListAPIView):
+    queryset = Author.objects.all()
+    serializer_class = AuthorSerializer
+
+
+class AuthorAPIView(CatalogAPIMixin, generics.RetrieveAPIView):
+    queryset = Author.objects.all()
+    serializer_class = AuthorSerializer
+
+
+@method_decorator(conditional_page(list_validators(Series)), name='get')
+class SeriesListAPIView(CatalogAPIMixin, generics.ListAPIView):
+    queryset = Series.objects.all()
+    serializer_class = SeriesSerializer
+
+
+class SeriesAPIView(CatalogAPIMixin, generics.RetrieveAPIView):
+    queryset = Series.objects.all()
+    serializer_class = SeriesSerializer
 
-    def get_result_label(self, item):
-        return f"{item.name}"
 
+@method_decorator(conditional_page(list_validators(Genre)), name='get')
+class GenresListAPIView(CatalogAPIMixin, generics.ListAPIView):
+    queryset = Genre.objects.all()
+    serializer_class = GenreSerializer
+
+
+class GenreAPIView(CatalogAPIMixin, generics.RetrieveAPIView):
+    queryset = Genre.objects.all()
+    serializer_class = GenreSerializer
+
+
+class AudioFilesListAPIView(CatalogAPIMixin, generics.ListAPIView):
+    serializer_class = AudioFileSerializer
 
-class SeriesAutocomplete(autocomplete.Select2QuerySetView):
     def get_queryset(self):
-        qs = Series.objects.all().order_by('title')
-        if self.q:
-            qs = qs.filter(title__iregex=self.q).order_by('title')
-        return qs
+        # The book's slug is needed for the download URL even when the book field is left out
+        queryset = AudioFile.objects.select_related('book').only(
+            'pk', 'file', 'title', 'track_number', 'disc_number', 'duration', 'size', 'bitrate', 'created_at',
+            'book__slug',
+        )
+        if self.request.query_params.get('book'):
+            queryset = queryset.filter(book__slug=self.request.query_params['book'])
+        return queryset
+
+
+def serialize_upload(upload):
+    return {
+        'id': str(upload.id),
+        'filename': upload.filename,
+        'size': upload.size,
+        'chunk_size': upload.chunk_size,
+        'total_chunks': upload.total_chunks,
+        'received': received_chunks(upload),
+        'offset': received_offset(upload),
+        'audio_file': upload.audio_file_id,
+        'deduplicated': bool(upload.sha256),
+    }
+
+
+class UploadSessionListAPIView(APIView):
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    permission_classes = [IsSuperUser]
+
+    def post(self, request, *args, **kwargs):
+        filename = request.data.get('filename')
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            size = -1
+        if not filename or size < 0:
+            return Response({'error': 'filename and size are required'}, status=status.HTTP_400_BAD_REQUEST)
 
-    def get_result_label(self, item):
-        return f"{item.title}"
+        book = None
+        if request.data.get('book'):
+            book = get_object_or_404(Book, slug=request.data['book'])
 
+        try:
+            upload = create_upload(request.user, filename, size, book=book, sha256=request.data.get('sha256'))
+        except InsufficientSpace as e:
+            return insufficient_space_response(e)
+        return Response(serialize_upload(upload), status=status.HTTP_201_CREATED)
 
-class AuthorsListAPIView(APIView):
-    def get(self, request, *args, **kwargs):
-        filepath, filename, count, authors_data = export_authors_to_csv()
-        logger.info(f"Authors list saved to {filepath}")
-        
-        return Response({
-            'count': count,
-            'file': filepath,
-            'authors': authors_data
-        }, status=status.HTTP_200_OK)
 
+def insufficient_space_response(error):
+    return Response(
+        {'error': str(error), 'size': error.size, 'available': error.available},
+        status=status.HTTP_507_INSUFFICIENT_STORAGE
+    )
 
-class BooksListAPIView(APIView):
-    def get(self, request, *args, **kwargs):
-        filepath, filename, count, books_data = export_books_to_csv()
-        
-        logger.info(f"Books list saved to {filepath}")
-        
+
+class UploadPreflightAPIView(APIView):
+    """Tells a client whether the declared total size of its files fits, before it sends any of them."""
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    permission_classes = [IsSuperUser]
+
+    def post(self, request, *args, **kwargs):
+        try:
+            size = int(request.data.get('size'))
+        except (TypeError, ValueError):
+            size = -1
+        if size < 0:
+            return Response({'error': 'size is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        book = None
+        if request.data.get('book'):
+            book = get_object_or_404(Book, slug=request.data['book'])
+
+        try:
+            available = check_upload_space(size, book)
+        except InsufficientSpace as e:
+            return insufficient_space_response(e)
+        return Response({'size': size, 'available': available}, status=status.HTTP_200_OK)
+
+
+class UploadSessionAPIView(APIView):
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    permission_classes = [IsSuperUser]
+
+    def get_upload(self, request, pk):
+        return get_object_or_404(UploadSession, pk=pk, user=request.user)
+
+    def get(self, request, pk, *args, **kwargs):
+        return Response(serialize_upload(self.get_upload(request, pk)), status=status.HTTP_200_OK)
+
+    def delete(self, request, pk, *args, **kwargs):
+        self.get_upload(request, pk).delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class UploadChunkAPIView(UploadSessionAPIView):
+    parser_classes = []
+
+    def put(self, request, pk, index, *args, **kwargs):
+        upload = self.get_upload(request, pk)
+        try:
+            write_chunk(upload, index, request._request)
+        except InsufficientSpace as e:
+            return insufficient_space_response(e)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response({'index': index, 'offset': received_offset(upload)}, status=status.HTTP_200_OK)
+
+
+class UploadCompleteAPIView(UploadSessionAPIView):
+    def post(self, request, pk, *args, **kwargs):
+        upload = self.get_upload(request, pk)
+        book = upload.book
+        if request.data.get('book'):
+            book = get_object_or_404(Book, slug=request.data['book'])
+        if book is None:
+            return Response({'error': 'book is required'}, status=status.HTTP_400_BAD_REQUEST)
+
+        try:
+            audio_file = attach_upload(upload, book)
+        except UploadError as e:
+            return Response({'error': str(e)}, status=status.HTTP_409_CONFLICT)
+        return Response({'audio_file': audio_file.pk, 'file': audio_file.file.url}, status=status.HTTP_201_CREATED)
+
+
+class StoredContentAPIView(APIView):
+    """Tells a client whether the server already stores a file with this SHA-256."""
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    permission_classes = [IsSuperUser]
+
+    def get(self, request, sha256, *args, **kwargs):
+        copy = find_stored_copy(sha256.lower())
+        if copy is None:
+            return Response({'sha256': sha256, 'exists': False}, status=status.HTTP_404_NOT_FOUND)
+        return Response({'sha256': copy.sha256, 'exists': True, 'size': copy.file.size}, status=status.HTTP_200_OK)
+
+
+class JobAPIView(APIView):
+    authentication_classes = [SessionAuthentication, JWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request, pk, *args, **kwargs):
+        jobs = Job.objects.all() if request.user.is_superuser else Job.objects.filter(user=request.user)
+        job = get_object_or_404(jobs, pk=pk)
         return Response({
-            'count': count,
-            'file': filepath,
-            'books': books_data
+            'id': job.pk,
+            'kind': job.kind,
+            'status': job.status,
+            'progress_current': job.progress_current,
+            'progress_total': job.progress_total,
+            'percent': job.percent,
+            'finished': job.is_finished,
+            'message': job.message,
+            'result': job.result,
         }, status=status.HTTP_200_OK)
@@ -0,0 +1,251 @@
+import glob
+import logging
+import os
+import shutil
+import time
+
+from django.conf import settings
+from django.utils import timezone
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VOLUME = 'default'
+VOLUME_PREFIX = 'volumes'
+MARKER_NAME = '.audiobooks-volume'
+ROOTS_TTL = 30
+
+_roots_cache = {'loaded_at': 0, 'roots': {}}
+
+
+def split_volume_name(name):
+    """Splits a stored file name into (volume name, name on that volume)."""
+    parts = name.replace('\\', '/').split('/', 2)
+    if len(parts) >= 2 and parts[0] == VOLUME_PREFIX and parts[1]:
+        return parts[1], parts[2] if len(parts) == 3 else ''
+    return DEFAULT_VOLUME, name
+
+
+def volume_prefix(volume):
+    name = getattr(volume, 'name', volume)
+    return '' if not name or name == DEFAULT_VOLUME else f"{VOLUME_PREFIX}/{name}/"
+
+
+def default_volume_root(name):
+    if name == DEFAULT_VOLUME:
+        return settings.MEDIA_ROOT
+    return os.path.join(settings.MEDIA_ROOT, VOLUME_PREFIX, name)
+
+
+def volume_root(volume):
+    return volume.path or default_volume_root(volume.name)
+
+
+def volume_roots():
+    """Mount point of every volume by name, re-read from the database every ROOTS_TTL seconds."""
+    if time.monotonic() - _roots_cache['loaded_at'] > ROOTS_TTL:
+        from .models import Volume
+
+        _roots_cache['roots'] = {volume.name: volume_root(volume) for volume in Volume.objects.only('name', 'path')}
+        _roots_cache['loaded_at'] = time.monotonic()
+    return _roots_cache['roots']
+
+
+def clear_volume_roots():
+    _roots_cache['loaded_at'] = 0
+
+
+def name_root(volume_name):
+    if volume_name == DEFAULT_VOLUME:
+        return settings.MEDIA_ROOT
+    return volume_roots().get(volume_name) or default_volume_root(volume_name)
+
+
+def read_marker(path):
+    try:
+        with open(os.path.join(path, MARKER_NAME)) as f:
+            return f.read().strip()
+    except OSError:
+        return None
+
+
+def write_marker(volume):
+    root = volume_root(volume)
+    with open(os.path.join(root, MARKER_NAME), 'w') as f:
+        f.write(str(volume.uuid))
+
+
+def is_online(volume):
+    root = volume_root(volume)
+    marker = read_marker(root)
+    if marker is None and volume.checked_at is None:
+        # Not marked yet; check_volume() writes the marker on its first run
+        return os.path.isdir(root)
+    return marker == str(volume.uuid)
+
+
+def is_name_online(name):
+    """Whether the volume a stored file name lives on is mounted; unknown volumes count as online."""
+    from .models import Volume
+
+    volume = Volume.objects.filter(name=split_volume_name(name)[0]).first()
+    return volume is None or is_online(volume)
+
+
+def find_remounted(volume):
+    """Looks for the volume's marker under MEDIA_VOLUME_SEARCH_PATHS, e.g. after the drive came back as ..._1."""
+    for pattern in settings.MEDIA_VOLUME_SEARCH_PATHS:
+        for path in glob.glob(pattern):
+            if os.path.isdir(path) and read_marker(path) == str(volume.uuid):
+                return path
+    return None
+
+
+def check_volume(volume, fix=False):
+    """
+    Refreshes the status, capacity and free space of a volume. A volume that was
+    never checked gets its marker file; afterwards a missing marker means the
+    drive is not mounted (or something else is mounted there), and its new mount
+    point is looked up. With fix=True the volume is pointed at that mount point.
+    """
+    from .models import Volume
+
+    root = volume_root(volume)
+    volume.found_at = ''
+    if volume.checked_at is None and os.path.isdir(root) and read_marker(root) is None:
+        write_marker(volume)
+        logger.info(f"Volume '{volume.name}' marked at {root}")
+
+    if is_online(volume):
+        volume.status = Volume.STATUS_ONLINE
+    else:
+        found = find_remounted(volume)
+        if found and fix:
+            logger.warning(f"Volume '{volume.name}' moved from {root} to {found}, path updated")
+            volume.path = found
+            volume.status = Volume.STATUS_ONLINE
+        elif found:
+            volume.status = Volume.STATUS_MOVED
+            volume.found_at = found
+            logger.error(f"Volume '{volume.name}' is not at {root} but at {found}")
+        else:
+            volume.status = Volume.STATUS_MISSING
+            logger.error(f"Volume '{volume.name}' is missing: no marker at {root}")
+
+    if volume.status == Volume.STATUS_ONLINE:
+        usage = shutil.disk_usage(volume_root(volume))
+        volume.capacity, volume.free = usage.total, usage.free
+    volume.checked_at = timezone.now()
+    volume.save()
+    return volume.status
+
+
+def free_space(volume):
+    """Free bytes on an online volume, None when it is not mounted."""
+    if not is_online(volume):
+        return None
+    return shutil.disk_usage(volume_root(volume)).free
+
+
+def place_file(size=0, book=None):
+    """
+    Picks the volume for a new file: the volume already holding the book's audio
+    (a book stays in one directory), otherwise by MEDIA_PLACEMENT_POLICY, either
+    the online volume with the most free space ('most_free') or the first one in
+    priority order with room left ('priority'). Each volume keeps
+    MEDIA_VOLUME_RESERVE bytes free and stays within its quota.
+    """
+    from .models import AudioFile, Volume
+
+    volumes = list(Volume.objects.filter(is_active=True).order_by('priority', 'pk'))
+    if len(volumes) <= 1:
+        return volumes[0] if volumes else None
+
+    room = {}
+    for volume in volumes:
+        free = free_space(volume)
+        within_quota = not volume.quota or volume.used + size <= volume.quota
+        if free is not None and free - settings.MEDIA_VOLUME_RESERVE >= size and within_quota:
+            room[volume.name] = free
+
+    if book is not None and book.pk:
+        stored = AudioFile.objects.filter(book=book).values_list('file', flat=True).first()
+        if stored:
+            current = split_volume_name(stored)[0]
+            if current in room:
+                return next(volume for volume in volumes if volume.name == current)
+
+    candidates = [volume for volume in volumes if volume.name in room]
+    if not candidates:
+        logger.error(f"No volume has {size} bytes to spare, using '{volumes[0].name}'")
+        return volumes[0]
+    if settings.MEDIA_PLACEMENT_POLICY == 'priority':
+        return candidates[0]
+    return max(candidates, key=lambda volume: room[volume.name])
+
+
+def placed_name(name, size=0, book=None):
+    """Prefixes a storage name with the volume chosen for it."""
+    return f"{volume_prefix(place_file(size, book))}{name}"
+
+
+def book_volumes():
+    """Maps book id to the name of the volume its first audio file is on."""
+    from .models import AudioFile
+
+    volumes = {}
+    for book_id, name in AudioFile.objects.order_by('pk').values_list('book_id', 'file').iterator(chunk_size=2000):
+        volumes.setdefault(book_id, split_volume_name(name)[0])
+    return volumes
+
+
+def plan_rebalance(tolerance=0.05, drain=None):
+    """
+    Works out which books to move so that the share of free space on the online
+    volumes ends up within tolerance of each other (or, with drain, so that the
+    drained volume ends up empty). Largest books that fit go first. Returns
+    (book, from volume name, to volume name) triples.
+    """
+    from .models import Book, Volume
+
+    volumes = [volume for volume in Volume.objects.filter(is_active=True) if is_online(volume)]
+    if drain:
+        volumes = [volume for volume in volumes if volume.name != drain]
+    if not volumes:
+        return []
+    usage = {volume.name: shutil.disk_usage(volume_root(volume)) for volume in volumes}
+    free = {name: stat.free - settings.MEDIA_VOLUME_RESERVE for name, stat in usage.items()}
+    capacity = {name: stat.total for name, stat in usage.items()}
+
+    located = book_volumes()
+    books = {}
+    for book in Book.objects.filter(pk__in=located).only('pk', 'slug', 'total_size'):
+        books.setdefault(located[book.pk], []).append(book)
+    for volume_books in books.values():
+        volume_books.sort(key=lambda book: book.total_size, reverse=True)
+
+    moves = []
+    if drain:
+        for book in books.get(drain, []):
+            target = max(free, key=free.get)
+            if free[target] < book.total_size:
+                logger.error(f"No room left to move '{book.slug}' off '{drain}'")
+                continue
+            free[target] -= book.total_size
+            moves.append((book, drain, target))
+        return moves
+
+    while len(free) > 1:
+        ratio = {name: free[name] / capacity[name] for name in free}
+        source, target = min(ratio, key=ratio.get), max(ratio, key=ratio.get)
+        if ratio[target] - ratio[source] <= tolerance:
+            break
+        gap = (free[target] - free[source]) / 2
+        book = next((book for book in books.get(source, []) if book.total_size <= gap), None)
+        if book is None:
+            break
+        books[source].remove(book)
+        free[source] += book.total_size
+        free[target] -= book.total_size
+        moves.append((book, source, target))
+    return moves